@@ -0,0 +1,283 @@
+"""
+Password hashing off the request threads, with admission control.
+
+PBKDF2 is deliberately slow, and a burst of logins hashing inline can take
+every core the server has and starve everything else of CPU. Views wrapped
+in ``offload_hashing`` instead hash in a separate process pool sized to
+``PASSWORD_HASHING_CPU_SHARE`` of the cores, so the rest of the cores stay
+free for other requests.
+
+At most one hash per pool worker runs at a time. Up to
+``PASSWORD_HASHING_QUEUE_SIZE`` more requests wait for a worker; any beyond
+that are refused straight away with a 429, and any that wait longer than
+``PASSWORD_HASHING_MAX_WAIT`` seconds get a 503, both with a Retry-After.
+The limits apply per server process, so the share is of the cores a process
+may use.
+
+How long hashes wait and take is counted in a cache (see ``stats()`` and
+the ``password_hashing_stats`` command).
+
+With a share of 0, or outside an ``offload_hashing`` view (the admin,
+management commands), passwords are hashed inline as usual.
+
+The hashers here also take their cost parameters from
+``PASSWORD_HASHER_COSTS``, which ``calibrate_password_hasher`` works out for
+the host it's run on.
+"""
+
+import base64
+import contextvars
+import functools
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.cache import caches
+from django.utils.crypto import pbkdf2, salted_hmac
+from rest_framework import exceptions, status
+
+logger = logging.getLogger(__name__)
+
+STATS = ("hashed", "queue_full", "timed_out", "queue_wait_us", "hash_us")
+
+_offloading = contextvars.ContextVar("offload_password_hashing", default=False)
+
+
+class HashingQueueFull(exceptions.Throttled):
+    default_detail = "Too many sign-ins are waiting to be checked."
+    default_code = "hashing_queue_full"
+
+
+class HashingUnavailable(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Sign-ins can't be checked right now, try again shortly."
+    default_code = "hashing_unavailable"
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class HashingExecutor:
+    def __init__(self, workers, queue_size, max_wait):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.slots = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.pool = None
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                # not forked: the server process has threads (and DB connections)
+                self.pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self.pool
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+    def run(self, func, *args, **kwargs):
+        """
+        Call ``func`` in the pool and return its result.
+
+        Raises HashingQueueFull or HashingUnavailable instead if the call
+        isn't admitted.
+        """
+        started = time.monotonic()
+        if not self.slots.acquire(blocking=False):
+            self.wait_for_slot()
+        try:
+            admitted = time.monotonic()
+            try:
+                result = self.get_pool().submit(func, *args, **kwargs).result()
+            except BrokenProcessPool:
+                # a worker died; start a new pool next time
+                with self.lock:
+                    self.pool = None
+                raise
+            finished = time.monotonic()
+        finally:
+            self.slots.release()
+        count(
+            hashed=1,
+            queue_wait_us=round((admitted - started) * 1e6),
+            hash_us=round((finished - admitted) * 1e6),
+        )
+        return result
+
+    def wait_for_slot(self):
+        wait = math.ceil(self.max_wait)
+        with self.lock:
+            if self.waiting >= self.queue_size:
+                count(queue_full=1)
+                logger.warning("Password hashing queue is full, refusing a request.")
+                raise HashingQueueFull(wait)
+            self.waiting += 1
+        try:
+            acquired = self.slots.acquire(timeout=self.max_wait)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        if not acquired:
+            count(timed_out=1)
+            logger.warning("Timed out waiting to hash a password.")
+            raise HashingUnavailable(wait)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pool_size():
+    """Pool workers for ``PASSWORD_HASHING_CPU_SHARE``; 0 means hash inline."""
+    share = settings.PASSWORD_HASHING_CPU_SHARE
+    if share <= 0:
+        return 0
+    return max(1, math.floor((os.cpu_count() or 1) * share))
+
+
+def get_executor():
+    """The process-wide executor, or None if hashing isn't offloaded."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = pool_size()
+            if not workers:
+                return None
+            _executor = HashingExecutor(
+                workers=workers,
+                queue_size=settings.PASSWORD_HASHING_QUEUE_SIZE,
+                max_wait=settings.PASSWORD_HASHING_MAX_WAIT,
+            )
+        return _executor
+
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown()
+
+
+def offload_hashing(method):
+    """Hash passwords in the pool for the duration of a view method."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _offloading.set(True)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _offloading.reset(token)
+
+    return wrapper
+
+
+def calibrated(name, default):
+    """
+    A hasher cost parameter that ``PASSWORD_HASHER_COSTS`` can set (see the
+    ``calibrate_password_hasher`` command).
+
+    Hashes made at another cost are rehashed at this one the next time the
+    password is checked, as with any change to Django's hasher defaults.
+    """
+
+    def get(self):
+        return settings.PASSWORD_HASHER_COSTS.get(self.algorithm, {}).get(name, default)
+
+    return property(get)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher, with calibrated iterations, hashing in the pool
+    in ``offload_hashing`` views.
+    """
+
+    iterations = calibrated("iterations", hashers.PBKDF2PasswordHasher.iterations)
+
+    def encode(self, password, salt, iterations=None):
+        executor = get_executor() if _offloading.get() else None
+        if executor is None:
+            return super().encode(password, salt, iterations)
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        hash = executor.run(pbkdf2, password, salt, iterations, digest=self.digest)
+        hash = base64.b64encode(hash).decode("ascii").strip()
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Django's Argon2 hasher, with calibrated time and memory costs."""
+
+    time_cost = calibrated("time_cost", hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = calibrated("memory_cost", hashers.Argon2PasswordHasher.memory_cost)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """Django's scrypt hasher, with a calibrated work factor."""
+
+    work_factor = calibrated("work_factor", hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def maxmem(self):
+        # scrypt needs 128 * n * r bytes, and OpenSSL refuses more than 32MiB
+        # unless told otherwise
+        return 2 * 128 * self.work_factor * self.block_size
+
+
+def check_password(request, user, raw_password):
+    """
+    ``user.check_password(raw_password)``, remembered for the rest of the
+    request, so a view and its serializer don't each pay for a hash.
+    """
+    # the HttpRequest, which DRF's Request wraps
+    request = getattr(request, "_request", request)
+    checks = request.__dict__.setdefault("password_checks", {})
+    # the password is only kept as an HMAC, so the request never holds it in
+    # the clear for an error report or debug page to show
+    password = salted_hmac(__name__, raw_password).hexdigest()
+    # the stored hash is part of the key, so a new password is checked afresh
+    key = (user.pk, user.password, password)
+    if key not in checks:
+        checks[key] = user.check_password(raw_password)
+        # a check can rehash the password with stronger settings and save it
+        checks[(user.pk, user.password, password)] = checks[key]
+    return checks[key]
+
+
+def get_cache():
+    return caches[settings.PASSWORD_HASHING_STATS_CACHE]
+
+
+def stats_key(name):
+    return f"accounts:hashing:{name}"
+
+
+def count(**amounts):
+    cache = get_cache()
+    for name, amount in amounts.items():
+        key = stats_key(name)
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+
+
+def stats():
+    values = get_cache().get_many([stats_key(name) for name in STATS])
+    return {name: values.get(stats_key(name), 0) for name in STATS}
+
+
+def reset_stats():
+    get_cache().delete_many([stats_key(name) for name in STATS])
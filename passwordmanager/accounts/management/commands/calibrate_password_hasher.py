@@ -0,0 +1,197 @@
+import hashlib
+import math
+import os
+import socket
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from accounts.hashing import pool_size
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+PASSWORD = "correct horse battery staple"
+SALT = "calibrationsalt0"
+
+CALIBRATORS = {}
+
+
+def calibrator(algorithm):
+    """Register the cost search for ``algorithm``."""
+
+    def register(func):
+        CALIBRATORS[algorithm] = func
+        return func
+
+    return register
+
+
+def measure(base, samples, **costs):
+    """Median milliseconds for a ``base`` hasher with ``costs`` to hash once."""
+    hasher = type("Trial", (base,), costs)()
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.encode(PASSWORD, SALT)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def scrypt_costs(work_factor):
+    block_size = hashers.ScryptPasswordHasher.block_size
+    return {"work_factor": work_factor, "maxmem": 2 * 128 * work_factor * block_size}
+
+
+# Each search scales from a cheap probe, as the cost of all three grows
+# linearly with the parameter tuned, and never goes below Django's default.
+
+
+@calibrator("pbkdf2_sha256")
+def calibrate_pbkdf2(target, samples):
+    base = hashers.PBKDF2PasswordHasher
+    probe = 100_000
+    ms = measure(base, samples, iterations=probe)
+    iterations = round(probe * target / ms, -4)
+    return {"iterations": max(base.iterations, int(iterations))}
+
+
+@calibrator("argon2")
+def calibrate_argon2(target, samples):
+    # memory stays at Django's default, as every concurrent login holds it
+    base = hashers.Argon2PasswordHasher
+    ms = measure(base, samples, time_cost=1)
+    return {"time_cost": max(base.time_cost, math.floor(target / ms))}
+
+
+@calibrator("scrypt")
+def calibrate_scrypt(target, samples):
+    # the work factor sets memory as well as time, and must be a power of 2
+    base = hashers.ScryptPasswordHasher
+    ms = measure(base, samples, **scrypt_costs(base.work_factor))
+    doublings = max(0, math.floor(math.log2(target / ms)))
+    return {"work_factor": base.work_factor << doublings}
+
+
+BASES = {
+    "pbkdf2_sha256": hashers.PBKDF2PasswordHasher,
+    "argon2": hashers.Argon2PasswordHasher,
+    "scrypt": hashers.ScryptPasswordHasher,
+}
+
+
+def available(algorithm):
+    if algorithm == "argon2":
+        return argon2 is not None
+    if algorithm == "scrypt":
+        return hasattr(hashlib, "scrypt")
+    return True
+
+
+def describe(algorithm, costs):
+    described = ", ".join(f"{name}={value}" for name, value in costs.items())
+    if algorithm == "scrypt":
+        block_size = hashers.ScryptPasswordHasher.block_size
+        memory = 128 * costs["work_factor"] * block_size
+        described += f" ({memory // 2**20}MiB)"
+    elif algorithm == "argon2":
+        described += f" ({hashers.Argon2PasswordHasher.memory_cost // 1024}MiB)"
+    return described
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the password hashers on this host and print settings that make "
+        "one hash take about PASSWORD_HASHING_TARGET_MS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-ms",
+            type=int,
+            default=settings.PASSWORD_HASHING_TARGET_MS,
+            help="How long one hash should take (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--algorithms",
+            nargs="+",
+            choices=sorted(CALIBRATORS),
+            default=list(CALIBRATORS),
+        )
+        parser.add_argument(
+            "--prefer",
+            choices=sorted(CALIBRATORS),
+            help="Hash new passwords with this algorithm (default: the current one)",
+        )
+        parser.add_argument(
+            "--samples", type=int, default=5, help="Hashes timed per measurement"
+        )
+
+    def handle(self, *args, **options):
+        target = options["target_ms"]
+        samples = options["samples"]
+        paths = {
+            import_string(path).algorithm: path for path in settings.PASSWORD_HASHERS
+        }
+        prefer = options["prefer"] or hashers.get_hasher().algorithm
+        if prefer not in paths:
+            raise CommandError(f"{prefer} isn't in PASSWORD_HASHERS.")
+        if prefer not in options["algorithms"] or not available(prefer):
+            raise CommandError(f"{prefer} isn't one of the hashers being calibrated.")
+
+        lines = [
+            f"# calibrate_password_hasher on {socket.gethostname()}: "
+            f"{target}ms a hash, median of {samples}"
+        ]
+        costs = {}
+        for algorithm in options["algorithms"]:
+            if not available(algorithm):
+                lines.append(f"#   {algorithm:<14} not available on this host")
+                continue
+            costs[algorithm] = CALIBRATORS[algorithm](target, samples)
+            trial = dict(costs[algorithm])
+            if algorithm == "scrypt":
+                trial = scrypt_costs(trial["work_factor"])
+            ms = measure(BASES[algorithm], samples, **trial)
+            at_default = all(
+                getattr(BASES[algorithm], name) == value
+                for name, value in costs[algorithm].items()
+            )
+            note = (
+                "  (Django's default, over the target)"
+                if at_default and ms > target
+                else ""
+            )
+            lines.append(
+                f"#   {algorithm:<14} {describe(algorithm, costs[algorithm]):<40} "
+                f"{ms:>6.0f}ms{note}"
+            )
+            if algorithm == prefer:
+                preferred_ms = ms
+
+        workers = pool_size() if prefer == "pbkdf2_sha256" else 0
+        cores = workers or os.cpu_count() or 1
+        lines.append(
+            f"# {prefer}: about {cores * 1000 / preferred_ms:.0f} logins a second "
+            f"per server process, on {cores} "
+            f"{'hashing workers' if workers else 'cores'}"
+        )
+
+        order = [prefer] + [a for a in paths if a != prefer]
+        lines.append("PASSWORD_HASHERS = [")
+        lines.extend(f'    "{paths[algorithm]}",' for algorithm in order)
+        lines.append("]")
+        lines.append("PASSWORD_HASHER_COSTS = {")
+        for algorithm, values in costs.items():
+            described = ", ".join(
+                f'"{name}": {value}' for name, value in values.items()
+            )
+            lines.append(f'    "{algorithm}": {{{described}}},')
+        lines.append("}")
+        self.stdout.write("\n".join(lines))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from accounts import hashing
+
+
+class Command(BaseCommand):
+    help = "Show queue waits, hash times and refusals of the password hashing pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        stats = hashing.stats()
+        hashed = stats["hashed"]
+        wait = stats["queue_wait_us"] / hashed / 1000 if hashed else 0
+        took = stats["hash_us"] / hashed / 1000 if hashed else 0
+        self.stdout.write(
+            f"hashed {hashed}, mean queue wait {wait:.1f}ms, "
+            f"mean hash time {took:.1f}ms, refused {stats['queue_full']} "
+            f"(queue full), {stats['timed_out']} (timed out)"
+        )
+        if options["reset"]:
+            hashing.reset_stats()
@@ -5,6 +5,8 @@ from django.core.exceptions import ValidationError
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import default_token_generator
 
+from .hashing import check_password
+
 
 class AuthResponseSerializer(serializers.Serializer):
     username = serializers.CharField()
@@ -82,8 +84,8 @@ class ChangePasswordSerializer(serializers.Serializer):
     # confirm_new_password = serializers.CharField(required=True)
 
     def validate_old_password(self, value):
-        user = self.context["request"].user
-        if not user.check_password(value):
+        request = self.context["request"]
+        if not check_password(request, request.user, value):
             raise serializers.ValidationError("Old password is incorrect.")
         return value
 
@@ -125,8 +127,8 @@ class SetMFASerializer(serializers.Serializer):
     )
 
     def validate_password(self, value):
-        user = self.context["request"].user
-        if not user.check_password(value):
+        request = self.context["request"]
+        if not check_password(request, request.user, value):
             raise serializers.ValidationError("Incorrect password.")
         return value
 
@@ -1,6 +1,7 @@
 from django.urls import path
 from django.conf import settings
 from accounts.views import (
+    AsyncUserInfoLookupView,
     ChangePasswordView,
     CheckIdentifierAvailableView,
     CredentialsLoginView,
@@ -38,6 +39,11 @@ urlpatterns = [
     path("change-password/", ChangePasswordView.as_view(), name="change_password"),
     path("csrf/", CSRFTokenView.as_view(), name="csrf_token"),
     path("userinfo/", UserInfoLookupView.as_view(), name="user_info_lookup"),
+    path(
+        "async/userinfo/",
+        AsyncUserInfoLookupView.as_view(),
+        name="async_user_info_lookup",
+    ),
     path(
         "mfa/email/enroll/",
         SendEmailMFAEnrollmentRequestView.as_view(),
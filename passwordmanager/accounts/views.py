@@ -8,13 +8,18 @@ from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
+from django.http import JsonResponse
+from django.views import View
 
 import pyotp
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotAuthenticated
 
+from .hashing import check_password, offload_hashing
+from .models import UserProfile
 from .mfa_utils import (
     send_mfa_challenge,
     send_mfa_enrollment_email,
@@ -57,6 +62,7 @@ class CredentialsLoginView(APIView):
     permission_classes = [AllowAny]
     serializer_class = AuthResponseSerializer
 
+    @offload_hashing
     def post(self, request):
         if not settings.DEBUG:
             return Response(
@@ -101,6 +107,7 @@ class CreateUserView(APIView):
     permission_classes = [AllowAny]
     serializer_class = CreateUserSerializer
 
+    @offload_hashing
     def post(self, request):
         print("CreateUserView called with data:", request.data)
         serializer = CreateUserSerializer(data=request.data)
@@ -171,6 +178,7 @@ class SessionLoginView(APIView):
     permission_classes = [AllowAny]
     serializer_class = SessionLoginSerializer
 
+    @offload_hashing
     def post(self, request):
         """Django's session framework automatically handles:
         - Secure session ID generation
@@ -240,13 +248,16 @@ class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ChangePasswordSerializer
 
+    @offload_hashing
     def post(self, request):
         serializer = ChangePasswordSerializer(
             data=request.data, context={"request": request}
         )
         if serializer.is_valid():
             user = request.user
-            if not user.check_password(serializer.validated_data["old_password"]):
+            old_password = serializer.validated_data["old_password"]
+            # already checked by the serializer, so this doesn't hash again
+            if not check_password(request, user, old_password):
                 return Response(
                     {"old_password": ["Wrong password."]},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -554,3 +565,25 @@ class UserInfoLookupView(APIView):
             "mfa_totp_enabled": user.userprofile.totp_enabled,
         }
         return Response(data, status=status.HTTP_200_OK)
+
+
+class AsyncUserInfoLookupView(View):
+    """UserInfoLookupView as a native async view, for ASGI deployments."""
+
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            # what DRF answers for the sync view, with session authentication
+            return JsonResponse(
+                {"detail": NotAuthenticated.default_detail},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        profile = await UserProfile.objects.aget(user=user)
+        data = {
+            "username": user.username,
+            "email": user.email,
+            "mfa_enabled": profile.mfa_enabled,
+            "mfa_sms_enabled": profile.mfa_sms_enabled,
+            "mfa_totp_enabled": profile.totp_enabled,
+        }
+        return JsonResponse(data, status=status.HTTP_200_OK)
@@ -0,0 +1,236 @@
+"""
+Response compression.
+
+Like Django's GZipMiddleware, but it also offers Brotli, picks the encoding
+from the client's ``Accept-Encoding`` preferences, leaves small responses
+alone, and compresses streamed responses (the vault export) as one stream
+rather than chunk by chunk.
+
+Compressing a response that holds a secret next to something an attacker
+controls lets them guess the secret one byte at a time from the compressed
+size (BREACH), by making the victim's browser send requests they choose.
+So responses are never compressed if:
+
+- they carry the CSRF token;
+- they come from a path in ``COMPRESSION_EXEMPT_PATHS`` (the account
+  endpoints, which return tokens and MFA secrets);
+- the request has a query string and went to one of the views named in
+  ``COMPRESSION_QUERY_EXEMPT_VIEWS``. Vault item titles and descriptions
+  are stored in plain text, and the list, trash, search and history pages
+  echo the query string (``?q=`` and anything else) in their ``next``
+  links, however the page was built (paginated, from the page cache or by
+  the async views).
+
+The ciphertext is encrypted by the client, so it's no help to an attacker,
+and what's left to compress is vault data with nothing of the attacker's
+beside it: the first page of a list, a single item, the change feed and the
+export.
+
+Brotli is only offered if the ``brotli`` or ``brotlicffi`` package is
+installed.
+"""
+
+import zlib
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# dynamic responses are compressed on every request, so trade a little ratio
+# for speed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+class GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self):
+        # wbits 16 + MAX_WBITS gives a gzip header and trailer
+        self.compressor = zlib.compressobj(
+            GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    encoding = "br"
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        # both brotli and brotlicffi have process()
+        return self.compressor.process(data)
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+
+
+def compress(compressor_class, data):
+    compressor = compressor_class()
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_sequence(compressor_class, sequence):
+    compressor = compressor_class()
+    for chunk in sequence:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_sequence(compressor_class, sequence):
+    compressor = compressor_class()
+    async for chunk in sequence:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def parse_accept_encoding(header):
+    """``Accept-Encoding`` as a dict of coding -> q-value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, *params = part.strip().split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """
+    The encoding to use for a client sending ``header`` as Accept-Encoding,
+    or None to send the response as it is.
+
+    The client's highest q-value wins; on a tie Brotli is preferred, as it
+    compresses JSON better at the same speed.
+    """
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in ("br", "gzip"):
+        if encoding not in COMPRESSORS:
+            continue
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if not self.should_compress(request, response):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+        compressor_class = COMPRESSORS[encoding]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_sequence(
+                    compressor_class, response.streaming_content
+                )
+            else:
+                response.streaming_content = compress_sequence(
+                    compressor_class, response.streaming_content
+                )
+            # the compressed length isn't known until it's all been sent
+            del response.headers["Content-Length"]
+        else:
+            compressed = compress(compressor_class, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # a strong ETag promises the same bytes; the vault's ETags are weak
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def should_compress(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return False
+        if not response.streaming and (
+            len(response.content) < settings.COMPRESSION_MIN_LENGTH
+        ):
+            return False
+        content_type = response.get("Content-Type", "").lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return not self.may_hold_secret(request, response)
+
+    def may_hold_secret(self, request, response):
+        """Whether compressing the response could leak a secret (BREACH)."""
+        # get_token() was called, so the token may be in the body; by the
+        # time this runs CsrfViewMiddleware has usually turned that into the
+        # cookie being set
+        if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+            return True
+        if settings.CSRF_COOKIE_NAME in response.cookies:
+            return True
+        if request.GET and self.echoes_query(request):
+            return True
+        return request.path.startswith(tuple(settings.COMPRESSION_EXEMPT_PATHS))
+
+    def echoes_query(self, request):
+        """Whether the view's pages echo the query string (the next links)."""
+        # decided from the URL rather than the response, which may have come
+        # from the page cache or an async view as well as the paginator
+        match = request.resolver_match or resolve_path(request.path_info)
+        return match is not None and (
+            match.view_name in settings.COMPRESSION_QUERY_EXEMPT_VIEWS
+        )
+
+
+def resolve_path(path):
+    """The ResolverMatch for ``path``, or None if no view matches it."""
+    try:
+        return resolve(path)
+    except Resolver404:
+        return None
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "passwordmanager.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -164,9 +165,71 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "oidc-cache",
-    }
+    },
+    # buffered vault writes; use a shared cache (Redis/Memcached) in production
+    # so every worker buffers into, and flushes from, the same place
+    "vault": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "vault-cache",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
 }
 
+# cached pages of vault item lists (see vault/pagecache.py); with more than one
+# worker this must be a shared cache, or writes only invalidate their own worker
+VAULT_LIST_CACHE = "vault"
+# seconds a cached page is kept, at most
+VAULT_LIST_CACHE_TIMEOUT = env.int("VAULT_LIST_CACHE_TIMEOUT", default=300)
+
+# vault item access tracking (see vault/access.py)
+VAULT_ACCESS_CACHE = "vault"
+# seconds an item's last_accessed may lag behind its most recent access
+VAULT_ACCESS_STALENESS = env.int("VAULT_ACCESS_STALENESS", default=60)
+# seconds between flushes of buffered access times to the DB
+VAULT_ACCESS_FLUSH_INTERVAL = env.int("VAULT_ACCESS_FLUSH_INTERVAL", default=30)
+
+# history rows are written by a background thread unless this is "sync"
+VAULT_AUDIT_MODE = env("VAULT_AUDIT_MODE", default="async")
+VAULT_AUDIT_BATCH_SIZE = env.int("VAULT_AUDIT_BATCH_SIZE", default=200)
+# seconds the writer waits for more rows before writing a partial batch
+VAULT_AUDIT_FLUSH_INTERVAL = env.int("VAULT_AUDIT_FLUSH_INTERVAL", default=1)
+# rows beyond this many waiting go to the spool file instead
+VAULT_AUDIT_QUEUE_SIZE = env.int("VAULT_AUDIT_QUEUE_SIZE", default=10000)
+VAULT_AUDIT_SPOOL_PATH = env(
+    "VAULT_AUDIT_SPOOL_PATH", default=str(BASE_DIR / "vault-audit.spool")
+)
+# prune_vault_history removes history rows older than this many days
+VAULT_HISTORY_RETENTION_DAYS = env.int("VAULT_HISTORY_RETENTION_DAYS", default=365)
+# the history endpoint only looks this far back unless ?since= is given
+VAULT_HISTORY_RECENT_DAYS = env.int("VAULT_HISTORY_RECENT_DAYS", default=90)
+# purge_vault_trash deletes items that have been in the trash this many days
+VAULT_TRASH_RETENTION_DAYS = env.int("VAULT_TRASH_RETENTION_DAYS", default=30)
+# where attachment chunks are stored, one file per distinct chunk
+VAULT_ATTACHMENT_ROOT = env(
+    "VAULT_ATTACHMENT_ROOT", default=str(BASE_DIR / "attachments")
+)
+VAULT_ATTACHMENT_CHUNK_SIZE = env.int(
+    "VAULT_ATTACHMENT_CHUNK_SIZE", default=1024 * 1024
+)
+VAULT_ATTACHMENT_MAX_SIZE = env.int(
+    "VAULT_ATTACHMENT_MAX_SIZE", default=100 * 1024 * 1024
+)
+
+# responses smaller than this many bytes aren't worth compressing
+COMPRESSION_MIN_LENGTH = env.int("COMPRESSION_MIN_LENGTH", default=1024)
+# responses from these paths are never compressed, since they can hold tokens
+# or MFA secrets (see passwordmanager/middleware.py)
+COMPRESSION_EXEMPT_PATHS = ["/api/accounts/", "/accounts/", "/api-auth/", "/admin/"]
+# and these views' responses aren't compressed if the request has a query
+# string, since their pages echo it next to plaintext item titles
+COMPRESSION_QUERY_EXEMPT_VIEWS = [
+    "vaultitem-list",
+    "vaultitem-deleted",
+    "vaultitem-search",
+    "vaultitem-async-list",
+    "vaultitemhistory-list",
+]
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -212,6 +275,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Django's defaults, with PBKDF2 able to hash in a process pool for the login
+# views, and costs that can be calibrated (see accounts/hashing.py)
+PASSWORD_HASHERS = [
+    "accounts.hashing.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "accounts.hashing.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "accounts.hashing.ScryptPasswordHasher",
+]
+# cost parameters by algorithm, e.g. {"pbkdf2_sha256": {"iterations": 1200000}};
+# calibrate_password_hasher prints values for the host it runs on, and anything
+# not set here is Django's default
+PASSWORD_HASHER_COSTS = {}
+# how long one hash should take, in milliseconds, for calibrate_password_hasher
+PASSWORD_HASHING_TARGET_MS = env.int("PASSWORD_HASHING_TARGET_MS", default=250)
+# share of the cores the password hashing pool may use; 0 hashes inline
+PASSWORD_HASHING_CPU_SHARE = env.float("PASSWORD_HASHING_CPU_SHARE", default=0.5)
+# requests that may wait for a free hashing worker; more are refused (429)
+PASSWORD_HASHING_QUEUE_SIZE = env.int("PASSWORD_HASHING_QUEUE_SIZE", default=32)
+# seconds a request may wait for a hashing worker before a 503
+PASSWORD_HASHING_MAX_WAIT = env.float("PASSWORD_HASHING_MAX_WAIT", default=2.0)
+PASSWORD_HASHING_STATS_CACHE = "default"
+
 
 # Session security settings copied from django examples
 SESSION_COOKIE_SECURE = True  # HTTPS only
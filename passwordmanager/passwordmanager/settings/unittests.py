@@ -8,4 +8,13 @@ DATABASES = {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "unittests.db",
     },
-}
\ No newline at end of file
+}
+
+# write buffered vault access times straight through so tests see them
+VAULT_ACCESS_FLUSH_INTERVAL = 0
+
+# write history rows inline, in the request's transaction
+VAULT_AUDIT_MODE = "sync"
+
+# hash passwords inline; the hashing tests start their own pool
+PASSWORD_HASHING_CPU_SHARE = 0
@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Assertions for keeping endpoints to a fixed number of queries.
+    Mix into a TestCase; a budget that's blown lists every query that ran,
+    which makes an N+1 easy to spot.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using="default"):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = "\n".join(
+                f"{i}. {query['sql']}"
+                for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f"{executed} queries executed, budget is {budget}\n"
+                f"Captured queries were:\n{queries}"
+            )
+
+    def assertRequestWithinBudget(self, budget, method, url, data=None, **extra):
+        """Make a request with ``self.client`` and check its query count."""
+        with self.assertMaxQueries(budget):
+            response = getattr(self.client, method)(url, data, **extra)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, getattr(response, "data", None))
+        return response
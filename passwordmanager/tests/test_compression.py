@@ -0,0 +1,190 @@
+import gzip
+import json
+import unittest
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from passwordmanager.middleware import (
+    COMPRESSORS,
+    CompressionMiddleware,
+    brotli,
+    choose_encoding,
+)
+from vault.audit import record_history
+from vault.ciphertext import pack
+from vault.models import VaultItem
+
+
+class ChooseEncodingTest(SimpleTestCase):
+    def test_negotiation(self):
+        self.assertEqual(choose_encoding("gzip"), "gzip")
+        self.assertEqual(choose_encoding("gzip;q=0.5, deflate"), "gzip")
+        self.assertIsNone(choose_encoding(""))
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIsNone(choose_encoding("gzip;q=oops"))
+
+    @unittest.skipUnless(brotli, "brotli isn't installed")
+    def test_brotli_preferred(self):
+        self.assertEqual(choose_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(choose_encoding("BR;q=0.5, gzip;q=0.8"), "gzip")
+        self.assertEqual(choose_encoding("*;q=0.1"), "br")
+        self.assertEqual(choose_encoding("br;q=0, *"), "gzip")
+
+
+class CompressionMiddlewareTest(SimpleTestCase):
+    body = {"results": [{"item_type": "password", "title": "x"}] * 100}
+
+    def process(self, response, path="/api/vault/items/"):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING="gzip")
+        middleware = CompressionMiddleware(lambda request: response)
+        return request, middleware.process_response(request, response)
+
+    def test_compresses_large_json(self):
+        response = JsonResponse(self.body)
+        response["ETag"] = '"abc"'
+        _, response = self.process(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.body)
+
+    def test_leaves_small_and_binary_responses(self):
+        _, response = self.process(JsonResponse({"status": "ok"}))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        binary = HttpResponse(b"\0" * 4096, content_type="application/octet-stream")
+        _, response = self.process(binary)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_threshold_is_a_setting(self):
+        body = {"status": "ok" * 100}
+        _, response = self.process(JsonResponse(body))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        with self.settings(COMPRESSION_MIN_LENGTH=100):
+            _, response = self.process(JsonResponse(body))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_never_compresses_responses_with_the_csrf_token(self):
+        """Test a response that may hold the CSRF token isn't compressed (BREACH)"""
+        request = RequestFactory().get("/api/vault/items/", HTTP_ACCEPT_ENCODING="gzip")
+        response = JsonResponse({**self.body, "token": get_token(request)})
+        middleware = CompressionMiddleware(lambda request: response)
+        response = middleware.process_response(request, response)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = JsonResponse(self.body)
+        response.set_cookie("csrftoken", "secret")
+        _, response = self.process(response)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_never_compresses_reflected_queries(self):
+        """Test a page that echoes its query string is only compressed without one"""
+        _, response = self.process(
+            JsonResponse(self.body), path="/api/vault/items/search/?q=secret"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        _, response = self.process(JsonResponse(self.body))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        # other vault views don't echo it
+        _, response = self.process(
+            JsonResponse(self.body), path="/api/vault/items/changes/?since=1"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_never_compresses_account_responses(self):
+        _, response = self.process(JsonResponse(self.body), path="/api/accounts/x/")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @unittest.skipUnless(brotli, "brotli isn't installed")
+    def test_brotli(self):
+        request = RequestFactory().get("/api/vault/items/", HTTP_ACCEPT_ENCODING="br")
+        response = JsonResponse(self.body)
+        response = CompressionMiddleware(lambda r: response).process_response(
+            request, response
+        )
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(response.content)), self.body)
+
+    def test_every_compressor_streams(self):
+        chunks = [json.dumps(row).encode() + b"\n" for row in self.body["results"]]
+        for encoding, compressor_class in COMPRESSORS.items():
+            with self.subTest(encoding=encoding):
+                compressor = compressor_class()
+                data = b"".join(compressor.compress(c) for c in chunks)
+                data += compressor.finish()
+                decompress = (
+                    gzip.decompress if encoding == "gzip" else brotli.decompress
+                )
+                self.assertEqual(decompress(data), b"".join(chunks))
+
+
+class CompressedAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        for i in range(30):
+            VaultItem.objects.create(
+                user=self.user, title=f"item {i}", encrypted_data=pack("eA==")
+            )
+
+    def test_list_is_compressed(self):
+        url = reverse("vaultitem-list")
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_pages_echoing_the_query_are_not_compressed(self):
+        """Test list, search and history pages with a query string (BREACH)"""
+        items = VaultItem.objects.all()
+        for item in items:
+            record_history(item, self.user, "viewed")
+        items.filter(title__endswith="0").update(soft_deleted=True)
+        for url, params in [
+            (reverse("vaultitem-list"), {"page_size": 30}),
+            (reverse("vaultitem-deleted"), {"x": "y"}),
+            (reverse("vaultitem-search"), {"q": "item", "page_size": 30}),
+            (reverse("vaultitemhistory-list"), {"since": "2000-01-01"}),
+        ]:
+            # the second list request is answered from the page cache
+            for attempt in range(2):
+                with self.subTest(url=url, attempt=attempt):
+                    response = self.client.get(url, params, HTTP_ACCEPT_ENCODING="gzip")
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(response.has_header("Content-Encoding"))
+
+    async def test_async_list_echoing_the_query_is_not_compressed(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse("vaultitem-async-list")
+        for attempt in range(2):
+            with self.subTest(attempt=attempt):
+                response = await self.async_client.get(
+                    url, {"page_size": 30}, headers={"accept-encoding": "gzip"}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = await self.async_client.get(url, headers={"accept-encoding": "gzip"})
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_export_is_compressed_as_a_stream(self):
+        url = reverse("vaultitem-export")
+        plain = b"".join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        compressed = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(compressed), plain)
@@ -0,0 +1,248 @@
+import hashlib
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import hashers
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.crypto import pbkdf2
+from rest_framework.test import APIClient
+
+from accounts import hashing
+from accounts.hashing import (
+    HashingExecutor,
+    HashingQueueFull,
+    HashingUnavailable,
+    PBKDF2PasswordHasher,
+    check_password,
+)
+from accounts.serializers import SetMFASerializer
+
+
+class HashingExecutorTest(SimpleTestCase):
+    def setUp(self):
+        hashing.reset_stats()
+
+    def test_runs_in_the_pool(self):
+        executor = HashingExecutor(workers=1, queue_size=1, max_wait=5)
+        self.addCleanup(executor.shutdown)
+        args = ("password", "salt", 1000)
+        result = executor.run(pbkdf2, *args, digest=hashlib.sha256)
+        self.assertEqual(result, pbkdf2(*args, digest=hashlib.sha256))
+        stats = hashing.stats()
+        self.assertEqual(stats["hashed"], 1)
+        self.assertGreater(stats["hash_us"], 0)
+
+    def test_admission(self):
+        executor = HashingExecutor(workers=1, queue_size=0, max_wait=0.05)
+        # the one worker is busy
+        executor.slots.acquire()
+        with self.assertRaises(HashingQueueFull):
+            executor.run(pbkdf2, "password", "salt", 1000)
+
+        executor.queue_size = 1
+        with self.assertRaises(HashingUnavailable) as raised:
+            executor.run(pbkdf2, "password", "salt", 1000)
+        self.assertEqual(raised.exception.wait, 1)
+        self.assertEqual(executor.waiting, 0)
+
+        stats = hashing.stats()
+        self.assertEqual((stats["queue_full"], stats["timed_out"]), (1, 1))
+        self.assertEqual(stats["hashed"], 0)
+
+
+class OffloadedLoginTest(TestCase):
+    password = "TestPassword123!"
+
+    def setUp(self):
+        hashing.reset_stats()
+        self.user = User.objects.create_user(
+            username="test@example.com", password=self.password
+        )
+        self.executor = HashingExecutor(workers=1, queue_size=0, max_wait=0.05)
+        self.addCleanup(self.executor.shutdown)
+        self.patch_executor(self.executor)
+        self.client = APIClient()
+        self.url = reverse("accounts:session_login")
+
+    def patch_executor(self, executor):
+        original = hashing._executor
+        hashing._executor = executor
+        self.addCleanup(setattr, hashing, "_executor", original)
+
+    def login(self):
+        return self.client.post(
+            self.url, {"username": "test@example.com", "password": self.password}
+        )
+
+    def test_login_hashes_in_the_pool(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hashing.stats()["hashed"], 1)
+
+    def test_only_offloading_views_use_the_pool(self):
+        self.assertTrue(self.user.check_password(self.password))
+        self.assertEqual(hashing.stats()["hashed"], 0)
+
+    def test_busy(self):
+        self.executor.slots.acquire()
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+
+        self.executor.queue_size = 1
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+
+class HashCountTest(TestCase):
+    """How many times each endpoint runs the (slow) hasher"""
+
+    password = "OldPassword123!"
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password=self.password,
+        )
+        self.client = APIClient()
+
+    def count_hashes(self):
+        patcher = mock.patch.object(
+            PBKDF2PasswordHasher,
+            "encode",
+            autospec=True,
+            side_effect=PBKDF2PasswordHasher.encode,
+        )
+        encode = patcher.start()
+        self.addCleanup(patcher.stop)
+        return encode
+
+    def test_login(self):
+        encode = self.count_hashes()
+        response = self.client.post(
+            reverse("accounts:session_login"),
+            {"username": "test@example.com", "password": self.password},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(encode.call_count, 1)
+
+    @override_settings(DEBUG=True)
+    def test_credentials_login(self):
+        encode = self.count_hashes()
+        response = self.client.post(
+            reverse("accounts:credentials_login"),
+            {"username": "test@example.com", "password": self.password},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(encode.call_count, 1)
+
+    def test_register(self):
+        encode = self.count_hashes()
+        response = self.client.post(
+            reverse("accounts:create_user"),
+            {"email": "new@example.com", "password": "NewPassword123!"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(encode.call_count, 1)
+
+    def test_change_password(self):
+        """Test the old password is checked once, then the new one hashed"""
+        self.client.force_authenticate(user=self.user)
+        encode = self.count_hashes()
+        response = self.client.post(
+            reverse("accounts:change_password"),
+            {"old_password": self.password, "new_password": "NewPassword123!"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(encode.call_count, 2)
+
+        encode.reset_mock()
+        response = self.client.post(
+            reverse("accounts:change_password"),
+            {"old_password": "wrong", "new_password": "NewPassword123!"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(encode.call_count, 1)
+
+    def test_set_mfa(self):
+        request = RequestFactory().post("/")
+        request.user = self.user
+        encode = self.count_hashes()
+        serializer = SetMFASerializer(
+            data={"mfa_enabled": True, "password": self.password},
+            context={"request": request},
+        )
+        self.assertTrue(serializer.is_valid())
+        self.assertTrue(check_password(request, self.user, self.password))
+        self.assertEqual(encode.call_count, 1)
+
+    def test_upgraded_hash_is_remembered(self):
+        """Test a check that rehashes the password still counts for the request"""
+        hasher = PBKDF2PasswordHasher()
+        self.user.password = hasher.encode(self.password, hasher.salt(), 1000)
+        self.user.save()
+        request = RequestFactory().post("/")
+        encode = self.count_hashes()
+        self.assertTrue(check_password(request, self.user, self.password))
+        # the check, then the rehash at the current iterations
+        self.assertEqual(encode.call_count, 2)
+        self.assertIn(f"${hasher.iterations}$", self.user.password)
+        self.assertTrue(check_password(request, self.user, self.password))
+        self.assertFalse(check_password(request, self.user, "wrong"))
+        self.assertEqual(encode.call_count, 3)
+
+    def test_passwords_arent_kept_in_the_clear(self):
+        request = RequestFactory().post("/")
+        self.assertTrue(check_password(request, self.user, self.password))
+        self.assertEqual(len(request.password_checks), 1)
+        self.assertNotIn(self.password, repr(request.password_checks))
+
+
+class CalibratedCostTest(TestCase):
+    password = "TestPassword123!"
+
+    def test_costs_come_from_settings(self):
+        hasher = PBKDF2PasswordHasher()
+        self.assertEqual(hasher.iterations, hashers.PBKDF2PasswordHasher.iterations)
+        with self.settings(PASSWORD_HASHER_COSTS={"pbkdf2_sha256": {"iterations": 5}}):
+            self.assertEqual(hasher.iterations, 5)
+
+    def test_login_upgrades_the_hash(self):
+        user = User.objects.create_user(
+            username="test@example.com", password=self.password
+        )
+        costs = {"pbkdf2_sha256": {"iterations": 1000}}
+        with self.settings(PASSWORD_HASHER_COSTS=costs):
+            response = APIClient().post(
+                reverse("accounts:session_login"),
+                {"username": "test@example.com", "password": self.password},
+            )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+    def test_calibrate_command(self):
+        """Test the command prints settings, never going below Django's defaults"""
+        out = StringIO()
+        call_command(
+            "calibrate_password_hasher",
+            "--algorithms=pbkdf2_sha256",
+            "--target-ms=1",
+            "--samples=1",
+            stdout=out,
+        )
+        fragment = {}
+        exec(out.getvalue(), fragment)
+        self.assertEqual(
+            fragment["PASSWORD_HASHER_COSTS"],
+            {"pbkdf2_sha256": {"iterations": hashers.PBKDF2PasswordHasher.iterations}},
+        )
+        self.assertEqual(
+            fragment["PASSWORD_HASHERS"][0], "accounts.hashing.PBKDF2PasswordHasher"
+        )
@@ -0,0 +1,109 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from tests.query_budget import QueryBudgetMixin
+from vault.models import VaultItem
+
+# rows created up front, so anything that queries per row blows its budget
+ROWS = 15
+
+
+class VaultQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        for i in range(ROWS):
+            response = self.client.post(
+                reverse("vaultitem-list"),
+                {"title": f"item {i}", "encrypted_data": "ZGF0YQ=="},
+                format="json",
+            )
+        self.item = VaultItem.objects.get(pk=response.data["id"])
+        self.detail_url = reverse("vaultitem-detail", args=[self.item.pk])
+
+    def test_list(self):
+        self.assertRequestWithinBudget(4, "get", reverse("vaultitem-list"))
+
+    def test_detail(self):
+        self.assertRequestWithinBudget(2, "get", self.detail_url)
+
+    def test_create(self):
+        self.assertRequestWithinBudget(
+            9,
+            "post",
+            reverse("vaultitem-list"),
+            {"title": "new", "encrypted_data": "ZGF0YQ=="},
+            format="json",
+        )
+
+    def test_update(self):
+        self.assertRequestWithinBudget(
+            9,
+            "patch",
+            self.detail_url,
+            {"title": "renamed"},
+            format="json",
+        )
+
+    def test_deleted(self):
+        VaultItem.objects.filter(user=self.user).update(soft_deleted=True)
+        self.assertRequestWithinBudget(2, "get", reverse("vaultitem-deleted"))
+
+    def test_changes(self):
+        self.assertRequestWithinBudget(2, "get", reverse("vaultitem-changes"))
+
+    def test_export(self):
+        self.assertRequestWithinBudget(
+            3, "get", reverse("vaultitem-export"), {"history": "true"}
+        )
+
+    def test_history(self):
+        self.assertRequestWithinBudget(3, "get", reverse("vaultitemhistory-list"))
+
+    def test_history_detail(self):
+        history = self.item.history.get()
+        self.assertRequestWithinBudget(
+            2, "get", reverse("vaultitemhistory-detail", args=[history.pk])
+        )
+
+
+class AccountsQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+
+    def test_check_identifier(self):
+        self.assertRequestWithinBudget(
+            2,
+            "get",
+            reverse("accounts:check_identifier_available"),
+            {"q": "new@example.com"},
+        )
+
+    def test_login(self):
+        self.assertRequestWithinBudget(
+            9,
+            "post",
+            reverse("accounts:session_login"),
+            {"username": "test@example.com", "password": "TestPassword123!"},
+        )
+
+    def test_user_info(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertRequestWithinBudget(1, "get", reverse("accounts:user_info_lookup"))
+
+    def test_change_password(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertRequestWithinBudget(
+            1,
+            "post",
+            reverse("accounts:change_password"),
+            {"old_password": "TestPassword123!", "new_password": "NewPassword123!"},
+        )
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vault import access
+from vault.ciphertext import pack
+from vault.models import VaultItem
+
+
+@override_settings(VAULT_ACCESS_FLUSH_INTERVAL=3600)
+class AccessBufferTest(TestCase):
+    def setUp(self):
+        caches["vault"].clear()
+        # mark a flush as recently done so tests control when it happens
+        caches["vault"].add(access.FLUSH_DUE_KEY, 1, timeout=3600)
+        self.user = User.objects.create_user(username="test@example.com")
+        self.item = VaultItem.objects.create(
+            user=self.user, title="item", encrypted_data=pack("ZW5jcnlwdGVk")
+        )
+
+    def tearDown(self):
+        caches["vault"].clear()
+
+    def test_retrieve_does_not_write(self):
+        """Test a GET buffers the access instead of updating the row"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse("vaultitem-detail", args=[self.item.id])
+
+        with self.assertNumQueries(1):  # the item and its owner, no UPDATE
+            client.get(url)
+
+        self.item.refresh_from_db()
+        self.assertIsNone(self.item.last_accessed)
+
+        self.assertEqual(access.flush(), 1)
+        self.item.refresh_from_db()
+        self.assertIsNotNone(self.item.last_accessed)
+
+    def test_accesses_within_staleness_are_coalesced(self):
+        """Test repeated accesses inside the window are recorded once"""
+        now = timezone.now()
+        self.assertTrue(access.record_access(self.item.pk, self.user.pk, now))
+        self.assertFalse(
+            access.record_access(self.item.pk, self.user.pk, now + timedelta(seconds=1))
+        )
+
+        access.flush()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.last_accessed, now)
+
+    def test_flush_batches_many_items(self):
+        """Test one flush writes every buffered item in batched UPDATEs"""
+        items = VaultItem.objects.bulk_create(
+            [
+                VaultItem(
+                    user=self.user, title=f"item {i}", encrypted_data=pack("eA==")
+                )
+                for i in range(20)
+            ]
+        )
+        now = timezone.now()
+        for item in items:
+            access.record_access(item.pk, self.user.pk, now)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(access.flush(), 20)
+        self.assertEqual(
+            VaultItem.objects.filter(last_accessed=now).count(), len(items)
+        )
+        self.assertEqual(access.flush(), 0)
+
+    def test_unwritten_slot_is_retried_then_skipped(self):
+        """Test a claimed but missing slot holds the flush back only once"""
+        cache = caches["vault"]
+        now = timezone.now()
+        access.record_access(self.item.pk, self.user.pk, now)
+        cache.delete(access.slot_key(1))  # as if the writer hasn't got there yet
+
+        self.assertEqual(access.flush(), 0)
+        self.assertEqual(cache.get(access.FLUSHED_KEY, 0), 0)
+
+        self.assertEqual(access.flush(), 0)
+        self.assertEqual(cache.get(access.FLUSHED_KEY), 1)
+
+    @override_settings(VAULT_ACCESS_FLUSH_INTERVAL=1)
+    def test_flush_happens_when_due(self):
+        """Test a recorded access triggers a flush once the interval has passed"""
+        caches["vault"].delete(access.FLUSH_DUE_KEY)
+        access.record_access(self.item.pk, self.user.pk, timezone.now())
+        self.item.refresh_from_db()
+        self.assertIsNotNone(self.item.last_accessed)
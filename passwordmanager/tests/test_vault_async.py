@@ -0,0 +1,169 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import UserProfile
+from vault import pagecache
+from vault.ciphertext import pack
+from vault.models import VaultItem, VaultItemHistory
+
+
+class AsyncVaultViewsTest(TestCase):
+    """The async item views answer the same as the sync ones."""
+
+    def setUp(self):
+        caches["vault"].clear()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(user=self.user)
+        now = timezone.now()
+        self.items = [
+            VaultItem.objects.create(
+                user=self.user,
+                title=f"item {i}",
+                encrypted_data=pack("ZGF0YQ=="),
+                expires_at=now - timedelta(days=1) if i == 0 else None,
+            )
+            for i in range(3)
+        ]
+
+    async def test_list_matches_sync_list(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse("vaultitem-async-list")
+        response = await self.async_client.get(url, {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        sync = await self.sync_get(reverse("vaultitem-list"), {"page_size": 2})
+        self.assertEqual(data["results"], sync.json()["results"])
+        self.assertIn(url, data["next"])
+
+        rest = await self.async_client.get(data["next"])
+        self.assertEqual(len(rest.json()["results"]), 1)
+
+        cached = await self.async_client.get(
+            url, {"page_size": 2}, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_expired_filter(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse("vaultitem-async-list")
+        response = await self.async_client.get(url, {"expired": "true"})
+        self.assertEqual(
+            [item["title"] for item in response.json()["results"]], ["item 0"]
+        )
+        response = await self.async_client.get(url, {"expired": "maybe"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expired", response.json())
+
+    async def test_retrieve(self):
+        await self.async_client.aforce_login(self.user)
+        item = self.items[1]
+        response = await self.async_client.get(
+            reverse("vaultitem-async-detail", args=[item.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        sync = await self.sync_get(reverse("vaultitem-detail", args=[item.pk]))
+        data, expected = response.json(), sync.json()
+        # the sync request saw the access the async one recorded
+        data.pop("last_accessed"), expected.pop("last_accessed")
+        self.assertEqual(data, expected)
+        self.assertEqual(response["ETag"], sync["ETag"])
+
+        other = await User.objects.acreate_user(username="other@example.com")
+        await self.async_client.aforce_login(other)
+        response = await self.async_client.get(
+            reverse("vaultitem-async-detail", args=[item.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_create(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse("vaultitem-async-list"),
+            {"title": " new ", "encrypted_data": "ZGF0YQ=="},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual(data["title"], "new")
+        self.assertEqual(data["encrypted_data"], "ZGF0YQ==")
+        self.assertEqual(data["user_info"]["id"], self.user.pk)
+        self.assertTrue(
+            await VaultItemHistory.objects.filter(
+                vault_item_id=data["id"], action="created"
+            ).aexists()
+        )
+
+        response = await self.async_client.post(
+            reverse("vaultitem-async-list"),
+            {"title": " "},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"title", "encrypted_data"})
+
+        response = await self.async_client.post(
+            reverse("vaultitem-async-list"),
+            "not json",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_permissions(self):
+        url = reverse("vaultitem-async-list")
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+        await UserProfile.objects.filter(user=self.user).aupdate(mfa_enabled=True)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("MFA", response.json()["detail"])
+
+    async def test_user_info(self):
+        url = reverse("accounts:async_user_info_lookup")
+        self.assertEqual((await self.async_client.get(url)).status_code, 403)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url)
+        sync = await self.sync_get(reverse("accounts:user_info_lookup"))
+        self.assertEqual(response.json(), sync.json())
+
+    async def sync_get(self, url, params=None):
+        return await sync_to_async(self.sync_client.get)(url, params)
+
+
+@override_settings(VAULT_LIST_CACHE_TIMEOUT=300)
+class AsyncVaultPageCacheTest(TestCase):
+    def setUp(self):
+        caches["vault"].clear()
+        self.user = User.objects.create_user(username="test@example.com")
+        VaultItem.objects.create(
+            user=self.user, title="item", encrypted_data=pack("ZGF0YQ==")
+        )
+
+    async def test_pages_are_cached_and_invalidated(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse("vaultitem-async-list")
+        first = await self.async_client.get(url)
+        second = await self.async_client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(
+            await sync_to_async(pagecache.stats)(), {"hits": 1, "misses": 1}
+        )
+
+        await self.async_client.post(
+            url,
+            {"title": "new", "encrypted_data": "ZGF0YQ=="},
+            content_type="application/json",
+        )
+        response = await self.async_client.get(url)
+        self.assertEqual(len(response.json()["results"]), 2)
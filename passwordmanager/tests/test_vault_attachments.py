@@ -0,0 +1,198 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from vault import attachments, views
+from vault.ciphertext import pack
+from vault.models import VaultAttachmentChunk, VaultItem
+
+CONTENT = b"0123456789abcdefghij"  # five chunks of four bytes
+
+
+class AttachmentTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(
+            VAULT_ATTACHMENT_ROOT=self.root, VAULT_ATTACHMENT_CHUNK_SIZE=4
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.item = VaultItem.objects.create(
+            user=self.user, title="item", encrypted_data=pack("ZW5jcnlwdGVk")
+        )
+
+    def create_attachment(self, size=len(CONTENT)):
+        response = self.client.post(
+            reverse("vaultattachment-list"),
+            {"vault_item": str(self.item.pk), "name": "key.bin", "size": size},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put_chunk(self, attachment, index, data, **headers):
+        url = reverse("vaultattachment-upload-chunk", args=[attachment["id"], index])
+        return self.client.put(
+            url, data, content_type="application/octet-stream", headers=headers
+        )
+
+    def upload(self, content=CONTENT):
+        attachment = self.create_attachment(len(content))
+        for index in range(attachment["chunk_count"]):
+            response = self.put_chunk(
+                attachment, index, content[index * 4 : index * 4 + 4]
+            )
+            self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.post(
+            reverse("vaultattachment-complete", args=[attachment["id"]])
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return attachment
+
+    def download(self, attachment, **headers):
+        url = reverse("vaultattachment-download", args=[attachment["id"]])
+        response = self.client.get(url, headers=headers)
+        body = b"".join(response.streaming_content) if response.streaming else None
+        return response, body
+
+    def test_chunked_upload_and_download(self):
+        """Test a file uploaded in chunks comes back byte for byte"""
+        attachment = self.upload()
+        self.assertEqual(attachment["chunk_count"], 5)
+
+        response, body = self.download(attachment, accept="application/octet-stream")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, CONTENT)
+        self.assertEqual(response["Content-Length"], str(len(CONTENT)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("key.bin", response["Content-Disposition"])
+
+    def test_upload_can_resume(self):
+        """Test chunks can arrive out of order and the status lists what's in"""
+        attachment = self.create_attachment()
+        self.put_chunk(attachment, 3, CONTENT[12:16])
+        self.put_chunk(attachment, 0, CONTENT[0:4])
+
+        url = reverse("vaultattachment-detail", args=[attachment["id"]])
+        self.assertEqual(self.client.get(url).data["received"], [0, 3])
+
+        complete = reverse("vaultattachment-complete", args=[attachment["id"]])
+        response = self.client.post(complete)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["missing"], [1, 2, 4])
+
+        response, _body = self.download(attachment)
+        self.assertEqual(response.status_code, 409)
+
+    def test_chunk_size_is_checked(self):
+        """Test chunks of the wrong size, or out of range, are refused"""
+        attachment = self.create_attachment()
+        self.assertEqual(self.put_chunk(attachment, 0, b"01234").status_code, 400)
+        self.assertEqual(self.put_chunk(attachment, 4, b"ij!").status_code, 400)
+        self.assertEqual(self.put_chunk(attachment, 5, b"0123").status_code, 400)
+        self.assertEqual(
+            self.put_chunk(attachment, 0, b"0123", x_chunk_sha256="0" * 64).status_code,
+            400,
+        )
+        self.assertFalse(VaultAttachmentChunk.objects.exists())
+
+    def test_identical_chunks_are_stored_once(self):
+        """Test uploading the same ciphertext twice doesn't use more disk"""
+        self.upload(b"abcdabcdabcd")
+        self.upload(b"abcdabcdabcd")
+
+        digest = hashlib.sha256(b"abcd").hexdigest()
+        self.assertEqual(VaultAttachmentChunk.objects.filter(digest=digest).count(), 6)
+        stored = [files for _dir, _dirs, files in os.walk(self.root) if files]
+        self.assertEqual(stored, [[digest]])
+
+    def test_range_requests(self):
+        """Test Range returns just the bytes asked for, across chunk boundaries"""
+        attachment = self.upload()
+
+        response, body = self.download(attachment, range="bytes=2-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, CONTENT[2:10])
+        self.assertEqual(response["Content-Range"], f"bytes 2-9/{len(CONTENT)}")
+        self.assertEqual(response["Content-Length"], "8")
+
+        _response, body = self.download(attachment, range="bytes=-3")
+        self.assertEqual(body, CONTENT[-3:])
+        _response, body = self.download(attachment, range="bytes=15-")
+        self.assertEqual(body, CONTENT[15:])
+
+        response, _body = self.download(attachment, range="bytes=50-60")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(CONTENT)}")
+
+    def test_if_range_with_stale_etag_sends_whole_file(self):
+        """Test a Range with an outdated If-Range gets the full file"""
+        attachment = self.upload()
+        response, body = self.download(
+            attachment, range="bytes=0-3", if_range='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, CONTENT)
+
+        etag = response["ETag"]
+        response, body = self.download(attachment, range="bytes=0-3", if_range=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, CONTENT[:4])
+
+    def test_single_chunk_is_served_from_its_file(self):
+        """Test a one-chunk attachment is sent from the file itself"""
+        attachment = self.upload(b"abc")
+        with mock.patch.object(views, "ChunkedFile") as chunked_file:
+            _response, body = self.download(attachment)
+        chunked_file.assert_not_called()
+        self.assertEqual(body, b"abc")
+
+    def test_other_users_items_and_attachments(self):
+        """Test attachments can't be added to, or read from, another user"""
+        other = User.objects.create_user(username="other@example.com")
+        attachment = self.upload()
+
+        self.client.force_authenticate(user=other)
+        response, _body = self.download(attachment)
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(
+            reverse("vaultattachment-list"),
+            {"vault_item": str(self.item.pk), "name": "x", "size": 1},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_prune_removes_unused_chunks(self):
+        """Test chunks of deleted attachments are pruned, shared ones kept"""
+        first = self.upload(b"abcdwxyz")
+        self.upload(b"abcd")
+        self.client.delete(reverse("vaultattachment-detail", args=[first["id"]]))
+
+        self.assertEqual(attachments.prune_chunks(min_age=3600), 0)
+        self.assertEqual(attachments.prune_chunks(min_age=-1), 1)
+        stored = [name for _dir, _dirs, files in os.walk(self.root) for name in files]
+        self.assertEqual(stored, [hashlib.sha256(b"abcd").hexdigest()])
+
+
+class ParseRangeTest(TestCase):
+    def test_parse_range(self):
+        self.assertIsNone(attachments.parse_range(None, 10))
+        self.assertIsNone(attachments.parse_range("bytes=0-1,4-5", 10))
+        self.assertEqual(attachments.parse_range("bytes=0-", 10), (0, 9))
+        self.assertEqual(attachments.parse_range("bytes=5-100", 10), (5, 9))
+        self.assertEqual(attachments.parse_range("bytes=-100", 10), (0, 9))
+        for header in ("bytes=10-", "bytes=5-4", "bytes=-0"):
+            with self.assertRaises(ValueError):
+                attachments.parse_range(header, 10)
@@ -0,0 +1,206 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from vault import audit
+from vault.ciphertext import pack
+from vault.models import VaultItem, VaultItemHistory
+
+
+class AuditWriterTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test@example.com")
+        self.item = VaultItem.objects.create(
+            user=self.user, title="item", encrypted_data=pack("ZW5jcnlwdGVk")
+        )
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_path = os.path.join(spool_dir.name, "audit.spool")
+        self.writer = self.make_writer()
+
+    def make_writer(self, max_queue=100):
+        return audit.AuditWriter(
+            batch_size=10,
+            flush_interval=1,
+            max_queue=max_queue,
+            spool_path=self.spool_path,
+        )
+
+    def entry(self, action):
+        return {
+            "vault_item_id": self.item.pk,
+            "user_id": self.user.pk,
+            "action": action,
+            "details": {"n": action},
+            "timestamp": timezone.now(),
+        }
+
+    def actions(self):
+        return list(
+            VaultItemHistory.objects.order_by("timestamp", "id").values_list(
+                "action", flat=True
+            )
+        )
+
+    def test_drain_writes_in_batches(self):
+        """Test queued rows are written with one INSERT per batch"""
+        for i in range(25):
+            self.writer.submit(self.entry(str(i)))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.writer.drain()
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(self.actions(), [str(i) for i in range(25)])
+
+    def test_failed_batch_is_spooled_and_replayed_in_order(self):
+        """Test rows survive a DB failure and keep their order"""
+        self.writer.submit(self.entry("1"))
+        with mock.patch.object(
+            VaultItemHistory.objects, "bulk_create", side_effect=DatabaseError
+        ):
+            self.writer.drain()
+        self.assertTrue(os.path.exists(self.spool_path))
+        self.assertTrue(self.writer.spooling)
+
+        # newer rows queue up behind the spool rather than overtaking it
+        self.writer.submit(self.entry("2"))
+        self.assertTrue(self.writer.queue.empty())
+
+        self.writer.drain()
+        self.assertEqual(self.actions(), ["1", "2"])
+        self.assertFalse(os.path.exists(self.spool_path))
+        self.assertFalse(self.writer.spooling)
+
+    def test_full_queue_spools(self):
+        """Test rows that don't fit the queue go to the spool"""
+        writer = self.make_writer(max_queue=1)
+        writer.submit(self.entry("1"))
+        writer.submit(self.entry("2"))
+        self.assertTrue(os.path.exists(self.spool_path))
+
+        writer.drain()
+        self.assertEqual(self.actions(), ["1", "2"])
+
+    def test_spool_left_by_previous_process_is_replayed(self):
+        """Test a new writer picks up a spool file left on disk"""
+        self.writer.spool([self.entry("1")])
+
+        writer = self.make_writer()
+        self.assertTrue(writer.spooling)
+        writer.drain()
+        self.assertEqual(self.actions(), ["1"])
+
+    def test_rows_for_deleted_items_dont_block_the_spool(self):
+        """Test a spooled row whose item is gone is set aside, not retried"""
+        self.writer.spool([self.entry("orphan")])
+        self.item.delete()
+        self.item = VaultItem.objects.create(
+            user=self.user, title="new", encrypted_data=pack("ZW5jcnlwdGVk")
+        )
+        self.writer.spool([self.entry("1")])
+        self.writer.spooling = True
+
+        self.writer.drain()
+        self.assertEqual(self.actions(), ["1"])
+        self.assertFalse(self.writer.spooling)
+        self.writer.submit(self.entry("2"))
+        self.writer.drain()
+        self.assertEqual(self.actions(), ["1", "2"])
+
+        with open(self.spool_path + ".orphaned") as orphaned:
+            self.assertEqual(
+                [json.loads(line)["action"] for line in orphaned], ["orphan"]
+            )
+
+    def test_failed_replay_keeps_only_unwritten_rows(self):
+        """Test a replay that fails part way doesn't write any row twice"""
+        self.writer.spool([self.entry(str(i)) for i in range(25)])
+        bulk_create = VaultItemHistory.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise DatabaseError
+            return bulk_create(rows)
+
+        with mock.patch.object(
+            VaultItemHistory.objects, "bulk_create", side_effect=fail_second_batch
+        ):
+            self.writer.replay()
+        self.assertEqual(self.actions(), [str(i) for i in range(10)])
+        self.assertTrue(os.path.exists(self.spool_path))
+
+        self.writer.replay()
+        self.assertEqual(self.actions(), [str(i) for i in range(25)])
+        self.assertFalse(os.path.exists(self.spool_path))
+
+    def test_unwritable_spool_doesnt_raise(self):
+        """Test a spool that can't be written loses the row, not the request"""
+        self.writer.spooling = True
+        with mock.patch.object(audit, "append_entries", side_effect=OSError(28, "")):
+            with self.assertLogs("vault.audit", "ERROR"):
+                self.writer.submit(self.entry("1"))
+        self.assertFalse(os.path.exists(self.spool_path))
+
+        # as left behind by an append cut short
+        with open(self.spool_path, "w") as spool:
+            spool.write('{"action": "cut sh')
+        self.writer.spool([self.entry("2")])
+        self.writer.drain()
+        self.assertEqual(self.actions(), ["2"])
+
+    def test_drainer_survives_errors(self):
+        """Test the drainer thread logs a failed drain and carries on"""
+        drain = self.writer.drain
+        calls = []
+
+        def fail_first(first=None):
+            calls.append(first)
+            if len(calls) == 1:
+                raise OSError(28, "No space left on device")
+            self.writer.stopped.set()
+            drain(first)
+
+        self.writer.submit(self.entry("1"))
+        self.writer.submit(self.entry("2"))
+        with mock.patch.object(self.writer, "drain", side_effect=fail_first):
+            with self.assertLogs("vault.audit", "ERROR"):
+                self.writer.run()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.actions(), ["2"])
+
+    @override_settings(VAULT_AUDIT_MODE="async")
+    def test_async_record_waits_for_commit(self):
+        """Test nothing is queued for a transaction that rolls back"""
+        with mock.patch.object(audit, "get_writer", return_value=self.writer):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    audit.record_history(self.item, self.user, "rolled back")
+                    raise ValueError
+            self.assertTrue(self.writer.queue.empty())
+
+            with transaction.atomic():
+                audit.record_history(self.item, self.user, "created")
+            self.writer.drain()
+        self.assertEqual(self.actions(), ["created"])
+
+
+class AuditSyncModeTest(TestCase):
+    def test_sync_mode_writes_inline(self):
+        """Test the test settings write history rows straight away"""
+        user = User.objects.create_user(username="test@example.com")
+        item = VaultItem.objects.create(
+            user=user, title="item", encrypted_data=pack("ZW5jcnlwdGVk")
+        )
+        with self.assertNumQueries(1):
+            audit.record_history(item, user, "created")
+        self.assertEqual(item.history.get().action, "created")
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vault.ciphertext import pack
+from vault.models import VaultItem, VaultItemHistory
+
+
+def create_item(user, title="item", **kwargs):
+    kwargs.setdefault("encrypted_data", pack("ZW5jcnlwdGVk"))
+    return VaultItem.objects.create(user=user, title=title, **kwargs)
+
+
+class VaultItemExpiryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        self.expired = create_item(
+            self.user, "expired", expires_at=now - timedelta(days=1)
+        )
+        self.expiring = create_item(
+            self.user, "expiring", expires_at=now + timedelta(days=1)
+        )
+        self.forever = create_item(self.user, "forever")
+
+    def list_titles(self, **params):
+        response = self.client.get(reverse("vaultitem-list"), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {item["title"]: item["is_expired"] for item in response.data["results"]}
+
+    def test_expired_filter(self):
+        """Test ?expired= narrows the list in SQL"""
+        self.assertEqual(self.list_titles(expired="true"), {"expired": True})
+        self.assertEqual(
+            self.list_titles(expired="false"), {"expiring": False, "forever": False}
+        )
+        response = self.client.get(reverse("vaultitem-list"), {"expired": "maybe"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_is_expired_comes_from_the_query(self):
+        """Test listed items don't work out is_expired one by one"""
+        with mock.patch.object(VaultItem, "is_expired") as is_expired:
+            titles = self.list_titles()
+        is_expired.assert_not_called()
+        self.assertEqual(titles, {"expired": True, "expiring": False, "forever": False})
+
+        url = reverse("vaultitem-detail", args=[self.expired.pk])
+        self.assertTrue(self.client.get(url).data["is_expired"])
+
+
+class SweepExpiredTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test@example.com")
+        self.now = timezone.now()
+
+    def sweep(self, *args):
+        out = StringIO()
+        call_command("sweep_expired_vault_items", *args, stdout=out)
+        return out.getvalue()
+
+    def expired_events(self, item):
+        return list(VaultItemHistory.objects.filter(vault_item=item, action="expired"))
+
+    def test_records_each_expiry_once(self):
+        """Test newly expired items get one history event, in batches"""
+        items = [
+            create_item(self.user, expires_at=self.now - timedelta(hours=i + 1))
+            for i in range(5)
+        ]
+        create_item(self.user, title="later", expires_at=self.now + timedelta(days=1))
+        create_item(
+            self.user, expires_at=self.now - timedelta(hours=1), soft_deleted=True
+        )
+
+        self.assertIn("Recorded 5 expired items", self.sweep("--batch-size", "2"))
+        self.assertIn("Recorded 0 expired items", self.sweep())
+        for item in items:
+            (event,) = self.expired_events(item)
+            self.assertEqual(event.user, self.user)
+            self.assertEqual(event.details, {"expires_at": item.expires_at.isoformat()})
+
+    def test_sweep_does_not_change_the_item(self):
+        """Test recording an expiry leaves the item's revision alone"""
+        item = create_item(self.user, expires_at=self.now - timedelta(hours=1))
+        self.sweep()
+        refreshed = VaultItem.objects.get(pk=item.pk)
+        self.assertEqual(refreshed.revision, item.revision)
+        self.assertEqual(refreshed.updated_at, item.updated_at)
+
+    def test_new_expiry_is_recorded_again(self):
+        """Test an item whose expiry is moved is recorded when it passes again"""
+        item = create_item(self.user, expires_at=self.now - timedelta(hours=2))
+        self.sweep()
+
+        item.expires_at = self.now - timedelta(hours=1)
+        item.save()
+        self.sweep()
+        self.assertEqual(len(self.expired_events(item)), 2)
+
+    def test_sweep_reads_only_unrecorded_items(self):
+        """Test the sweeper's query is answered from its partial index"""
+        due = VaultItem.objects.expiry_unrecorded().filter(expires_at__lt=self.now)
+        sql, params = due.order_by("expires_at", "id").query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql, params)
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("vault_item_expiry_sweep_idx", plan)
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vault import partitions
+from vault.ciphertext import pack
+from vault.models import VaultItem, VaultItemHistory
+
+
+class HistoryRetentionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="test@example.com")
+        self.item = VaultItem.objects.create(
+            user=self.user, title="item", encrypted_data=pack("ZW5jcnlwdGVk")
+        )
+        now = timezone.now()
+        self.old = [
+            self.add_history(f"old {i}", now - timedelta(days=400 + i))
+            for i in range(5)
+        ]
+        self.recent = self.add_history("recent", now - timedelta(days=10))
+
+    def add_history(self, action, timestamp):
+        return VaultItemHistory.objects.create(
+            vault_item=self.item, user=self.user, action=action, timestamp=timestamp
+        )
+
+    def test_prune_deletes_old_rows_in_batches(self):
+        """Test rows past retention are deleted a batch at a time"""
+        out = StringIO()
+        call_command("prune_vault_history", days=365, batch_size=2, stdout=out)
+
+        self.assertEqual(list(VaultItemHistory.objects.all()), [self.recent])
+        self.assertIn("Deleted 5 history rows", out.getvalue())
+
+    def test_prune_archives_before_deleting(self):
+        """Test --archive writes the pruned rows out as NDJSON, oldest first"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.ndjson")
+            call_command(
+                "prune_vault_history", days=365, archive=path, stdout=StringIO()
+            )
+            with open(path) as archive:
+                lines = [json.loads(line) for line in archive]
+
+        self.assertEqual(
+            [line["action"] for line in lines], [f"old {i}" for i in range(4, -1, -1)]
+        )
+        self.assertEqual(lines[0]["type"], "history")
+        self.assertEqual(lines[0]["user_id"], self.user.pk)
+        self.assertEqual(VaultItemHistory.objects.count(), 1)
+
+    @override_settings(VAULT_HISTORY_RECENT_DAYS=30)
+    def test_history_list_defaults_to_recent_rows(self):
+        """Test the history list only covers recent rows unless ?since= is given"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse("vaultitemhistory-list")
+
+        response = client.get(url)
+        self.assertEqual([h["action"] for h in response.data["results"]], ["recent"])
+
+        since = (timezone.now() - timedelta(days=402)).date().isoformat()
+        response = client.get(url, {"since": since})
+        self.assertEqual(response.data["count"], 4)
+
+        self.assertEqual(client.get(url, {"since": "last year"}).status_code, 400)
+
+        # old rows can still be fetched directly
+        detail = reverse("vaultitemhistory-detail", args=[self.old[0].pk])
+        self.assertEqual(client.get(detail).status_code, 200)
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "history is only partitioned on Postgres"
+)
+class HistoryPartitionTest(TestCase):
+    def test_partitions_are_kept_ahead(self):
+        """Test partitions exist for this month and the next two"""
+        now = timezone.now()
+        self.assertTrue(partitions.is_partitioned())
+        partitions.ensure_history_partitions(now)
+
+        names = {name for name, _start, _end in partitions.history_partitions()}
+        start = partitions.month_start(now)
+        for _ in range(3):
+            self.assertIn(partitions.partition_name(start), names)
+            start = partitions.next_month(start)
+
+    def test_rows_in_default_partition_move_to_new_partition(self):
+        """Test creating a partition takes its rows out of the default one"""
+        user = User.objects.create_user(username="test@example.com")
+        item = VaultItem.objects.create(user=user, title="item", encrypted_data=pack("eA=="))
+        when = partitions.month_start(timezone.now()).replace(year=2001)
+        VaultItemHistory.objects.create(
+            vault_item=item, user=user, action="created", timestamp=when
+        )
+
+        name = partitions.create_partition(when)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(name)}")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(VaultItemHistory.objects.filter(timestamp=when).count(), 1)
@@ -0,0 +1,123 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from vault.models import VaultItem, VaultItemHistory
+
+VAULT_TABLES = ('"vault_vaultitem"', '"vault_vaultitemhistory"')
+
+
+def sqlite_plan_problems(sql):
+    """Full scans and sorts in a SQLite query plan."""
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        details = [row[-1] for row in cursor.fetchall()]
+
+    problems = []
+    for detail in details:
+        if "TEMP B-TREE" in detail:
+            problems.append(detail)
+        elif detail.startswith("SCAN ") and " USING " not in detail:
+            problems.append(detail)
+    return problems
+
+
+def postgres_plan_problems(sql):
+    """Sequential scans and sorts in a Postgres query plan."""
+    with connection.cursor() as cursor:
+        # with only a handful of rows a seq scan always looks cheapest, so
+        # take it off the table to see whether an index *can* be used
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    problems = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] in ("Seq Scan", "Sort", "Incremental Sort"):
+            problems.append(f"{node['Node Type']} on {node.get('Relation Name')}")
+        nodes.extend(node.get("Plans", []))
+    return problems
+
+
+class VaultQueryPlanTest(TestCase):
+    """
+    Run EXPLAIN on the queries each vault endpoint actually sends, and make
+    sure every one of them is answered from an index without a sort.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        for i in range(30):
+            response = self.client.post(
+                reverse("vaultitem-list"),
+                {"title": f"item {i}", "encrypted_data": "ZGF0YQ=="},
+                format="json",
+            )
+        self.item = VaultItem.objects.get(pk=response.data["id"])
+        self.item.soft_delete()
+
+    def assertQueriesUseIndexes(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+
+        if connection.vendor == "postgresql":
+            plan_problems = postgres_plan_problems
+        elif connection.vendor == "sqlite":
+            plan_problems = sqlite_plan_problems
+        else:
+            self.skipTest(f"No query plan checks for {connection.vendor}")
+
+        checked = 0
+        for query in queries.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not any(t in sql for t in VAULT_TABLES):
+                continue
+            checked += 1
+            problems = plan_problems(sql)
+            self.assertEqual(problems, [], f"{url}: {sql}")
+        self.assertGreater(checked, 0)
+
+    def test_list(self):
+        self.assertQueriesUseIndexes("get", reverse("vaultitem-list"))
+
+    def test_list_next_page(self):
+        first = self.client.get(reverse("vaultitem-list"))
+        self.assertQueriesUseIndexes("get", first.data["next"])
+
+    def test_deleted(self):
+        self.assertQueriesUseIndexes("get", reverse("vaultitem-deleted"))
+
+    def test_detail(self):
+        item = VaultItem.objects.filter(user=self.user, soft_deleted=False).first()
+        self.assertQueriesUseIndexes("get", reverse("vaultitem-detail", args=[item.pk]))
+
+    def test_changes(self):
+        self.assertQueriesUseIndexes("get", reverse("vaultitem-changes"), {"since": 5})
+
+    def test_export(self):
+        self.assertQueriesUseIndexes(
+            "get", reverse("vaultitem-export"), {"history": "true"}
+        )
+
+    def test_history(self):
+        self.assertQueriesUseIndexes("get", reverse("vaultitemhistory-list"))
+
+    def test_history_for_item(self):
+        self.assertQueriesUseIndexes(
+            "get", reverse("vaultitemhistory-list"), {"vault_item": self.item.pk}
+        )
+        self.assertTrue(VaultItemHistory.objects.filter(vault_item=self.item).exists())
@@ -0,0 +1,135 @@
+import base64
+
+import msgpack
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from vault.ciphertext import Ciphertext, pack, pack_segments, unpack_segments
+from vault.models import VaultItem
+
+MSGPACK = "application/msgpack"
+
+
+class CiphertextSegmentsTest(SimpleTestCase):
+    def test_segments(self):
+        text = "c2FsdA==:aXY=:Y2lwaGVydGV4dA=="
+        packed = pack(text)
+        self.assertEqual(unpack_segments(packed), [b"salt", b"iv", b"ciphertext"])
+        self.assertEqual(pack_segments([b"salt", b"iv", b"ciphertext"]), packed)
+        self.assertIsNone(unpack_segments(pack("not base64!")))
+
+        ciphertext = Ciphertext(packed)
+        self.assertEqual(ciphertext, text)
+        self.assertEqual(ciphertext.packed, packed)
+
+
+class MessagePackAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.item = VaultItem.objects.create(
+            user=self.user, title="item", encrypted_data=pack("c2FsdA==:aXY=:Y3Q=")
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params, HTTP_ACCEPT=MSGPACK)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], MSGPACK)
+        return msgpack.unpackb(response.content)
+
+    def post(self, url, data):
+        return self.client.post(
+            url, msgpack.packb(data), content_type=MSGPACK, HTTP_ACCEPT=MSGPACK
+        )
+
+    def test_ciphertext_is_sent_as_bytes(self):
+        data = self.get(reverse("vaultitem-detail", args=[self.item.pk]))
+        self.assertEqual(data["encrypted_data"], [b"salt", b"iv", b"ct"])
+        self.assertEqual(data["title"], "item")
+
+        json = self.client.get(reverse("vaultitem-detail", args=[self.item.pk]))
+        self.assertEqual(json.data["encrypted_data"], "c2FsdA==:aXY=:Y3Q=")
+
+        changes = self.get(reverse("vaultitem-changes"))
+        self.assertEqual(changes["results"][0]["encrypted_data"][0], b"salt")
+
+    def test_text_ciphertext_is_sent_as_text(self):
+        self.item.encrypted_data = pack("legacy text")
+        self.item.save()
+        data = self.get(reverse("vaultitem-detail", args=[self.item.pk]))
+        self.assertEqual(data["encrypted_data"], "legacy text")
+
+    def test_create_with_bytes(self):
+        response = self.post(
+            reverse("vaultitem-list"),
+            {"title": "new", "encrypted_data": [b"\x00salt", b"\xffdata"]},
+        )
+        self.assertEqual(response.status_code, 201)
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data["encrypted_data"], [b"\x00salt", b"\xffdata"])
+
+        json = self.client.get(reverse("vaultitem-detail", args=[data["id"]]))
+        expected = ":".join(
+            base64.b64encode(raw).decode() for raw in (b"\x00salt", b"\xffdata")
+        )
+        self.assertEqual(json.data["encrypted_data"], expected)
+
+        # base64 text works in MessagePack too
+        response = self.post(
+            reverse("vaultitem-list"), {"title": "text", "encrypted_data": "eA=="}
+        )
+        self.assertEqual(msgpack.unpackb(response.content)["encrypted_data"], [b"x"])
+
+    def test_bulk_with_bytes(self):
+        response = self.post(
+            reverse("vaultitem-bulk"),
+            {
+                "operations": [
+                    {"op": "create", "title": "a", "encrypted_data": [b"a"]},
+                    {"op": "update", "id": str(self.item.pk), "encrypted_data": [b"b"]},
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 200, msgpack.unpackb(response.content))
+        self.item.refresh_from_db()
+        self.assertEqual(unpack_segments(self.item.encrypted_data), [b"b"])
+
+    def test_invalid_bodies(self):
+        url = reverse("vaultitem-list")
+        for ciphertext in [[], ["text"], [b"x"] * 256]:
+            with self.subTest(ciphertext=ciphertext[:2]):
+                response = self.post(
+                    url, {"title": "bad", "encrypted_data": ciphertext}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("encrypted_data", msgpack.unpackb(response.content))
+
+        # never used, an extension type, an array as a map key, trailing data
+        for body in [b"\xc1", b"\xd4\x01\x00", b"\x81\x90\xc0", b"\xc0\xc0"]:
+            with self.subTest(body=body):
+                response = self.client.post(
+                    url, body, content_type=MSGPACK, HTTP_ACCEPT=MSGPACK
+                )
+                self.assertEqual(response.status_code, 400)
+                detail = msgpack.unpackb(response.content)["detail"]
+                self.assertIn("MessagePack", detail)
+
+        response = self.client.post(
+            url, b"\x91" * 5000 + b"\xc0", content_type=MSGPACK, HTTP_ACCEPT=MSGPACK
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # lists of text aren't ciphertext segments in JSON either
+        response = self.client.post(
+            url, {"title": "bad", "encrypted_data": ["eA=="]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_pages(self):
+        data = self.get(reverse("vaultitem-list"))
+        self.assertEqual([item["title"] for item in data["results"]], ["item"])
+        json = self.client.get(reverse("vaultitem-list"))
+        self.assertEqual(json.data["results"][0]["title"], "item")
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vault import pagecache
+from vault.ciphertext import pack
+from vault.models import VaultItem
+
+
+@override_settings(VAULT_LIST_CACHE_TIMEOUT=300)
+class VaultPageCacheTest(TestCase):
+    def setUp(self):
+        caches["vault"].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("vaultitem-list")
+        for i in range(3):
+            self.create(f"item {i}")
+
+    def create(self, title, **fields):
+        response = self.client.post(
+            self.url,
+            {"title": title, "encrypted_data": "ZGF0YQ==", **fields},
+            format="json",
+        )
+        return response.data["id"]
+
+    def list(self, **params):
+        """The listed titles, and how many queries touched the item table."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        item_queries = [q for q in queries if "vault_vaultitem" in q["sql"]]
+        titles = [item["title"] for item in response.data["results"]]
+        return titles, len(item_queries)
+
+    def test_repeat_reads_come_from_the_cache(self):
+        """Test a second read of a page doesn't touch the items"""
+        titles, queries = self.list()
+        self.assertGreater(queries, 0)
+        self.assertEqual(self.list(), (titles, 0))
+        self.assertEqual(pagecache.stats(), {"hits": 1, "misses": 1})
+
+        # other pages and page sizes are cached separately
+        self.assertGreater(self.list(page_size=1)[1], 0)
+
+    def test_cached_page_answers_if_none_match(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url, headers={"if-none-match": first["ETag"]})
+        self.assertEqual(second.status_code, 304)
+
+    def test_writes_invalidate_pages(self):
+        """Test no write through the API or bulk path leaves a stale page"""
+        self.list()
+        item_id = self.create("new")
+        self.assertIn("new", self.list()[0])
+
+        detail = reverse("vaultitem-detail", args=[item_id])
+        self.client.patch(detail, {"title": "renamed"}, format="json")
+        self.assertIn("renamed", self.list()[0])
+
+        self.client.post(reverse("vaultitem-soft-delete", args=[item_id]))
+        self.assertNotIn("renamed", self.list()[0])
+
+        self.client.post(
+            reverse("vaultitem-bulk"),
+            {
+                "operations": [
+                    {"op": "create", "title": "bulk", "encrypted_data": "eA=="}
+                ]
+            },
+            format="json",
+        )
+        self.assertIn("bulk", self.list()[0])
+
+        VaultItem.objects.get(title="bulk").delete()
+        self.assertNotIn("bulk", self.list()[0])
+
+    def test_access_flush_invalidates_pages(self):
+        """Test flushed access times show up in the list"""
+        response = self.client.get(self.url)
+        item = response.data["results"][0]
+        self.assertIsNone(item["last_accessed"])
+
+        self.client.get(reverse("vaultitem-detail", args=[item["id"]]))
+        response = self.client.get(self.url)
+        self.assertIsNotNone(response.data["results"][0]["last_accessed"])
+
+    def test_page_is_kept_until_an_item_expires(self):
+        """Test a page holding an item about to expire isn't cached past it"""
+        self.create("expiring", expires_at=timezone.now() + timedelta(seconds=30))
+        cache = caches["vault"]
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.list()
+        (call,) = [c for c in cache_set.call_args_list if "pages" in c.args[0]]
+        self.assertLessEqual(call.kwargs["timeout"], 30)
+
+    def test_expired_filter_is_not_cached(self):
+        self.list(expired="false")
+        self.assertGreater(self.list(expired="false")[1], 0)
+
+    def test_pages_are_per_user(self):
+        self.list()
+        other = User.objects.create_user(username="other@example.com")
+        VaultItem.objects.create(
+            user=other, title="theirs", encrypted_data=pack("eA==")
+        )
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.list()[0], ["theirs"])
+
+    def test_reused_user_ids_start_afresh(self):
+        """Test a new user given an old user's id doesn't see their pages"""
+        self.list()
+        pk = self.user.pk
+        key = pagecache.generation_key(pk)
+        generation = caches["vault"].get(key)
+        self.user.delete()
+        self.assertIsNone(caches["vault"].get(key))
+
+        # as after a rolled back transaction: the id is reused, with no delete
+        caches["vault"].set(key, generation)
+        self.client.force_authenticate(user=User.objects.create_user("new", pk=pk))
+        self.assertEqual(self.list()[0], [])
@@ -0,0 +1,134 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from vault import search
+from vault.ciphertext import pack
+from vault.models import VaultItem
+
+URL = reverse("vaultitem-search")
+
+
+class VaultSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    def create_item(self, title, description="", user=None, **kwargs):
+        return VaultItem.objects.create(
+            user=user or self.user,
+            title=title,
+            description=description,
+            encrypted_data=pack("ZW5jcnlwdGVk"),
+            **kwargs,
+        )
+
+    def titles(self, query, **params):
+        response = self.client.get(URL, {"q": query, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item["title"] for item in response.data["results"]]
+
+    def test_results_are_ranked(self):
+        """Test title prefixes come first, then title and description matches"""
+        self.create_item("Work email", "password for the bank")
+        self.create_item("Banking")
+        self.create_item("Old bank login")
+        self.create_item("bank PIN")
+
+        self.assertEqual(
+            self.titles("bank"),
+            ["bank PIN", "Banking", "Old bank login", "Work email"],
+        )
+
+    def test_substring_and_short_queries(self):
+        """Test matches mid-word and queries too short for the index"""
+        self.create_item("GitHub")
+        self.create_item("Gitlab", "self hosted")
+        self.create_item("Mail")
+
+        self.assertEqual(self.titles("thu"), ["GitHub"])
+        self.assertEqual(self.titles("HOSTED"), ["Gitlab"])
+        self.assertEqual(self.titles("ai"), ["Mail"])
+        self.assertEqual(self.titles("b"), ["Gitlab", "GitHub"])
+        self.assertEqual(self.titles('"quoted" OR x'), [])
+
+    def test_only_own_live_items(self):
+        """Test other users' items and soft-deleted items aren't found"""
+        other = User.objects.create_user(username="other@example.com")
+        self.create_item("shared secret", user=other)
+        self.create_item("deleted secret", soft_deleted=True)
+        self.create_item("my secret")
+
+        self.assertEqual(self.titles("secret"), ["my secret"])
+
+    def test_query_is_required(self):
+        response = self.client.get(URL, {"q": "  "})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("q", response.data)
+
+    def test_pages_through_results(self):
+        """Test the cursor walks every rank without repeats or gaps"""
+        for i in range(5):
+            self.create_item(f"key {i}")
+            self.create_item(f"old key {i}")
+            self.create_item(f"item {i}", "key")
+
+        titles = []
+        response = self.client.get(URL, {"q": "key", "page_size": 4})
+        while True:
+            titles += [item["title"] for item in response.data["results"]]
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(len(titles), 15)
+        self.assertEqual(
+            [title.split()[0] for title in titles],
+            ["key"] * 5 + ["old"] * 5 + ["item"] * 5,
+        )
+
+    def test_index_follows_changes(self):
+        """Test updated and deleted items are reflected in the results"""
+        item = self.create_item("Twitter")
+        self.assertEqual(self.titles("twit"), ["Twitter"])
+
+        item.title = "X"
+        item.description = "formerly bird site"
+        item.save()
+        self.assertEqual(self.titles("twit"), [])
+        self.assertEqual(self.titles("bird"), ["X"])
+
+        item.delete()
+        self.assertEqual(self.titles("bird"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite full text index")
+    def test_uses_full_text_index(self):
+        """Test a long enough query is answered from the FTS5 table"""
+        self.create_item("Router admin")
+        with CaptureQueriesContext(connection) as queries:
+            self.titles("router")
+        (sql,) = [q["sql"] for q in queries if search.FTS_TABLE in q["sql"]]
+
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("VIRTUAL TABLE INDEX", plan)
+        # items are looked up from the matches, not scanned and checked
+        self.assertIn("rowid=?", plan)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite full text index")
+    def test_install_is_idempotent_and_rebuilds(self):
+        """Test reinstalling after the triggers are dropped reindexes items"""
+        self.create_item("Netflix")
+        self.assertFalse(search.install_sqlite_search(connection))
+
+        search.uninstall_sqlite_search(connection)
+        self.create_item("Netgear")
+        self.assertTrue(search.install_sqlite_search(connection))
+        self.assertEqual(self.titles("netg"), ["Netgear"])
@@ -0,0 +1,115 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from vault.audit import record_history
+from vault.ciphertext import pack
+from vault.models import VaultItem
+
+
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.items = [
+            VaultItem.objects.create(
+                user=self.user,
+                title=f"item {i}",
+                description="secret notes",
+                encrypted_data=pack("ZW5jcnlwdGVk"),
+            )
+            for i in range(3)
+        ]
+
+    def get(self, url, **params):
+        """The response, and the SQL of queries that read the item table."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        sql = [q["sql"] for q in queries if 'FROM "vault_vaultitem"' in q["sql"]]
+        return response, " ".join(sql)
+
+    def test_list(self):
+        response, sql = self.get(reverse("vaultitem-list"), fields="id,title")
+        results = response.data["results"]
+        self.assertEqual([set(item) for item in results], [{"id", "title"}] * 3)
+        self.assertNotIn("encrypted_data", sql)
+        self.assertNotIn("description", sql)
+
+    def test_list_can_include_ciphertext(self):
+        """Test lists can ask for fields only the full item has"""
+        response, _ = self.get(
+            reverse("vaultitem-list"), fields="id,encrypted_data", page_size=2
+        )
+        self.assertEqual(response.data["results"][0]["encrypted_data"], "ZW5jcnlwdGVk")
+
+        rest = self.client.get(response.data["next"])
+        self.assertEqual(set(rest.data["results"][0]), {"id", "encrypted_data"})
+
+    def test_detail(self):
+        url = reverse("vaultitem-detail", args=[self.items[0].pk])
+        response, sql = self.get(url, fields="title,user_info,is_expired")
+        self.assertEqual(
+            response.data,
+            {
+                "title": "item 0",
+                "user_info": {
+                    "id": self.user.pk,
+                    "username": "test@example.com",
+                    "email": "",
+                    "date_joined": response.data["user_info"]["date_joined"],
+                },
+                "is_expired": False,
+            },
+        )
+        self.assertNotIn("encrypted_data", sql)
+        self.assertNotIn("password", sql)
+
+        full = self.client.get(url)
+        self.assertNotEqual(full["ETag"], response["ETag"])
+
+    def test_search_and_deleted(self):
+        response, sql = self.get(reverse("vaultitem-search"), q="item", fields="title")
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertNotIn('"encrypted_data"', sql)
+
+        self.items[0].soft_delete()
+        response, sql = self.get(reverse("vaultitem-deleted"), fields="title")
+        self.assertEqual(response.data["results"], [{"title": "item 0"}])
+        self.assertNotIn("encrypted_data", sql)
+
+    def test_invalid_fields(self):
+        url = reverse("vaultitem-list")
+        for fields in ["nope", "title,nope", ","]:
+            with self.subTest(fields=fields):
+                response = self.client.get(url, {"fields": fields})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("fields", response.data)
+
+    def test_writes_ignore_fields(self):
+        url = reverse("vaultitem-detail", args=[self.items[0].pk])
+        response = self.client.patch(
+            url + "?fields=title", {"title": "renamed"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("encrypted_data", response.data)
+
+    def test_history(self):
+        for item in self.items:
+            record_history(item, self.user, "updated", details={"via": "api"})
+        url = reverse("vaultitemhistory-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "action,vault_item_title"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"][0],
+            {"action": "updated", "vault_item_title": "item 2"},
+        )
+        sql = queries[-1]["sql"]
+        self.assertNotIn("encrypted_data", sql)
+        self.assertNotIn("details", sql)
+        self.assertNotIn("auth_user", sql)
@@ -0,0 +1,157 @@
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vault.models import VaultItem, VaultState, count_changes
+
+
+class VaultSummaryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, title="item", **fields):
+        response = self.client.post(
+            reverse("vaultitem-list"),
+            {"title": title, "encrypted_data": "ZGF0YQ==", **fields},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def summary(self):
+        response = self.client.get(reverse("vaultitem-summary"))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertCountsMatchItems(self):
+        """Check the maintained counts against counting the items."""
+        items = VaultItem.objects.filter(user=self.user)
+        summary = self.summary()
+        self.assertEqual(
+            summary["live_count"], items.filter(soft_deleted=False).count()
+        )
+        self.assertEqual(
+            summary["deleted_count"], items.filter(soft_deleted=True).count()
+        )
+        self.assertEqual(
+            summary["type_counts"],
+            dict(
+                Counter(
+                    items.filter(soft_deleted=False).values_list("item_type", flat=True)
+                )
+            ),
+        )
+        return summary
+
+    def test_empty_vault(self):
+        self.assertEqual(
+            self.summary(),
+            {
+                "revision": 0,
+                "live_count": 0,
+                "deleted_count": 0,
+                "type_counts": {},
+                "expired_count": 0,
+            },
+        )
+
+    def test_counts_follow_writes(self):
+        """Test create, update, soft delete, restore and delete keep counts right"""
+        first = self.create(item_type="note")
+        second = self.create()
+        self.create()
+        summary = self.assertCountsMatchItems()
+        self.assertEqual(summary["type_counts"], {"note": 1, "password": 2})
+
+        detail = reverse("vaultitem-detail", args=[second])
+        self.client.patch(detail, {"item_type": "other"}, format="json")
+        self.assertCountsMatchItems()
+
+        self.client.post(reverse("vaultitem-soft-delete", args=[first]))
+        summary = self.assertCountsMatchItems()
+        self.assertEqual(summary["deleted_count"], 1)
+
+        self.client.post(reverse("vaultitem-restore", args=[first]))
+        self.assertCountsMatchItems()
+
+        self.client.delete(detail)
+        summary = self.assertCountsMatchItems()
+        self.assertEqual(summary["type_counts"], {"note": 1, "password": 1})
+
+    def test_bulk_and_purge_keep_counts(self):
+        """Test bulk operations and the trash purge keep counts right"""
+        ids = [self.create() for _ in range(3)]
+        self.client.post(
+            reverse("vaultitem-bulk"),
+            {
+                "operations": [
+                    {
+                        "op": "create",
+                        "title": "n",
+                        "encrypted_data": "eA==",
+                        "item_type": "note",
+                    },
+                    {"op": "update", "id": ids[0], "item_type": "other"},
+                    {"op": "delete", "id": ids[1]},
+                    {"op": "delete", "id": ids[2]},
+                ]
+            },
+            format="json",
+        )
+        summary = self.assertCountsMatchItems()
+        self.assertEqual(summary["deleted_count"], 2)
+
+        call_command("purge_vault_trash", "--days", "0", stdout=StringIO())
+        summary = self.assertCountsMatchItems()
+        self.assertEqual(summary["deleted_count"], 0)
+
+    def test_stale_copies_count_once(self):
+        """Test two requests working on the same item don't both count"""
+        pk = self.create()
+        first, second = VaultItem.objects.get(pk=pk), VaultItem.objects.get(pk=pk)
+        for item in (first, second):
+            item.soft_deleted = True
+            item.save()
+        summary = self.assertCountsMatchItems()
+        self.assertEqual((summary["live_count"], summary["deleted_count"]), (0, 1))
+
+        first, second = VaultItem.objects.get(pk=pk), VaultItem.objects.get(pk=pk)
+        first.delete()
+        self.assertEqual(second.delete()[0], 0)
+        summary = self.assertCountsMatchItems()
+        self.assertEqual((summary["live_count"], summary["deleted_count"]), (0, 0))
+
+    def test_expired_count(self):
+        self.create(expires_at=(timezone.now() - timedelta(days=1)).isoformat())
+        self.create(expires_at=(timezone.now() + timedelta(days=1)).isoformat())
+        self.assertEqual(self.summary()["expired_count"], 1)
+
+    def test_summary_does_not_count_items(self):
+        """Test only the expired count reads the item table"""
+        for _ in range(3):
+            self.create()
+        with self.assertNumQueries(2):
+            self.summary()
+
+    def test_count_changes(self):
+        self.assertEqual(
+            count_changes(None, (False, "note")), {"live": 1, ("type", "note"): 1}
+        )
+        self.assertEqual(
+            count_changes((False, "note"), (True, "note")),
+            {"live": -1, ("type", "note"): -1, "deleted": 1},
+        )
+        state = VaultState(type_counts={"note": 1})
+        state.apply_changes(count_changes((False, "note"), (True, "note")))
+        self.assertEqual(
+            (state.live_count, state.deleted_count, state.type_counts), (-1, 1, {})
+        )
@@ -0,0 +1,119 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from vault.ciphertext import pack
+from vault.models import VaultAttachment, VaultItem, VaultItemHistory
+
+
+def create_item(user, title="item", **kwargs):
+    kwargs.setdefault("encrypted_data", pack("ZW5jcnlwdGVk"))
+    return VaultItem.objects.create(user=user, title=title, **kwargs)
+
+
+class VaultTrashTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    def test_deleted_at_follows_soft_delete(self):
+        """Test deleted_at is set on delete, however the item is deleted"""
+        item = create_item(self.user)
+        self.assertIsNone(item.deleted_at)
+
+        self.client.post(reverse("vaultitem-soft-delete", args=[item.pk]))
+        item.refresh_from_db()
+        self.assertIsNotNone(item.deleted_at)
+
+        self.client.post(reverse("vaultitem-restore", args=[item.pk]))
+        item.refresh_from_db()
+        self.assertIsNone(item.deleted_at)
+
+        self.client.post(
+            reverse("vaultitem-bulk"),
+            {"operations": [{"op": "delete", "id": str(item.pk)}]},
+            format="json",
+        )
+        item.refresh_from_db()
+        self.assertIsNotNone(item.deleted_at)
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command("purge_vault_trash", *args, stdout=out)
+        return out.getvalue()
+
+    def test_purge_deletes_old_trash(self):
+        """Test items in the trash too long go, with their history"""
+        long_ago = timezone.now() - timedelta(days=31)
+        old = [create_item(self.user, f"old {i}") for i in range(3)]
+        for item in old:
+            item.soft_delete()
+            VaultItemHistory.objects.create(
+                vault_item=item, user=self.user, action="deleted"
+            )
+            VaultAttachment.objects.create(
+                vault_item=item, user=self.user, name="a", size=1, chunk_size=1
+            )
+        VaultItem.objects.filter(pk__in=[item.pk for item in old]).update(
+            deleted_at=long_ago
+        )
+        recent = create_item(self.user, "recent")
+        recent.soft_delete()
+        live = create_item(self.user, "live")
+
+        output = self.purge("--days", "30", "--batch-size", "2")
+        self.assertIn("Purged 3 items", output)
+        self.assertEqual(
+            set(VaultItem.objects.values_list("title", flat=True)), {"recent", "live"}
+        )
+        self.assertFalse(VaultItemHistory.objects.filter(action="deleted").exists())
+        self.assertFalse(VaultAttachment.objects.exists())
+
+        self.assertIn("Purged 0 items", self.purge("--days", "1"))
+        self.assertIn("Purged 1 items", self.purge("--days", "0"))
+        self.assertEqual(list(VaultItem.objects.all()), [live])
+
+    def test_restore_during_purge(self):
+        """Test a restore that loses the race with the purge is a 404"""
+        item = create_item(self.user)
+        item.soft_delete()
+        VaultItem.objects.filter(pk=item.pk).update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        )
+        restore = VaultItem.restore
+
+        def purge_first(item):
+            # the purge commits between the restore loading the item and saving it
+            self.purge("--days", "30")
+            restore(item)
+
+        with mock.patch.object(VaultItem, "restore", purge_first):
+            response = self.client.post(reverse("vaultitem-restore", args=[item.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(VaultItem.objects.exists())
+        summary = self.client.get(reverse("vaultitem-summary")).data
+        self.assertEqual((summary["live_count"], summary["deleted_count"]), (0, 0))
+
+    def test_purge_locks_vault_state_first(self):
+        """Test the purge takes its locks in the order item writes do"""
+        item = create_item(self.user)
+        item.soft_delete()
+        locks = []
+        select_for_update = QuerySet.select_for_update
+
+        def record_lock(queryset, *args, **kwargs):
+            locks.append(queryset.model.__name__)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", record_lock):
+            self.assertIn("Purged 1 items", self.purge("--days", "0"))
+        self.assertEqual(locks, ["VaultState", "VaultItem"])
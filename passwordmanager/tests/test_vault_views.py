@@ -0,0 +1,536 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from vault import bulk
+from vault.ciphertext import pack, unpack
+from vault.models import VaultItem, VaultItemHistory
+from vault.views import VaultItemViewSet
+
+
+def create_item(user, title="item", **kwargs):
+    kwargs.setdefault("encrypted_data", pack("ZW5jcnlwdGVk"))
+    return VaultItem.objects.create(user=user, title=title, **kwargs)
+
+
+class VaultItemPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("vaultitem-list")
+        self.items = [create_item(self.user, title=f"item {i}") for i in range(25)]
+
+    def walk(self, url):
+        """Follow next links until the last page, returning every id seen."""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_pages_follow_updated_at_order(self):
+        """Test walking the cursor returns every item once, newest first"""
+        ids = self.walk(self.url)
+        expected = VaultItem.objects.filter(user=self.user).order_by(
+            "-updated_at", "-id"
+        )
+        self.assertEqual(ids, [str(item.id) for item in expected])
+
+    def test_no_count_in_response(self):
+        """Test the keyset paginator does not report a total"""
+        response = self.client.get(self.url)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_page_size_is_bounded(self):
+        """Test clients can pick a page size up to the maximum"""
+        response = self.client.get(self.url, {"page_size": 5})
+        self.assertEqual(len(response.data["results"]), 5)
+
+        response = self.client.get(self.url, {"page_size": 10000})
+        self.assertEqual(len(response.data["results"]), 25)
+        self.assertIsNone(response.data["next"])
+
+    def test_updates_do_not_shift_remaining_pages(self):
+        """Test an item touched mid-walk does not repeat or skip others"""
+        response = self.client.get(self.url)
+        first_page = [item["id"] for item in response.data["results"]]
+
+        # bump an item that has not been seen yet to the top of the list
+        unseen = VaultItem.objects.filter(user=self.user).order_by("updated_at")[0]
+        unseen.title = "touched"
+        unseen.save()
+
+        rest = self.walk(response.data["next"])
+        self.assertEqual(len(first_page) + len(rest), 24)
+        self.assertEqual(len(set(first_page) | set(rest)), 24)
+
+    def test_invalid_cursor(self):
+        """Test a garbage cursor is rejected"""
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleted_is_paginated(self):
+        """Test the trash listing uses the same cursor pagination"""
+        for item in self.items[:15]:
+            item.soft_delete()
+        ids = self.walk(reverse("vaultitem-deleted"))
+        self.assertEqual(len(ids), 15)
+
+
+class VaultItemChangesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("vaultitem-changes")
+
+    def test_writes_bump_revision(self):
+        """Test create, update, soft delete and restore each stamp a new revision"""
+        item = create_item(self.user)
+        revisions = [item.revision]
+
+        item.title = "renamed"
+        item.save()
+        revisions.append(item.revision)
+        item.soft_delete()
+        revisions.append(item.revision)
+        item.restore()
+        revisions.append(item.revision)
+
+        self.assertEqual(revisions, [1, 2, 3, 4])
+        self.assertEqual(self.user.vault_state.revision, 4)
+
+    def test_access_does_not_bump_revision(self):
+        """Test recording an access is not treated as a change"""
+        item = create_item(self.user)
+        item.mark_accessed()
+        item.refresh_from_db()
+        self.assertEqual(item.revision, 1)
+
+    def test_changes_since_revision(self):
+        """Test only items changed after the cursor are returned, with tombstones"""
+        first = create_item(self.user, title="first")
+        response = self.client.get(self.url, {"since": 0})
+        self.assertEqual(len(response.data["results"]), 1)
+        cursor = response.data["revision"]
+
+        second = create_item(self.user, title="second")
+        first.soft_delete()
+        response = self.client.get(self.url, {"since": cursor})
+
+        self.assertFalse(response.data["has_more"])
+        self.assertEqual(response.data["revision"], first.revision)
+        results = {item["id"]: item for item in response.data["results"]}
+        self.assertEqual(set(results), {str(first.id), str(second.id)})
+        self.assertTrue(results[str(first.id)]["soft_deleted"])
+
+    def test_changes_are_batched(self):
+        """Test a large backlog is returned in batches flagged with has_more"""
+        for i in range(5):
+            create_item(self.user, title=f"item {i}")
+
+        with mock.patch.object(VaultItemViewSet, "max_changes", 3):
+            response = self.client.get(self.url)
+
+        self.assertTrue(response.data["has_more"])
+        self.assertEqual(response.data["revision"], 3)
+
+    def test_hard_deletes_are_listed(self):
+        """Test deleting for good, directly or by purging the trash, is in the feed"""
+        kept, deleted, purged = (create_item(self.user, title=t) for t in "abc")
+        cursor = self.client.get(self.url).data["revision"]
+
+        response = self.client.delete(reverse("vaultitem-detail", args=[deleted.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        purged.soft_delete()
+        VaultItem.objects.filter(pk=purged.pk).update(deleted_at="2000-01-01T00:00Z")
+        call_command("purge_vault_trash", "--days", "1", stdout=StringIO())
+        kept.save()
+
+        response = self.client.get(self.url, {"since": cursor})
+        self.assertEqual(
+            [item["id"] for item in response.data["deleted"]],
+            [str(deleted.pk), str(purged.pk)],
+        )
+        self.assertEqual(response.data["results"][0]["id"], str(kept.pk))
+        self.assertEqual(response.data["revision"], kept.revision)
+        self.assertEqual(kept.revision, cursor + 4)
+
+        with mock.patch.object(VaultItemViewSet, "max_changes", 1):
+            response = self.client.get(self.url, {"since": cursor})
+        self.assertTrue(response.data["has_more"])
+        self.assertEqual(response.data["revision"], cursor + 1)
+        self.assertEqual(response.data["results"], [])
+
+    def test_other_users_changes_are_hidden(self):
+        """Test the feed is scoped to the requesting user"""
+        other = User.objects.create_user(username="other@example.com")
+        create_item(other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["results"], [])
+
+    def test_invalid_since(self):
+        """Test a non-numeric cursor is rejected"""
+        response = self.client.get(self.url, {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class VaultItemBulkTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("vaultitem-bulk")
+
+    def create(self, count):
+        operations = [
+            {"op": "create", "title": f"item {i}", "encrypted_data": "ZGF0YQ=="}
+            for i in range(count)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url, {"operations": operations}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_bulk_create(self):
+        """Test many items and their history are created in one request"""
+        response, _ = self.create(50)
+
+        self.assertEqual(VaultItem.objects.filter(user=self.user).count(), 50)
+        self.assertEqual(
+            VaultItemHistory.objects.filter(user=self.user, action="created").count(),
+            50,
+        )
+        revisions = [result["revision"] for result in response.data["results"]]
+        self.assertEqual(revisions, list(range(1, 51)))
+
+    def test_bulk_create_query_count_is_constant(self):
+        """Test the number of queries doesn't grow with the number of items"""
+        self.create(1)
+        _, few = self.create(5)
+        _, many = self.create(50)
+        self.assertEqual(few, many)
+
+    def test_bulk_update_and_delete(self):
+        """Test updates and soft deletes are applied and reported per item"""
+        keep = create_item(self.user, title="keep")
+        remove = create_item(self.user, title="remove")
+        operations = [
+            {"op": "update", "id": str(keep.id), "title": "kept"},
+            {"op": "delete", "id": str(remove.id)},
+            {"op": "delete", "id": "00000000-0000-0000-0000-000000000000"},
+        ]
+        response = self.client.post(self.url, {"operations": operations}, format="json")
+
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["updated", "deleted", "not_found"])
+
+        keep.refresh_from_db()
+        remove.refresh_from_db()
+        self.assertEqual(keep.title, "kept")
+        self.assertEqual(unpack(keep.encrypted_data), "ZW5jcnlwdGVk")
+        self.assertGreater(keep.updated_at, keep.created_at)
+        self.assertTrue(remove.soft_deleted)
+        self.assertTrue(remove.history.filter(action="deleted").exists())
+
+    def test_other_users_items_are_not_found(self):
+        """Test a bulk request can't touch another user's items"""
+        other = User.objects.create_user(username="other@example.com")
+        item = create_item(other)
+        operations = [{"op": "delete", "id": str(item.id)}]
+        response = self.client.post(self.url, {"operations": operations}, format="json")
+
+        self.assertEqual(response.data["results"][0]["status"], "not_found")
+        item.refresh_from_db()
+        self.assertFalse(item.soft_deleted)
+
+    def test_invalid_operation_rejects_batch(self):
+        """Test nothing is written when any operation fails validation"""
+        operations = [
+            {"op": "create", "title": "fine", "encrypted_data": "ZGF0YQ=="},
+            {"op": "create", "title": "   ", "encrypted_data": "ZGF0YQ=="},
+            {"op": "update", "title": "no id"},
+        ]
+        response = self.client.post(self.url, {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", response.data["operations"][1])
+        self.assertIn("id", response.data["operations"][2])
+        self.assertFalse(VaultItem.objects.exists())
+
+
+class VaultItemConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.item = create_item(self.user)
+        self.list_url = reverse("vaultitem-list")
+        self.detail_url = reverse("vaultitem-detail", args=[self.item.id])
+
+    def test_unchanged_list_is_not_modified(self):
+        """Test a matching If-None-Match on the list returns 304 without the page"""
+        etag = self.client.get(self.list_url)["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(
+            any(
+                'FROM "vault_vaultitem" WHERE' in q["sql"] and "ORDER BY" in q["sql"]
+                for q in queries.captured_queries
+            )
+        )
+
+    def test_write_changes_list_etag(self):
+        """Test any write to the vault invalidates the list ETag"""
+        etag = self.client.get(self.list_url)["ETag"]
+        create_item(self.user, title="another")
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_expired_list_etag(self):
+        """Test ?expired= ETags follow access flushes and strict expiry"""
+        params = {"expired": "false"}
+        etag = self.client.get(self.list_url, params)["ETag"]
+        self.client.get(self.detail_url)
+        self.assertNotEqual(self.client.get(self.list_url, params)["ETag"], etag)
+
+        now = timezone.now()
+        self.item.expires_at = now
+        self.item.save()
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            etag = self.client.get(self.list_url, params)["ETag"]
+            self.assertFalse(self.item.is_expired())
+        later = now + timedelta(seconds=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertNotEqual(self.client.get(self.list_url, params)["ETag"], etag)
+
+    def test_pages_have_distinct_etags(self):
+        """Test a different page size or cursor gets its own ETag"""
+        first = self.client.get(self.list_url)["ETag"]
+        second = self.client.get(self.list_url, {"page_size": 1})["ETag"]
+        self.assertNotEqual(first, second)
+
+    def test_unchanged_item_is_not_modified(self):
+        """Test a matching If-None-Match on item detail returns 304"""
+        etag = self.client.get(self.detail_url)["ETag"]
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.item.title = "changed"
+        self.item.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class VaultExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("vaultitem-export")
+
+    def read_lines(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        body = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_export_streams_every_item(self):
+        """Test the export has one line per item, soft-deleted ones included"""
+        items = [create_item(self.user, title=f"item {i}") for i in range(3)]
+        items[0].soft_delete()
+        create_item(User.objects.create_user(username="other@example.com"))
+
+        lines = self.read_lines(self.client.get(self.url))
+
+        self.assertEqual({line["id"] for line in lines}, {str(i.id) for i in items})
+        self.assertTrue(all(line["type"] == "item" for line in lines))
+        self.assertEqual(lines[0]["encrypted_data"], "ZW5jcnlwdGVk")
+
+    def test_export_with_history(self):
+        """Test history lines follow the items when asked for"""
+        response = self.client.post(
+            reverse("vaultitem-list"),
+            {"title": "with history", "encrypted_data": "ZGF0YQ=="},
+            format="json",
+        )
+        lines = self.read_lines(self.client.get(self.url, {"history": "true"}))
+
+        self.assertEqual([line["type"] for line in lines], ["item", "history"])
+        self.assertEqual(lines[1]["vault_item_id"], response.data["id"])
+        self.assertEqual(lines[1]["action"], "created")
+
+    def test_export_accepts_ndjson(self):
+        """Test clients can ask for application/x-ndjson"""
+        response = self.client.get(self.url, HTTP_ACCEPT="application/x-ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+
+class VaultImportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="test@example.com",
+            email="test@example.com",
+            password="TestPassword123!",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("vaultitem-import-items")
+
+    def upload(self, lines):
+        body = "\n".join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        )
+        upload = SimpleUploadedFile("vault.ndjson", body.encode())
+        return self.client.post(self.url, {"file": upload}, format="multipart")
+
+    def test_import_items(self):
+        """Test valid lines are imported with a created history row each"""
+        response = self.upload(
+            [{"title": f"item {i}", "encrypted_data": "ZGF0YQ=="} for i in range(3)]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["imported"], 3)
+        self.assertEqual(VaultItem.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            VaultItemHistory.objects.filter(
+                user=self.user, details={"created_via": "import"}
+            ).count(),
+            3,
+        )
+
+    def test_import_reports_bad_lines(self):
+        """Test invalid lines are reported by line number and skipped"""
+        response = self.upload(
+            [
+                {"title": "good", "encrypted_data": "ZGF0YQ=="},
+                "{not json",
+                {"title": "", "encrypted_data": "ZGF0YQ=="},
+                {"type": "history", "action": "created"},
+            ]
+        )
+
+        self.assertEqual(response.data["imported"], 1)
+        self.assertEqual(response.data["failed"], 2)
+        self.assertEqual(response.data["skipped"], 1)
+        self.assertEqual([e["line"] for e in response.data["errors"]], [2, 3])
+        self.assertIn("title", response.data["errors"][1]["errors"])
+
+    def test_import_in_chunks(self):
+        """Test large files are written in fixed-size chunks"""
+        lines = [{"title": f"item {i}", "encrypted_data": "eA=="} for i in range(7)]
+        with mock.patch("vault.importer.CHUNK_SIZE", 3), mock.patch(
+            "vault.bulk.apply_operations", wraps=bulk.apply_operations
+        ) as apply_operations:
+            response = self.upload(lines)
+
+        self.assertEqual(response.data["imported"], 7)
+        sizes = [len(call.args[1]) for call in apply_operations.call_args_list]
+        self.assertEqual(sizes, [3, 3, 1])
+
+    def test_export_round_trip(self):
+        """Test an export can be imported back"""
+        self.client.post(
+            reverse("vaultitem-list"),
+            {"title": "exported", "encrypted_data": "ZGF0YQ=="},
+            format="json",
+        )
+        export = self.client.get(reverse("vaultitem-export"), {"history": "true"})
+        lines = b"".join(export.streaming_content).decode().splitlines()
+
+        response = self.upload(lines)
+        self.assertEqual(response.data["imported"], 1)
+        self.assertEqual(response.data["skipped"], 1)
+        self.assertEqual(
+            VaultItem.objects.filter(user=self.user, title="exported").count(), 2
+        )
+
+    def test_export_round_trip_keeps_trashed_items_purgeable(self):
+        """Test a trashed item imported from an export is stamped with deleted_at"""
+        VaultItem.objects.create(
+            user=self.user, title="trashed", encrypted_data=pack("ZGF0YQ==")
+        ).soft_delete()
+        export = self.client.get(reverse("vaultitem-export"))
+        lines = b"".join(export.streaming_content).decode().splitlines()
+
+        response = self.upload(lines)
+        self.assertEqual(response.data["imported"], 1)
+        imported = VaultItem.objects.filter(user=self.user, title="trashed").latest(
+            "revision"
+        )
+        self.assertTrue(imported.soft_deleted)
+        self.assertIsNotNone(imported.deleted_at)
+
+    def test_file_is_required(self):
+        """Test a request without a file is rejected"""
+        response = self.client.post(self.url, {}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CiphertextStorageTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="test@example.com")
+        self.client.force_authenticate(user=self.user)
+
+    def test_web_client_ciphertext_is_stored_as_bytes(self):
+        """Test salt:iv:ciphertext is stored decoded and returned unchanged"""
+        sent = "c2FsdHNhbHRzYWx0c2FsdA==:aXZpdml2aXZpdml2:Y2lwaGVydGV4dA=="
+        response = self.client.post(
+            reverse("vaultitem-list"),
+            {"title": "item", "encrypted_data": sent},
+            format="json",
+        )
+        item = VaultItem.objects.get(pk=response.data["id"])
+        self.assertLess(len(item.encrypted_data), len(sent))
+
+        response = self.client.get(reverse("vaultitem-detail", args=[item.pk]))
+        self.assertEqual(response.data["encrypted_data"], sent)
+
+    def test_round_trip_of_text_that_is_not_base64(self):
+        """Test ciphertext that isn't base64 is kept verbatim"""
+        for sent in ["not base64!", "ZW5j", "ZW5=", "a:b:"]:
+            self.assertEqual(unpack(pack(sent)), sent)
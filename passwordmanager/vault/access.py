@@ -0,0 +1,124 @@
+"""
+Write-behind buffering for VaultItem.last_accessed.
+
+Reads record the access time in a cache instead of running an UPDATE, and the
+buffered timestamps are written back in batched UPDATEs by ``flush()``. Each
+recorded access claims a slot from an atomic counter in the cache, so with a
+shared cache (Redis/Memcached) every worker feeds the same buffer and any one
+of them can flush it.
+
+An item is only recorded once per ``VAULT_ACCESS_STALENESS`` seconds, which
+is also how far behind its ``last_accessed`` can be once flushed.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import pagecache
+
+SEQUENCE_KEY = "vault:access:seq"
+FLUSHED_KEY = "vault:access:flushed"
+GAP_KEY = "vault:access:gap"
+FLUSH_LOCK_KEY = "vault:access:flush-lock"
+FLUSH_DUE_KEY = "vault:access:flush-due"
+
+BATCH_SIZE = 500
+
+
+def get_cache():
+    return caches[settings.VAULT_ACCESS_CACHE]
+
+
+def slot_key(slot):
+    return f"vault:access:slot:{slot}"
+
+
+def record_access(item_id, user_id, accessed_at):
+    """Buffer an access to the item, flushing the buffer if one is due.
+
+    ``user_id`` is the item's owner, whose cached list pages the flush will
+    invalidate.
+
+    Returns False if the item was already recorded within the staleness window.
+    """
+    cache = get_cache()
+    if not cache.add(
+        f"vault:access:seen:{item_id}", 1, timeout=settings.VAULT_ACCESS_STALENESS
+    ):
+        return False
+
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    slot = cache.incr(SEQUENCE_KEY)
+    cache.set(slot_key(slot), (item_id, accessed_at, user_id), timeout=None)
+
+    # at most one request per interval pays for writing the buffer back
+    if cache.add(FLUSH_DUE_KEY, 1, timeout=settings.VAULT_ACCESS_FLUSH_INTERVAL):
+        flush()
+    return True
+
+
+def flush():
+    """Write buffered access times to the database, returning how many items."""
+    from .models import VaultItem
+
+    cache = get_cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, timeout=60):
+        return 0  # somebody else is already flushing
+
+    written = 0
+    try:
+        last = cache.get(SEQUENCE_KEY, 0)
+        flushed = cache.get(FLUSHED_KEY, 0)
+
+        while flushed < last:
+            slots = range(flushed + 1, min(flushed + BATCH_SIZE, last) + 1)
+            entries = cache.get_many([slot_key(slot) for slot in slots])
+
+            upto = flushed
+            for slot in slots:
+                if slot_key(slot) not in entries and cache.get(GAP_KEY) != slot:
+                    # the slot was probably claimed but not written yet, so stop
+                    # here and try again next time; if it's still missing then,
+                    # it was evicted and gets skipped
+                    cache.set(GAP_KEY, slot, timeout=None)
+                    break
+                upto = slot
+
+            accessed = {}
+            users = set()
+            for slot in range(flushed + 1, upto + 1):
+                if slot_key(slot) in entries:
+                    # entries buffered before owners were recorded have none
+                    item_id, accessed_at, *owner = entries[slot_key(slot)]
+                    accessed[item_id] = accessed_at
+                    users.add(owner[0] if owner else None)
+
+            VaultItem.objects.bulk_update(
+                [
+                    VaultItem(pk=item_id, last_accessed=accessed_at)
+                    for item_id, accessed_at in accessed.items()
+                ],
+                ["last_accessed"],
+                batch_size=BATCH_SIZE,
+            )
+            if None in users:
+                # some owners weren't recorded, so look them all up
+                users = set(
+                    VaultItem.objects.filter(pk__in=accessed)
+                    .order_by()
+                    .values_list("user_id", flat=True)
+                    .distinct()
+                )
+            for user_id in users:
+                pagecache.bump_on_commit(user_id)
+            written += len(accessed)
+
+            cache.delete_many([slot_key(slot) for slot in range(flushed + 1, upto + 1)])
+            cache.set(FLUSHED_KEY, upto, timeout=None)
+            if upto < slots[-1]:
+                break
+            flushed = upto
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+    return written
@@ -2,5 +2,28 @@ from django.apps import AppConfig
 
 
 class VaultConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'vault'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "vault"
+
+    def ready(self):
+        import atexit
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from . import audit, pagecache
+        from .access import flush
+        from .search import reinstall_search_index
+
+        # don't lose buffered access times or history rows when the worker
+        # shuts down
+        atexit.register(flush)
+        atexit.register(audit.shutdown)
+
+        post_migrate.connect(reinstall_search_index, sender=self)
+
+        # saves and deletes of single items, including from the admin
+        VaultItem = self.get_model("VaultItem")
+        post_save.connect(pagecache.item_changed, sender=VaultItem)
+        post_delete.connect(pagecache.item_changed, sender=VaultItem)
+        User = get_user_model()
+        post_save.connect(pagecache.user_created, sender=User)
+        post_delete.connect(pagecache.user_deleted, sender=User)
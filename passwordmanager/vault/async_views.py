@@ -0,0 +1,172 @@
+"""
+Async variants of the vault item list, retrieve and create endpoints.
+
+DRF views are synchronous, so under ASGI every request to one holds a thread
+from the sync pool from start to finish. These are plain Django async views
+that do the same work through the async ORM and the cache's async API, so a
+request only needs a thread while one of its queries is running. They answer
+with the same JSON, ETags and cached pages as ``VaultItemViewSet``, and
+check the same permissions; other formats and the browsable API are only
+served by the sync views.
+"""
+
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    NotAuthenticated,
+    NotFound,
+    PermissionDenied,
+)
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from accounts.models import UserProfile
+
+from . import pagecache
+from .audit import record_history
+from .etags import alist_etag, item_etag
+from .models import VaultItem
+from .pagination import VaultItemKeysetPagination
+from .permissions import MFARequiredIfOptedIn
+from .serializers import VaultItemListSerializer, VaultItemSerializer
+from .views import filter_expired
+
+
+class AsyncVaultView(View):
+    """
+    Base for the async vault views.
+
+    Handlers get a DRF ``Request`` wrapping the Django one, with the user
+    already loaded, so the helpers shared with the sync views can read
+    ``request.user``, ``request.query_params`` and
+    ``request.accepted_renderer`` without touching the database. DRF
+    exceptions raised by those helpers are turned into responses the way
+    DRF's own exception handler would.
+    """
+
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        drf_request = Request(request)
+        drf_request.user = user
+        drf_request.accepted_renderer = self.renderer
+        drf_request.accepted_media_type = self.renderer.media_type
+        self.request = drf_request
+        try:
+            await self.check_permissions(drf_request)
+            return await super().dispatch(drf_request, *args, **kwargs)
+        except APIException as exc:
+            return self.render(exc.detail, status=exc.status_code)
+
+    async def check_permissions(self, request):
+        """What ``IsAuthenticated`` and ``MFARequiredIfOptedIn`` check."""
+        user = request.user
+        if not user.is_authenticated:
+            # a 403 rather than a 401, as DRF answers when the only
+            # authentication is the session, which has no challenge to send
+            raise PermissionDenied(NotAuthenticated.default_detail)
+        profile = await UserProfile.objects.filter(user=user).afirst()
+        if profile is not None and profile.mfa_enabled:
+            if not await request.session.aget("mfa_verified", False):
+                raise PermissionDenied(MFARequiredIfOptedIn.message)
+
+    def render(self, data, status=status.HTTP_200_OK):
+        if isinstance(data, str):
+            data = {"detail": data}
+        return HttpResponse(
+            self.renderer.render(data),
+            status=status,
+            content_type=self.renderer.media_type,
+        )
+
+    def get_queryset(self):
+        return VaultItem.objects.filter(
+            user=self.request.user, soft_deleted=False
+        ).with_expiry()
+
+
+class VaultItemListView(AsyncVaultView):
+    """``GET``/``POST`` of ``VaultItemViewSet``'s list route."""
+
+    async def get(self, request):
+        """List items, from the page cache where possible."""
+        generation = await pagecache.ageneration(request.user.pk)
+        if "expired" in request.query_params:
+            etag = await alist_etag(request, generation)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                queryset = filter_expired(self.get_queryset(), request.query_params)
+                response = self.render((await self.paginate(queryset))[0])
+            response["ETag"] = etag
+            return response
+
+        cached = await pagecache.aget_page(request, generation)
+        if cached is not None:
+            etag, data = cached
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = self.render(data)
+            response["ETag"] = etag
+            return response
+
+        etag = await alist_etag(request, generation)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data, page = await self.paginate(self.get_queryset())
+            await pagecache.astore_page(request, generation, etag, data, page)
+            response = self.render(data)
+        response["ETag"] = etag
+        return response
+
+    async def paginate(self, queryset):
+        """The response data for a page of ``queryset``, and the page's items."""
+        paginator = VaultItemKeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, self.request)
+        serializer = VaultItemListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data).data, page
+
+    async def post(self, request):
+        serializer = VaultItemSerializer(
+            data=JSONParser().parse(BytesIO(request.body)),
+            context={"request": request},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        user = request.user
+        vault_item = await VaultItem.objects.acreate(
+            user=user, **serializer.validated_data
+        )
+        await sync_to_async(record_history)(
+            vault_item, user, "created", details={"created_via": "api"}
+        )
+        return self.render(
+            VaultItemSerializer(vault_item).data, status=status.HTTP_201_CREATED
+        )
+
+
+class VaultItemDetailView(AsyncVaultView):
+    """``GET`` of ``VaultItemViewSet``'s detail route."""
+
+    async def get(self, request, pk):
+        """Track access when retrieving a single item."""
+        try:
+            instance = await self.get_queryset().select_related("user").aget(pk=pk)
+        except VaultItem.DoesNotExist:
+            raise NotFound("No VaultItem matches the given query.")
+        # the access buffer may flush to the database
+        await sync_to_async(instance.mark_accessed)()
+
+        etag = item_etag(request, instance)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.render(VaultItemSerializer(instance).data)
+        response["ETag"] = etag
+        return response
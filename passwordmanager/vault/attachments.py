@@ -0,0 +1,225 @@
+"""
+Content-addressed storage for attachment chunks.
+
+Each chunk is written once under its SHA-256, at ``ab/cd/abcd...`` below
+``VAULT_ATTACHMENT_ROOT``, so re-uploading a chunk (a retried request, or
+the same encrypted file attached twice) doesn't take any more disk.
+``VaultAttachmentChunk`` rows say which chunks make up which attachment;
+files no row points to any more are removed by ``prune_vault_chunks``.
+"""
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+
+from .models import VaultAttachmentChunk
+
+READ_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class ChunkTooLarge(Exception):
+    pass
+
+
+def chunk_path(digest):
+    return os.path.join(settings.VAULT_ATTACHMENT_ROOT, digest[:2], digest[2:4], digest)
+
+
+def store_chunk(stream, limit):
+    """
+    Store up to ``limit`` bytes read from ``stream``; return (digest, size).
+
+    The data goes to a temporary file while it's hashed, then is renamed into
+    place, so a chunk file is always complete and the request body is never
+    held in memory. Raises ChunkTooLarge if there's more than ``limit``.
+    """
+    root = settings.VAULT_ATTACHMENT_ROOT
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=root, prefix=".upload-", delete=False) as tmp:
+        try:
+            while True:
+                data = stream.read(min(READ_SIZE, limit + 1 - size))
+                if not data:
+                    break
+                size += len(data)
+                if size > limit:
+                    raise ChunkTooLarge
+                digest.update(data)
+                tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        except BaseException:
+            os.remove(tmp.name)
+            raise
+
+    digest = digest.hexdigest()
+    path = chunk_path(digest)
+    if os.path.exists(path):
+        os.remove(tmp.name)
+        # mark it as just used, so the pruner leaves it alone (see below)
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp.name, path)
+    return digest, size
+
+
+class ChunkedFile(io.RawIOBase):
+    """
+    A read-only, seekable view of an attachment's chunk files laid end to end.
+
+    Only the chunk being read is open, so serving a file of any size holds
+    just one read buffer in memory.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = [(chunk.digest, chunk.size) for chunk in chunks]
+        self.size = sum(size for _digest, size in self.chunks)
+        self.position = 0
+        self.current = None
+        self.current_index = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def locate(self, position):
+        """The index of the chunk holding ``position`` and the offset into it."""
+        start = 0
+        for index, (_digest, size) in enumerate(self.chunks):
+            if position < start + size:
+                return index, position - start
+            start += size
+        return None, 0
+
+    def readinto(self, buffer):
+        index, offset = self.locate(self.position)
+        if index is None:
+            return 0
+        if index != self.current_index:
+            self.close_current()
+            self.current = open(chunk_path(self.chunks[index][0]), "rb")
+            self.current_index = index
+        self.current.seek(offset)
+        count = self.current.readinto(buffer)
+        self.position += count
+        return count
+
+    def close_current(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+            self.current_index = None
+
+    def close(self):
+        self.close_current()
+        super().close()
+
+
+class RangeFile(io.RawIOBase):
+    """The bytes ``start`` to ``end`` (inclusive) of another file."""
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = end - start + 1
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)[: self.remaining]
+        count = self.file.readinto(view) if view.nbytes else 0
+        self.remaining -= count
+        return count
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def parse_range(header, size):
+    """
+    The (start, end) asked for by a ``Range`` header, both inclusive.
+
+    Returns None when the whole file should be sent (no header, a header
+    this doesn't understand or several ranges, which the spec lets a server
+    ignore), and raises ValueError when the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def prune_chunks(min_age):
+    """
+    Delete stored chunks that no attachment uses; return how many went.
+
+    A chunk is only deleted once its file is ``min_age`` seconds old, since
+    an upload in flight stores the file a moment before its row is saved
+    (and a deduplicated upload refreshes the file's mtime).
+    """
+    root = settings.VAULT_ATTACHMENT_ROOT
+    cutoff = time.time() - min_age
+    removed = 0
+    for directory, _dirs, files in os.walk(root):
+        candidates = {}
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.startswith(".upload-"):
+                # left behind by a worker that died mid-upload
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                continue
+            if os.path.getmtime(path) < cutoff:
+                candidates[name] = path
+        if not candidates:
+            continue
+        used = set(
+            VaultAttachmentChunk.objects.filter(digest__in=candidates)
+            .order_by()
+            .values_list("digest", flat=True)
+            .distinct()
+        )
+        for digest, path in candidates.items():
+            # check the age again in case an upload reused it meanwhile
+            if digest not in used and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    return removed
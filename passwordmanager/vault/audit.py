@@ -0,0 +1,296 @@
+"""
+Batched, asynchronous writer for VaultItemHistory.
+
+``record_history`` queues the row once the request's transaction commits and
+returns straight away; a background thread drains the queue and inserts rows
+with bulk_create. If the queue is full or the database can't take a batch,
+rows go to an append-only spool file instead and are replayed ahead of
+anything newer once the database is writable again. There is one queue and
+one drainer per process and the timestamp is taken when the row is recorded,
+so the order of events for an item is kept.
+
+Every worker process spools to the same file, so appending to it and
+replaying it are done under an exclusive ``flock`` on a lock file next to
+it. The spool is replayed a batch per transaction, and what's been written
+is cut from the front of the file before a failed replay gives up, so a
+retry never writes a row twice. Rows for items deleted since they were
+spooled can never be written, so they're moved to ``<spool>.orphaned``
+rather than failing the replay for good.
+
+With ``VAULT_AUDIT_MODE = "sync"`` rows are written inline, in the caller's
+transaction, which is what the tests use.
+"""
+
+import contextlib
+import fcntl
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    def __init__(self, batch_size, flush_interval, max_queue, spool_path):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        # once anything is spooled, newer rows are spooled behind it until the
+        # spool has been replayed, so rows are never written out of order
+        self.spooling = os.path.exists(spool_path)
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopped.clear()
+            self.thread = threading.Thread(
+                target=self.run, name="vault-audit-writer", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self):
+        """Stop the drainer and write out whatever is still queued."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval * 2)
+        self.drain()
+
+    def submit(self, entry):
+        # runs after the request's write has committed, so losing the row is
+        # better than failing the request
+        try:
+            with self.lock:
+                if not self.spooling:
+                    try:
+                        self.queue.put_nowait(entry)
+                        return
+                    except queue.Full:
+                        logger.warning("Audit queue is full, spooling history rows.")
+                        self.spooling = True
+                self.spool([entry])
+        except Exception:
+            logger.exception("Failed to record a history row, dropping it.")
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                first = None
+            try:
+                close_old_connections()
+                self.drain(first)
+            except Exception:
+                # keep draining, or the queue fills up behind a dead thread
+                logger.exception("Audit writer failed, will retry.")
+
+    def drain(self, first=None):
+        """Write everything queued (and spooled) in batches."""
+        batch = [] if first is None else [first]
+        while True:
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            if not self.write(batch):
+                return
+            batch = []
+
+        if self.spooling:
+            self.replay()
+
+    def write(self, batch):
+        from .models import VaultItemHistory
+
+        try:
+            VaultItemHistory.objects.bulk_create(
+                [VaultItemHistory(**entry) for entry in batch]
+            )
+            return True
+        except DatabaseError:
+            logger.exception("Failed to write history rows, spooling them.")
+            with self.lock:
+                # spool whatever is still queued too, to stay in order
+                while True:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self.spooling = True
+                self.spool(batch)
+            return False
+
+    @contextlib.contextmanager
+    def spool_lock(self):
+        """Hold the spool against the other worker processes."""
+        with open(self.spool_path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def spool(self, entries):
+        try:
+            with self.spool_lock():
+                append_entries(self.spool_path, entries)
+        except OSError:
+            logger.exception(
+                "Failed to spool %d history rows, dropping them.", len(entries)
+            )
+
+    def replay(self):
+        """Write spooled rows to the database and remove the spool."""
+        with self.lock, self.spool_lock():
+            if not os.path.exists(self.spool_path):
+                self.spooling = False
+                return
+            with open(self.spool_path, "rb") as spool:
+                # bytes from the start of the spool that are in the database
+                written = 0
+                while True:
+                    lines = list(itertools.islice(spool, self.batch_size))
+                    if not lines:
+                        break
+                    try:
+                        self.replay_batch(read_entries(lines))
+                    except DatabaseError:
+                        logger.exception(
+                            "Failed to replay the audit spool, will retry."
+                        )
+                        self.keep_spool_from(spool, written)
+                        return
+                    written += sum(len(line) for line in lines)
+            os.remove(self.spool_path)
+            self.spooling = False
+
+    def replay_batch(self, entries):
+        from .models import VaultItem, VaultItemHistory
+
+        for entry in entries:
+            entry["timestamp"] = parse_datetime(entry["timestamp"])
+        existing = {
+            str(pk)
+            for pk in VaultItem.objects.filter(
+                pk__in={entry["vault_item_id"] for entry in entries}
+            ).values_list("pk", flat=True)
+        }
+        rows, orphans = [], []
+        for entry in entries:
+            if str(entry["vault_item_id"]) in existing:
+                rows.append(VaultItemHistory(**entry))
+            else:
+                orphans.append(entry)
+        with transaction.atomic():
+            VaultItemHistory.objects.bulk_create(rows)
+        if orphans:
+            logger.warning(
+                "Moving %d spooled history rows for deleted items to %s.",
+                len(orphans),
+                self.spool_path + ".orphaned",
+            )
+            try:
+                append_entries(self.spool_path + ".orphaned", orphans)
+            except OSError:
+                # they can never be written anyway
+                logger.exception("Failed to set aside orphaned history rows.")
+
+    def keep_spool_from(self, spool, offset):
+        """Cut the first ``offset`` bytes, which have been written, from the spool."""
+        if not offset:
+            return
+        spool.seek(offset)
+        rest_path = self.spool_path + ".rest"
+        with open(rest_path, "wb") as rest:
+            shutil.copyfileobj(spool, rest)
+            rest.flush()
+            os.fsync(rest.fileno())
+        os.replace(rest_path, self.spool_path)
+
+
+def read_entries(lines):
+    """The history rows in spool lines, skipping any a failed append cut short."""
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            logger.warning("Skipping an unreadable line in the audit spool.")
+    return entries
+
+
+def append_entries(path, entries):
+    """Append history rows to a spool file as JSON lines."""
+    with open(path, "a+b") as spool:
+        if spool.seek(0, os.SEEK_END):
+            # an append cut short (by a full disk, say) leaves a partial line
+            spool.seek(-1, os.SEEK_END)
+            if spool.read(1) != b"\n":
+                spool.write(b"\n")
+        for entry in entries:
+            # DjangoJSONEncoder would round the timestamp to milliseconds
+            entry = dict(entry, timestamp=entry["timestamp"].isoformat())
+            spool.write(json.dumps(entry, cls=DjangoJSONEncoder).encode() + b"\n")
+        spool.flush()
+        os.fsync(spool.fileno())
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide writer, with its drainer thread running."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(
+                batch_size=settings.VAULT_AUDIT_BATCH_SIZE,
+                flush_interval=settings.VAULT_AUDIT_FLUSH_INTERVAL,
+                max_queue=settings.VAULT_AUDIT_QUEUE_SIZE,
+                spool_path=settings.VAULT_AUDIT_SPOOL_PATH,
+            )
+        _writer.start()
+        return _writer
+
+
+def shutdown():
+    """Flush queued history rows; registered to run at exit."""
+    if _writer is not None:
+        _writer.stop()
+
+
+def record_history(vault_item, user, action, details=None):
+    """Record a history row for the item (see the module docstring)."""
+    entry = {
+        "vault_item_id": vault_item.pk,
+        "user_id": user.pk,
+        "action": action,
+        "details": details,
+        "timestamp": timezone.now(),
+    }
+
+    if settings.VAULT_AUDIT_MODE == "sync":
+        from .models import VaultItemHistory
+
+        VaultItemHistory.objects.create(**entry)
+        return
+
+    # don't record anything for a write that ends up rolled back
+    transaction.on_commit(lambda: get_writer().submit(entry))
@@ -0,0 +1,109 @@
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import pagecache
+from .models import VaultItem, VaultItemHistory, VaultState, count_changes
+
+BATCH_SIZE = 500
+
+
+def apply_operations(user, operations, via="bulk"):
+    """
+    Apply validated bulk operations for ``user`` in a single transaction.
+
+    Items are written with bulk_create/bulk_update and the matching history
+    rows are bulk inserted, so the number of queries doesn't grow with the
+    number of operations. Returns one result per operation, in order.
+    """
+    now = timezone.now()
+    ids = {operation["id"] for operation in operations if operation["op"] != "create"}
+
+    results = []
+    created, updated, history = [], {}, []
+    changed_fields = {"revision"}
+
+    with transaction.atomic():
+        last_revision = VaultState.next_revision(user.pk, len(operations))
+        revision = last_revision - len(operations)
+
+        existing = VaultItem.objects.select_for_update().filter(
+            user=user, soft_deleted=False, pk__in=ids
+        )
+        existing = {item.pk: item for item in existing}
+
+        for operation in operations:
+            fields = dict(operation)
+            op = fields.pop("op")
+            revision += 1
+
+            if op == "create":
+                item = VaultItem(user=user, revision=revision, **fields)
+                # bulk_create skips save(), which stamps deleted_at; an
+                # imported trashed item is purged counting from now
+                if item.soft_deleted:
+                    item.deleted_at = now
+                created.append(item)
+                history.append(
+                    VaultItemHistory(
+                        vault_item=item,
+                        user=user,
+                        action="created",
+                        details={"created_via": via},
+                    )
+                )
+                results.append(
+                    {"op": op, "id": item.pk, "status": "created", "revision": revision}
+                )
+                continue
+
+            item = existing.get(fields.pop("id"))
+            if item is None or item.soft_deleted:
+                results.append({"op": op, "id": operation["id"], "status": "not_found"})
+                continue
+
+            if op == "update":
+                for name, value in fields.items():
+                    setattr(item, name, value)
+                # bulk_update skips auto_now, so set it the way save() would
+                item.updated_at = now
+                changed_fields.update(fields, {"updated_at"})
+                status = "updated"
+            else:
+                item.soft_deleted = True
+                item.deleted_at = now
+                changed_fields.update({"soft_deleted", "deleted_at"})
+                history.append(
+                    VaultItemHistory(
+                        vault_item=item,
+                        user=user,
+                        action="deleted",
+                        details={"deleted_via": via},
+                    )
+                )
+                status = "deleted"
+
+            item.revision = revision
+            updated[item.pk] = item
+            results.append(
+                {"op": op, "id": item.pk, "status": status, "revision": revision}
+            )
+
+        VaultItem.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        if updated:
+            VaultItem.objects.bulk_update(
+                updated.values(), sorted(changed_fields), batch_size=BATCH_SIZE
+            )
+        VaultItemHistory.objects.bulk_create(history, batch_size=BATCH_SIZE)
+
+        # Counter.update() rather than +=, which would drop the negative counts
+        changes = Counter()
+        for item in created:
+            changes.update(count_changes(None, item.counted_as()))
+        for item in updated.values():
+            changes.update(count_changes(item._counted_as, item.counted_as()))
+        VaultState.update_counts(user.pk, changes)
+        pagecache.bump_on_commit(user.pk)
+
+    return results
@@ -0,0 +1,102 @@
+"""
+Compact storage for ``VaultItem.encrypted_data``.
+
+Clients send ciphertext as base64 text (the web client sends
+``salt:iv:ciphertext``, each part base64 encoded). Stored as text that is a
+third bigger than the bytes behind it. ``pack`` turns it into those bytes and
+``unpack`` gives back exactly the text that was sent, so the API doesn't
+change. Anything that isn't canonical base64 is kept verbatim.
+
+Layout: one tag byte, then either the UTF-8 text (``TEXT``) or, for
+``BASE64``, a segment count byte, the decoded segments each prefixed with its
+length, and the last segment unprefixed.
+
+Binary wire formats send the segments themselves rather than base64 text;
+``pack_segments`` and ``unpack_segments`` convert between those and the
+stored bytes.
+"""
+
+import base64
+import binascii
+import struct
+
+TEXT = 0
+BASE64 = 1
+
+SEPARATOR = ":"
+LENGTH = struct.Struct(">I")
+MAX_SEGMENTS = 255
+
+
+def decode_segment(segment):
+    """The bytes ``segment`` encodes, or None if it isn't canonical base64."""
+    try:
+        raw = base64.b64decode(segment, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    if base64.b64encode(raw).decode() != segment:
+        return None
+    return raw
+
+
+def pack(text):
+    segments = text.split(SEPARATOR)
+    raw = [decode_segment(segment) for segment in segments]
+    if len(segments) > MAX_SEGMENTS or None in raw:
+        return bytes([TEXT]) + text.encode()
+    return pack_segments(raw)
+
+
+def pack_segments(raw):
+    """Pack ciphertext sent as its raw segments rather than base64 text."""
+    if not 0 < len(raw) <= MAX_SEGMENTS:
+        raise ValueError(f"Ciphertext must have 1 to {MAX_SEGMENTS} segments")
+    *heads, last = raw
+    return (
+        bytes([BASE64, len(raw)])
+        + b"".join(LENGTH.pack(len(head)) + head for head in heads)
+        + last
+    )
+
+
+def unpack(data):
+    # Postgres hands back a memoryview
+    data = bytes(data)
+    if data[0] == TEXT:
+        return data[1:].decode()
+    return SEPARATOR.join(
+        base64.b64encode(segment).decode() for segment in unpack_segments(data)
+    )
+
+
+def unpack_segments(data):
+    """The raw segments of packed ciphertext, or None if it's kept as text."""
+    data = bytes(data)
+    if data[0] == TEXT:
+        return None
+
+    count, offset = data[1], 2
+    segments = []
+    for _ in range(count - 1):
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        segments.append(data[offset : offset + length])
+        offset += length
+    segments.append(data[offset:])
+    return segments
+
+
+class Ciphertext(str):
+    """
+    Unpacked ciphertext text that keeps the packed bytes it came from, so a
+    binary format can send the raw segments in place of the base64 text.
+    """
+
+    def __new__(cls, packed):
+        packed = bytes(packed)
+        ciphertext = super().__new__(cls, unpack(packed))
+        ciphertext.packed = packed
+        return ciphertext
+
+    def __reduce__(self):
+        return Ciphertext, (self.packed,)
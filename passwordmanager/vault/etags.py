@@ -0,0 +1,63 @@
+import hashlib
+
+from django.utils.http import quote_etag
+
+from .models import VaultItem, VaultState
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode())
+    # weak: the same representation may be re-encoded (e.g. compressed) on the way out
+    return "W/" + quote_etag(digest.hexdigest()[:32])
+
+
+def list_etag(request, generation):
+    """
+    ETag for a page of the user's vault, computed without loading the page.
+
+    The vault revision changes on every write to one of the user's items; the
+    count of expired items covers ``is_expired`` flipping over with no write.
+    The page cache's ``generation`` also moves on writes that don't change
+    the revision, such as access times being flushed.
+    The full URL is included since every page and page size has its own ETag.
+    """
+    revisions, expired = list_etag_queries(request.user)
+    return make_list_etag(request, generation, revisions.first(), expired.count())
+
+
+async def alist_etag(request, generation):
+    """``list_etag()`` for async views, using the async ORM."""
+    revisions, expired = list_etag_queries(request.user)
+    return make_list_etag(
+        request, generation, await revisions.afirst(), await expired.acount()
+    )
+
+
+def list_etag_queries(user):
+    """The user's vault revision, and their expired items to count."""
+    revisions = VaultState.objects.filter(user=user).values_list("revision", flat=True)
+    expired = VaultItem.objects.filter(user=user, soft_deleted=False).expired()
+    return revisions, expired
+
+
+def make_list_etag(request, generation, revision, expired):
+    return make_etag(
+        request.user.pk,
+        revision or 0,
+        generation,
+        expired,
+        request.accepted_renderer.format,
+        request.get_full_path(),
+    )
+
+
+def item_etag(request, item):
+    """ETag for a single item, keyed on when it last changed."""
+    return make_etag(
+        item.pk,
+        item.updated_at.isoformat(),
+        item.revision,
+        item.is_expired(),
+        request.accepted_renderer.format,
+        request.query_params.get("fields"),
+    )
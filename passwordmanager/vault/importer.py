@@ -0,0 +1,63 @@
+import json
+
+from . import bulk
+from .serializers import VaultItemSerializer
+
+# items written per transaction
+CHUNK_SIZE = 500
+
+# line errors reported back; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def import_lines(user, lines):
+    """
+    Import already-encrypted items from NDJSON ``lines`` (e.g. an export).
+
+    Lines are read one at a time and validated with VaultItemSerializer's
+    field rules; valid items are written in fixed-size chunks through the
+    bulk path, each chunk in its own transaction. History lines from an
+    export are skipped. Returns a summary with line-level errors.
+    """
+    summary = {"imported": 0, "skipped": 0, "failed": 0, "errors": []}
+    chunk = []
+
+    def fail(line_number, errors):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_number, "errors": errors})
+
+    def write(chunk):
+        bulk.apply_operations(user, chunk, via="import")
+        summary["imported"] += len(chunk)
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except (ValueError, UnicodeDecodeError):
+            fail(line_number, ["Invalid JSON."])
+            continue
+        if not isinstance(record, dict):
+            fail(line_number, ["Expected a JSON object."])
+            continue
+
+        if record.get("type", "item") != "item":
+            summary["skipped"] += 1
+            continue
+
+        serializer = VaultItemSerializer(data=record)
+        if not serializer.is_valid():
+            fail(line_number, serializer.errors)
+            continue
+
+        chunk.append({"op": "create", **serializer.validated_data})
+        if len(chunk) == CHUNK_SIZE:
+            write(chunk)
+            chunk = []
+
+    if chunk:
+        write(chunk)
+    return summary
@@ -0,0 +1,252 @@
+import base64
+import json
+import os
+import statistics
+import time
+
+import msgpack
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from passwordmanager.middleware import COMPRESSORS, compress
+from vault.ciphertext import pack, unpack
+from vault.export import export_lines
+from vault.models import VaultItem, VaultItemHistory
+from vault.renderers import MessagePackRenderer
+from vault.serializers import VaultItemSerializer
+from vault.views import VaultItemHistoryViewSet, VaultItemViewSet
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a benchmark scenario under ``name``."""
+
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+class PageNumberBaseline(PageNumberPagination):
+    page_size_query_param = "page_size"
+
+
+class Rollback(Exception):
+    """Raised to throw away everything a scenario wrote."""
+
+
+def timed(func, repeat):
+    """Run ``func`` ``repeat`` times and return the timings in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def random_ciphertext(size=256):
+    """Ciphertext shaped like the web client's ``salt:iv:ciphertext``."""
+    return ":".join(base64.b64encode(os.urandom(n)).decode() for n in (16, 12, size))
+
+
+def create_items(user, count, batch_size=2000):
+    """Bulk insert ``count`` items with random ciphertext for ``user``."""
+    for offset in range(0, count, batch_size):
+        VaultItem.objects.bulk_create(
+            [
+                VaultItem(
+                    user=user,
+                    title=f"bench item {offset + i}",
+                    encrypted_data=pack(random_ciphertext()),
+                )
+                for i in range(min(batch_size, count - offset))
+            ]
+        )
+
+
+def get(view, user, pk=None, **params):
+    request = APIRequestFactory().get(
+        "/api/vault/items/", params, HTTP_HOST="localhost"
+    )
+    force_authenticate(request, user=user)
+    response = view(request) if pk is None else view(request, pk=pk)
+    response.render()
+    return response
+
+
+@scenario("pagination")
+def bench_pagination(command, user, options):
+    """Page latency at increasing depth: keyset cursor vs page number."""
+    page_size = options["page_size"]
+    keyset_view = VaultItemViewSet.as_view({"get": "list"})
+    paged_view = VaultItemViewSet.as_view(
+        {"get": "list"}, pagination_class=PageNumberBaseline
+    )
+    paginator = VaultItemViewSet.pagination_class()
+    ordered = VaultItem.objects.filter(user=user).order_by(*paginator.ordering)
+
+    command.stdout.write(f"{'page':>8} {'keyset ms':>12} {'page-number ms':>16}")
+    page = 1
+    while (page - 1) * page_size < options["items"]:
+        if page == 1:
+            cursor = {}
+        else:
+            # the cursor a client would hold after walking to this page
+            last = ordered[(page - 1) * page_size - 1]
+            cursor = {"cursor": paginator.encode_cursor(last)}
+
+        keyset = timed(
+            lambda: get(keyset_view, user, page_size=page_size, **cursor),
+            options["repeat"],
+        )
+        paged = timed(
+            lambda: get(paged_view, user, page=page, page_size=page_size),
+            options["repeat"],
+        )
+        command.stdout.write(
+            f"{page:>8} {statistics.median(keyset):>12.2f} "
+            f"{statistics.median(paged):>16.2f}"
+        )
+        page *= 10
+
+
+@scenario("storage")
+def bench_storage(command, user, options):
+    """Ciphertext bytes stored packed vs as base64 text, and read latency."""
+    items = VaultItem.objects.filter(user=user)
+    packed = text = 0
+    start = time.perf_counter()
+    for data in items.values_list("encrypted_data", flat=True).iterator():
+        packed += len(data)
+        text += len(unpack(data).encode())
+    unpack_ms = (time.perf_counter() - start) * 1000
+
+    command.stdout.write(f"{'base64 text bytes':>24} {text:>14}")
+    command.stdout.write(f"{'packed bytes':>24} {packed:>14}")
+    command.stdout.write(f"{'saved':>24} {1 - packed / text:>14.1%}")
+    command.stdout.write(f"{'unpack all, ms':>24} {unpack_ms:>14.2f}")
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_total_relation_size('vault_vaultitem')")
+            size = cursor.fetchone()[0]
+        command.stdout.write(f"{'table + TOAST bytes':>24} {size:>14}")
+
+    list_view = VaultItemViewSet.as_view({"get": "list"})
+    detail_view = VaultItemViewSet.as_view({"get": "retrieve"})
+    item = items.first()
+    for label, func in [
+        ("list", lambda: get(list_view, user, page_size=options["page_size"])),
+        ("detail", lambda: get(detail_view, user, pk=item.pk)),
+    ]:
+        timings = timed(func, options["repeat"])
+        command.stdout.write(f"{label + ' ms':>24} {statistics.median(timings):>14.2f}")
+
+
+@scenario("search")
+def bench_search(command, user, options):
+    """Search latency for prefix, substring and short queries."""
+    search_view = VaultItemViewSet.as_view({"get": "search"})
+    last = options["items"] - 1
+    queries = [
+        ("title prefix", "bench item 1"),
+        ("substring", f"item {last}"),
+        ("rare substring", str(last)),
+        ("no match", "nothing like this"),
+        ("short", "12"),
+    ]
+
+    command.stdout.write(f"{'query':>16} {'p50 ms':>10} {'p99 ms':>10}")
+    for label, query in queries:
+        timings = timed(
+            lambda: get(search_view, user, q=query, page_size=options["page_size"]),
+            options["repeat"],
+        )
+        p99 = statistics.quantiles(timings, n=100)[98] if len(timings) > 1 else 0
+        command.stdout.write(
+            f"{label:>16} {statistics.median(timings):>10.2f} {p99:>10.2f}"
+        )
+
+
+@scenario("wire")
+def bench_wire(command, user, options):
+    """Size and encode/decode time of a page of items, JSON vs MessagePack."""
+    items = VaultItem.objects.filter(user=user).select_related("user")
+    page = {"results": VaultItemSerializer(items[:1000], many=True).data}
+    formats = [
+        ("json", JSONRenderer(), json.loads),
+        ("msgpack", MessagePackRenderer(), msgpack.unpackb),
+    ]
+
+    command.stdout.write(
+        f"{'format':>10} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}"
+    )
+    for label, renderer, decode in formats:
+        body = renderer.render(page)
+        encode = timed(lambda: renderer.render(page), options["repeat"])
+        decoded = timed(lambda: decode(body), options["repeat"])
+        command.stdout.write(
+            f"{label:>10} {len(body):>10} {statistics.median(encode):>10.2f} "
+            f"{statistics.median(decoded):>10.2f}"
+        )
+
+
+@scenario("compression")
+def bench_compression(command, user, options):
+    """Bytes on the wire and compression time per response, by encoding."""
+    items = list(VaultItem.objects.filter(user=user).values_list("pk", flat=True))
+    VaultItemHistory.objects.bulk_create(
+        VaultItemHistory(
+            vault_item_id=pk, user=user, action="updated", details={"via": "api"}
+        )
+        for pk in items[:1000]
+    )
+    list_view = VaultItemViewSet.as_view({"get": "list"})
+    history_view = VaultItemHistoryViewSet.as_view({"get": "list"})
+    responses = [
+        ("list", get(list_view, user, page_size=100).content),
+        ("history", get(history_view, user).content),
+        ("export", "".join(export_lines(user, include_history=True)).encode()),
+    ]
+
+    command.stdout.write(
+        f"{'response':>10} {'encoding':>10} {'bytes':>12} {'ratio':>8} {'ms':>10}"
+    )
+    for label, body in responses:
+        command.stdout.write(
+            f"{label:>10} {'identity':>10} {len(body):>12} {1:>8.2f} {0:>10.2f}"
+        )
+        for encoding, compressor_class in COMPRESSORS.items():
+            size = len(compress(compressor_class, body))
+            timings = timed(lambda: compress(compressor_class, body), options["repeat"])
+            command.stdout.write(
+                f"{label:>10} {encoding:>10} {size:>12} {size / len(body):>8.2f} "
+                f"{statistics.median(timings):>10.2f}"
+            )
+
+
+class Command(BaseCommand):
+    help = "Benchmark vault endpoints against a throwaway user (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(SCENARIOS))
+        parser.add_argument("--items", type=int, default=50000)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username="benchmark@example.com")
+                self.stdout.write(f"Creating {options['items']} vault items...")
+                create_items(user, options["items"])
+                SCENARIOS[options["scenario"]](self, user, options)
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,209 @@
+import asyncio
+import io
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+from django.urls import reverse
+
+from vault.management.commands.benchmark_vault import create_items
+from vault.models import VaultItem
+
+# (label, server, route name): the sync views under both servers, so the
+# async views can be compared with what ASGI gives the sync ones
+TARGETS = [
+    ("wsgi sync", "wsgi", "vaultitem"),
+    ("asgi sync", "asgi", "vaultitem"),
+    ("asgi async", "asgi", "vaultitem-async"),
+]
+
+
+def call_wsgi(app, path, query, cookie):
+    """Run one GET through the WSGI application, returning the status code."""
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_COOKIE": cookie,
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    statuses = []
+    response = app(
+        environ, lambda status, headers, exc_info=None: statuses.append(status)
+    )
+    try:
+        b"".join(response)
+    finally:
+        # sends request_finished, which closes the thread's connection
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def call_asgi(app, path, query, cookie):
+    """Run one GET through the ASGI application, returning the status code."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    received = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # the client stays connected; Django stops listening once it's answered
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_clients(request, clients, requests):
+    """
+    Have ``clients`` clients send ``requests`` requests between them, each
+    waiting for its last answer before sending the next.
+
+    Returns the wall time in seconds and each request's latency in ms.
+    """
+    remaining = requests
+    timings = []
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status = await request()
+            timings.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                raise RuntimeError(f"Benchmark request failed with {status}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - start, timings
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark throughput and latency of the vault item list or detail "
+        "endpoint under WSGI and ASGI, at increasing numbers of concurrent "
+        "clients. Items are written to the configured database and deleted "
+        "afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=["list", "detail"], default="list")
+        parser.add_argument("--items", type=int, default=1000)
+        parser.add_argument(
+            "--clients",
+            type=int,
+            nargs="+",
+            default=[1, 50, 500],
+            help="Numbers of concurrent clients to run",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2000,
+            help="Requests sent at each level of concurrency",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=32,
+            help="Request threads of the simulated WSGI server",
+        )
+
+    def handle(self, *args, **options):
+        # the data has to be committed, since the servers' requests are
+        # answered from other threads and so other connections
+        user = User.objects.create_user(username="benchmark@example.com")
+        try:
+            self.stdout.write(f"Creating {options['items']} vault items...")
+            create_items(user, options["items"])
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            cookie = f"{settings.SESSION_COOKIE_NAME}={session}"
+            asyncio.run(self.run(user, cookie, options))
+        finally:
+            user.delete()
+
+    async def run(self, user, cookie, options):
+        wsgi_app = get_wsgi_application()
+        asgi_app = get_asgi_application()
+        item = await VaultItem.objects.filter(user=user).afirst()
+        query = "page_size=10" if options["endpoint"] == "list" else ""
+
+        self.stdout.write(
+            f"{'server':>12} {'clients':>8} {'req/s':>10} "
+            f"{'p50 ms':>10} {'p99 ms':>10}"
+        )
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            loop = asyncio.get_running_loop()
+            for label, server, route in TARGETS:
+                if options["endpoint"] == "list":
+                    path = reverse(f"{route}-list")
+                else:
+                    path = reverse(f"{route}-detail", args=[item.pk])
+
+                if server == "wsgi":
+                    # requests beyond the server's threads queue for one,
+                    # as they would in front of a threaded WSGI server
+                    def request(path=path):
+                        return loop.run_in_executor(
+                            pool, call_wsgi, wsgi_app, path, query, cookie
+                        )
+
+                else:
+
+                    def request(path=path):
+                        return call_asgi(asgi_app, path, query, cookie)
+
+                for clients in options["clients"]:
+                    elapsed, timings = await run_clients(
+                        request, clients, options["requests"]
+                    )
+                    p99 = statistics.quantiles(timings, n=100)[98]
+                    self.stdout.write(
+                        f"{label:>12} {clients:>8} {len(timings) / elapsed:>10.0f} "
+                        f"{statistics.median(timings):>10.2f} {p99:>10.2f}"
+                    )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vault.access import flush
+
+
+class Command(BaseCommand):
+    help = "Write buffered vault item access times to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and flush every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush()
+            self.stdout.write(
+                self.style.SUCCESS(f"Flushed access times for {written} items.")
+            )
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
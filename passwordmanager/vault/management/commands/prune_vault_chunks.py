@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from vault.attachments import prune_chunks
+
+
+class Command(BaseCommand):
+    help = "Delete stored attachment chunks that no attachment uses any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Only delete chunk files older than MIN_AGE seconds",
+        )
+
+    def handle(self, *args, **options):
+        removed = prune_chunks(options["min_age"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} unused chunks."))
@@ -0,0 +1,95 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from vault.export import HISTORY_FIELDS, to_line
+from vault.models import VaultItemHistory
+from vault.partitions import drop_partitions_before, ensure_history_partitions
+
+
+class Command(BaseCommand):
+    help = "Delete (or archive) vault history older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.VAULT_HISTORY_RETENTION_DAYS,
+            help="Keep history from the last DAYS days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows deleted per transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches",
+        )
+        parser.add_argument(
+            "--archive",
+            metavar="PATH",
+            help="Append the rows to PATH as NDJSON before deleting them",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = now - timedelta(days=options["days"])
+
+        created = ensure_history_partitions(now)
+        if created:
+            self.stdout.write(f"Created partitions {', '.join(created)}.")
+
+        # whole months can simply be dropped, unless they need archiving first
+        if not options["archive"]:
+            dropped = drop_partitions_before(cutoff)
+            if dropped:
+                self.stdout.write(f"Dropped partitions {', '.join(dropped)}.")
+
+        deleted = 0
+        while True:
+            batch = self.delete_batch(cutoff, options["batch_size"], options["archive"])
+            if not batch:
+                break
+            deleted += batch
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} history rows older than {cutoff:%Y-%m-%d}."
+            )
+        )
+
+    def delete_batch(self, cutoff, batch_size, archive):
+        """
+        Delete the oldest ``batch_size`` rows before ``cutoff``.
+
+        Each batch is its own short transaction so no lock is held for long.
+        Archived rows are on disk before they're deleted; if the delete fails
+        they'll be archived again by the next run rather than lost.
+        """
+        old = VaultItemHistory.objects.filter(timestamp__lt=cutoff)
+        with transaction.atomic():
+            rows = list(
+                old.order_by("timestamp", "id").values(
+                    "id", "user_id", *HISTORY_FIELDS
+                )[:batch_size]
+            )
+            if not rows:
+                return 0
+            if archive:
+                with open(archive, "a") as out:
+                    out.writelines(to_line("history", row) for row in rows)
+                    out.flush()
+                    os.fsync(out.fileno())
+            old.filter(id__in=[row["id"] for row in rows]).delete()
+        return len(rows)
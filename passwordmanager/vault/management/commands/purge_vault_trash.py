@@ -0,0 +1,101 @@
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from vault.models import VaultItem, VaultItemHistory, VaultItemTombstone, VaultState
+
+
+class Command(BaseCommand):
+    help = "Permanently delete vault items that have been in the trash too long"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.VAULT_TRASH_RETENTION_DAYS,
+            help="Keep items deleted in the last DAYS days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Items deleted per transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        purged = 0
+        while True:
+            batch = self.purge_batch(cutoff, options["batch_size"])
+            if not batch:
+                break
+            purged += batch
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Purged {purged} items deleted before {cutoff:%Y-%m-%d}."
+            )
+        )
+
+    def purge_batch(self, cutoff, batch_size):
+        """
+        Delete the ``batch_size`` items that were soft deleted longest ago.
+
+        Each batch is its own short transaction. It locks the owners'
+        VaultState rows first, in user id order, and only then their items,
+        the order every other write takes them in; items another transaction
+        still holds are skipped (they're picked up by the next run if they're
+        still in the trash).
+        """
+        old = VaultItem.objects.filter(soft_deleted=True, deleted_at__lt=cutoff)
+        oldest = old.order_by("deleted_at", "id")
+        with transaction.atomic():
+            user_ids = sorted(
+                set(oldest.values_list("user_id", flat=True)[:batch_size])
+            )
+            if not user_ids:
+                return 0
+            states = {user_id: VaultState.locked(user_id) for user_id in user_ids}
+            # looked up again under the locks, as some may have been restored
+            rows = list(
+                oldest.filter(user_id__in=user_ids)
+                .select_for_update(skip_locked=True)
+                .values_list("id", "user_id")[:batch_size]
+            )
+            if not rows:
+                return 0
+            ids = [pk for pk, _user_id in rows]
+            # history first, as one DELETE, rather than leaving the cascade
+            # to load it row by row
+            VaultItemHistory.objects.filter(vault_item_id__in=ids).delete()
+            # attachments go with their items; their chunk files are removed
+            # by prune_vault_chunks once nothing uses them
+            old.filter(id__in=ids).delete()
+            by_user = defaultdict(list)
+            for pk, user_id in rows:
+                by_user[user_id].append(pk)
+            tombstones = []
+            for user_id, pks in by_user.items():
+                # a revision per item, for the change feed's tombstones
+                last = states[user_id].advance(
+                    len(pks), changes=Counter(deleted=-len(pks))
+                )
+                tombstones += [
+                    VaultItemTombstone(user_id=user_id, item_id=pk, revision=revision)
+                    for revision, pk in enumerate(pks, last - len(pks) + 1)
+                ]
+            VaultItemTombstone.objects.bulk_create(tombstones)
+        return len(ids)
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from vault.models import VaultItem, VaultItemHistory
+
+
+class Command(BaseCommand):
+    help = 'Record an "expired" history event for each newly expired vault item'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Items recorded per transaction",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        recorded = 0
+        while True:
+            batch = self.sweep_batch(now, options["batch_size"])
+            if not batch:
+                break
+            recorded += batch
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Recorded {recorded} expired items."))
+
+    def sweep_batch(self, now, batch_size):
+        """
+        Record the next ``batch_size`` items that expired by ``now``.
+
+        The items are marked in the same transaction as their history rows go
+        in, so an item is recorded exactly once per expiry time even if a
+        sweep is interrupted or two run at once.
+        """
+        due = VaultItem.objects.expiry_unrecorded().filter(expires_at__lt=now)
+        with transaction.atomic():
+            items = list(
+                due.select_for_update(skip_locked=True)
+                .order_by("expires_at", "id")
+                .values("id", "user_id", "expires_at")[:batch_size]
+            )
+            if not items:
+                return 0
+            VaultItemHistory.objects.bulk_create(
+                VaultItemHistory(
+                    vault_item_id=item["id"],
+                    user_id=item["user_id"],
+                    action="expired",
+                    details={"expires_at": item["expires_at"].isoformat()},
+                )
+                for item in items
+            )
+            # update() rather than save(): this isn't a change to the item, so
+            # it doesn't get a new revision or updated_at. The rows are locked,
+            # so expires_at is still what was recorded above.
+            VaultItem.objects.filter(pk__in=[item["id"] for item in items]).update(
+                expiry_recorded_for=F("expires_at")
+            )
+        return len(items)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from vault import pagecache
+
+
+class Command(BaseCommand):
+    help = "Show hits and misses of the vault list page cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards"
+        )
+
+    def handle(self, *args, **options):
+        stats = pagecache.stats()
+        total = stats["hits"] + stats["misses"]
+        rate = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"hits {stats['hits']}, misses {stats['misses']}, hit rate {rate:.1%}"
+        )
+        if options["reset"]:
+            pagecache.reset_stats()
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_revisions(apps, schema_editor):
+    """Give existing items distinct revisions so a first sync from 0 sees them."""
+    VaultItem = apps.get_model("vault", "VaultItem")
+    VaultState = apps.get_model("vault", "VaultState")
+
+    user_ids = VaultItem.objects.values_list("user_id", flat=True).order_by().distinct()
+    for user_id in user_ids:
+        items = VaultItem.objects.filter(user_id=user_id).order_by("updated_at")
+        revision = 0
+        for item in items.only("pk").iterator():
+            revision += 1
+            VaultItem.objects.filter(pk=item.pk).update(revision=revision)
+        VaultState.objects.create(user_id=user_id, revision=revision)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vault', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VaultState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.BigIntegerField(default=0, help_text='Revision of the most recent change to the vault')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vaultitem',
+            name='revision',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Vault revision of the last change to this item'),
+        ),
+        migrations.AddIndex(
+            model_name='vaultitem',
+            index=models.Index(fields=['user', 'revision'], name='vault_vault_user_id_138a4e_idx'),
+        ),
+        migrations.AddField(
+            model_name='vaultstate',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='vault_state', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_revisions, migrations.RunPython.noop),
+    ]
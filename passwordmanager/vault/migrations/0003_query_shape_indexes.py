@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0002_vaultstate_vaultitem_revision"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="vaultitem",
+            name="vault_vault_user_id_e27bd9_idx",
+        ),
+        migrations.AddIndex(
+            model_name="vaultitem",
+            index=models.Index(
+                condition=models.Q(("soft_deleted", False)),
+                fields=["user", "-updated_at", "-id"],
+                name="vault_item_live_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vaultitem",
+            index=models.Index(
+                condition=models.Q(("soft_deleted", True)),
+                fields=["user", "-updated_at", "-id"],
+                name="vault_item_trash_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vaultitemhistory",
+            index=models.Index(
+                fields=["user", "-timestamp"], name="vault_history_user_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vaultitemhistory",
+            index=models.Index(
+                fields=["vault_item", "-timestamp"], name="vault_history_item_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0003_query_shape_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="vaultitemhistory",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
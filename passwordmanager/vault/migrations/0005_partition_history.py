@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from vault.partitions import (
+    DEFAULT_PARTITION,
+    TABLE,
+    create_partition,
+    month_start,
+    next_month,
+)
+
+# the columns of VaultItemHistory as of 0004, in table order
+COLUMNS = "id, action, details, timestamp, user_id, vault_item_id"
+
+INDEXES = [
+    ("vault_history_user_idx", "user_id, timestamp DESC"),
+    ("vault_history_item_idx", "vault_item_id, timestamp DESC"),
+]
+
+
+def rebuild_history(apps, schema_editor, partitioned):
+    """
+    Copy the history table into a new (partitioned or plain) one and swap it in.
+
+    A partitioned table's primary key has to include the partition key, so it
+    becomes (id, timestamp); ids carry on from where the old sequence left off
+    and stay unique, and Django keeps treating ``id`` as the primary key.
+    """
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    new = f"{TABLE}_new"
+    user_table = qn(apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(timestamp), coalesce(max(id), 0) FROM {qn(TABLE)}")
+        oldest, last_id = cursor.fetchone()
+
+        # a plain sequence rather than an identity column, which partitioned
+        # tables only support from Postgres 17
+        sequence = qn(new + "_id_seq")
+        cursor.execute(f"CREATE SEQUENCE {sequence}")
+        cursor.execute(
+            f"CREATE TABLE {qn(new)} ("
+            f" id bigint NOT NULL DEFAULT nextval('{sequence}'),"
+            " action varchar(50) NOT NULL,"
+            " details jsonb NULL,"
+            " timestamp timestamp with time zone NOT NULL,"
+            f" user_id integer NOT NULL REFERENCES {user_table} (id)"
+            " DEFERRABLE INITIALLY DEFERRED,"
+            f" vault_item_id uuid NOT NULL REFERENCES {qn('vault_vaultitem')} (id)"
+            " DEFERRABLE INITIALLY DEFERRED,"
+            + (
+                " PRIMARY KEY (id, timestamp)) PARTITION BY RANGE (timestamp)"
+                if partitioned
+                else " PRIMARY KEY (id))"
+            )
+        )
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {qn(new)}.id")
+        if partitioned:
+            cursor.execute(
+                f"CREATE TABLE {qn(DEFAULT_PARTITION)}"
+                f" PARTITION OF {qn(new)} DEFAULT"
+            )
+
+        cursor.execute(
+            f"INSERT INTO {qn(new)} ({COLUMNS}) SELECT {COLUMNS} FROM {qn(TABLE)}"
+        )
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)",
+            [new, max(last_id, 1), last_id > 0],
+        )
+        cursor.execute(f"DROP TABLE {qn(TABLE)}")
+        cursor.execute(f"ALTER TABLE {qn(new)} RENAME TO {qn(TABLE)}")
+        # take back the old names, so running this again the other way can't
+        # collide with them
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)}"
+            f" RENAME CONSTRAINT {qn(new + '_pkey')} TO {qn(TABLE + '_pkey')}"
+        )
+        cursor.execute(
+            f"ALTER SEQUENCE {qn(new + '_id_seq')} RENAME TO {qn(TABLE + '_id_seq')}"
+        )
+        for name, columns in INDEXES:
+            cursor.execute(f"CREATE INDEX {qn(name)} ON {qn(TABLE)} ({columns})")
+
+    if partitioned:
+        # a partition for every month from the oldest row to two months ahead
+        now = timezone.now()
+        start = month_start(oldest or now)
+        last = next_month(next_month(month_start(now)))
+        while start <= last:
+            create_partition(start, using=connection)
+            start = next_month(start)
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        rebuild_history(apps, schema_editor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        rebuild_history(apps, schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    """
+    Partition VaultItemHistory by month on Postgres.
+
+    Other databases keep the plain table. Nothing changes in the model state;
+    the partitioned table has the same columns and indexes.
+    """
+
+    dependencies = [
+        ("vault", "0004_history_timestamp_default"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+        migrations.AddIndex(
+            model_name="vaultitemhistory",
+            index=models.Index(fields=["timestamp"], name="vault_history_time_idx"),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0005_partition_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vaultitem",
+            name="encrypted_blob",
+            field=models.BinaryField(null=True),
+        ),
+        # nullable until 0008 drops it, so migrating back can re-add the
+        # column before 0007 fills it in again
+        migrations.AlterField(
+            model_name="vaultitem",
+            name="encrypted_data",
+            field=models.TextField(
+                help_text="Base64 encoded encrypted string", null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, transaction
+
+from vault.ciphertext import pack, unpack
+
+BATCH_SIZE = 1000
+
+
+def convert(apps, schema_editor, source, target, func):
+    """Copy ``source`` into ``target`` through ``func``, a batch at a time."""
+    VaultItem = apps.get_model("vault", "VaultItem")
+    db = schema_editor.connection.alias
+    items = VaultItem.objects.using(db).order_by("pk")
+    last = None
+    while True:
+        batch = items if last is None else items.filter(pk__gt=last)
+        rows = list(batch.values_list("pk", source)[:BATCH_SIZE])
+        if not rows:
+            break
+        # one short transaction per batch rather than a lock on the whole table
+        with transaction.atomic(using=db):
+            VaultItem.objects.using(db).bulk_update(
+                [VaultItem(pk=pk, **{target: func(value)}) for pk, value in rows],
+                [target],
+            )
+        last = rows[-1][0]
+
+
+def pack_rows(apps, schema_editor):
+    convert(apps, schema_editor, "encrypted_data", "encrypted_blob", pack)
+
+
+def unpack_rows(apps, schema_editor):
+    convert(apps, schema_editor, "encrypted_blob", "encrypted_data", unpack)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("vault", "0006_vaultitem_encrypted_blob"),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_rows, unpack_rows),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0007_pack_encrypted_data"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="vaultitem",
+            name="encrypted_data",
+        ),
+        migrations.RenameField(
+            model_name="vaultitem",
+            old_name="encrypted_blob",
+            new_name="encrypted_data",
+        ),
+        migrations.AlterField(
+            model_name="vaultitem",
+            name="encrypted_data",
+            field=models.BinaryField(help_text="Encrypted data"),
+        ),
+    ]
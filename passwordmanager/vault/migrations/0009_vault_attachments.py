@@ -0,0 +1,116 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:46
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0008_encrypted_data_binary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VaultAttachment",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="File name (encrypted by the client if wanted)",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "size",
+                    models.BigIntegerField(
+                        help_text="Size of the encrypted file in bytes"
+                    ),
+                ),
+                (
+                    "chunk_size",
+                    models.IntegerField(help_text="Size of every chunk but the last"),
+                ),
+                ("complete", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vault_attachments",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "vault_item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attachments",
+                        to="vault.vaultitem",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="VaultAttachmentChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.IntegerField()),
+                ("digest", models.CharField(db_index=True, max_length=64)),
+                ("size", models.IntegerField()),
+                (
+                    "attachment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="vault.vaultattachment",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["attachment", "index"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="vaultattachment",
+            index=models.Index(
+                fields=["vault_item", "-created_at"], name="vault_attachment_item_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vaultattachment",
+            index=models.Index(
+                fields=["user", "-created_at"], name="vault_attachment_user_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="vaultattachmentchunk",
+            constraint=models.UniqueConstraint(
+                fields=("attachment", "index"), name="vault_attachment_chunk_unique"
+            ),
+        ),
+    ]
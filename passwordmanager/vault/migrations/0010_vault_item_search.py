@@ -0,0 +1,48 @@
+from django.db import migrations
+
+from vault.search import install_sqlite_search, uninstall_sqlite_search
+
+# the expressions Django's icontains compares against, see vault.search
+TRIGRAM_INDEXES = [
+    ("vault_item_title_trgm", "UPPER(title::text)"),
+    ("vault_item_description_trgm", "UPPER(description::text)"),
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for name, expression in TRIGRAM_INDEXES:
+                cursor.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}"
+                    f" ON vault_vaultitem USING gin (({expression}) gin_trgm_ops)"
+                )
+    else:
+        install_sqlite_search(connection)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            for name, _expression in TRIGRAM_INDEXES:
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        uninstall_sqlite_search(connection)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction, and doesn't
+    # block writes to the items table while the index builds. The pg_trgm
+    # extension is left in place on the way back, other things may use it
+    atomic = False
+
+    dependencies = [
+        ("vault", "0009_vault_attachments"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0010_vault_item_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vaultitem",
+            name="expiry_recorded_for",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="vaultitem",
+            index=models.Index(
+                condition=models.Q(("soft_deleted", False)),
+                fields=["user", "expires_at"],
+                name="vault_item_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vaultitem",
+            index=models.Index(
+                condition=models.Q(
+                    ("expires_at__isnull", False),
+                    ("soft_deleted", False),
+                    models.Q(
+                        ("expiry_recorded_for__isnull", True),
+                        ("expiry_recorded_for__lt", models.F("expires_at")),
+                        ("expiry_recorded_for__gt", models.F("expires_at")),
+                        _connector="OR",
+                    ),
+                ),
+                fields=["expires_at", "id"],
+                name="vault_item_expiry_sweep_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_deleted_at(apps, schema_editor):
+    # when items already in the trash were deleted isn't recorded anywhere,
+    # so start their retention period now rather than risk purging them early
+    VaultItem = apps.get_model("vault", "VaultItem")
+    VaultItem.objects.using(schema_editor.connection.alias).filter(
+        soft_deleted=True, deleted_at__isnull=True
+    ).update(deleted_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0011_vault_item_expiry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vaultitem",
+            name="deleted_at",
+            field=models.DateTimeField(
+                blank=True, help_text="When the item was soft deleted", null=True
+            ),
+        ),
+        migrations.RunPython(backfill_deleted_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="vaultitem",
+            index=models.Index(
+                condition=models.Q(("soft_deleted", True)),
+                fields=["deleted_at", "id"],
+                name="vault_item_purge_idx",
+            ),
+        ),
+    ]
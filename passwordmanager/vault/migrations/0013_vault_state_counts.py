@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+def count_items(apps, schema_editor):
+    VaultItem = apps.get_model("vault", "VaultItem")
+    VaultState = apps.get_model("vault", "VaultState")
+    db = schema_editor.connection.alias
+
+    states = {}
+    rows = (
+        VaultItem.objects.using(db)
+        .order_by()
+        .values_list("user_id", "soft_deleted", "item_type")
+        .annotate(count=models.Count("id"))
+    )
+    for user_id, soft_deleted, item_type, count in rows:
+        state = states.get(user_id)
+        if state is None:
+            state, _created = VaultState.objects.using(db).get_or_create(
+                user_id=user_id
+            )
+            state.live_count = state.deleted_count = 0
+            state.type_counts = {}
+            states[user_id] = state
+        if soft_deleted:
+            state.deleted_count += count
+        else:
+            state.live_count += count
+            state.type_counts[item_type] = count
+    VaultState.objects.using(db).bulk_update(
+        states.values(), ["live_count", "deleted_count", "type_counts"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vault", "0012_vault_item_deleted_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vaultstate",
+            name="deleted_count",
+            field=models.IntegerField(default=0, help_text="Items in the trash"),
+        ),
+        migrations.AddField(
+            model_name="vaultstate",
+            name="live_count",
+            field=models.IntegerField(default=0, help_text="Items not in the trash"),
+        ),
+        migrations.AddField(
+            model_name="vaultstate",
+            name="type_counts",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Items not in the trash, per item_type",
+            ),
+        ),
+        migrations.RunPython(count_items, migrations.RunPython.noop),
+    ]
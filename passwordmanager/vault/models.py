@@ -1,9 +1,142 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
 
 
+def count_changes(before, after):
+    """
+    How an item going from ``before`` to ``after`` changes the vault counters.
+
+    Both are ``(soft_deleted, item_type)``, or None for no item at all (before
+    it's created or after it's deleted). Returns a Counter of the changes to
+    ``"live"``, ``"deleted"`` and, for live items, ``("type", item_type)``.
+    """
+    changes = Counter()
+    for counted_as, sign in ((before, -1), (after, 1)):
+        if counted_as is None:
+            continue
+        soft_deleted, item_type = counted_as
+        if soft_deleted:
+            changes["deleted"] += sign
+        else:
+            changes["live"] += sign
+            changes[("type", item_type)] += sign
+    return changes
+
+
+class VaultState(models.Model):
+    """
+    Per-user bookkeeping for the vault.
+    ``revision`` is a counter bumped on every change to one of the user's items,
+    which lets a client ask for only what changed since the last revision it saw.
+    The item counts are kept up to date in the same locked update, so totals
+    never need a COUNT over the user's items.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="vault_state"
+    )
+
+    revision = models.BigIntegerField(
+        default=0, help_text="Revision of the most recent change to the vault"
+    )
+
+    live_count = models.IntegerField(default=0, help_text="Items not in the trash")
+    deleted_count = models.IntegerField(default=0, help_text="Items in the trash")
+    type_counts = models.JSONField(
+        default=dict, blank=True, help_text="Items not in the trash, per item_type"
+    )
+
+    COUNT_FIELDS = ["live_count", "deleted_count", "type_counts"]
+
+    def __str__(self):
+        return f"{self.user.username} @ {self.revision}"
+
+    @classmethod
+    def locked(cls, user_id):
+        """The user's state row, locked until the surrounding transaction ends.
+
+        Every write to the user's items takes this lock first, so anything read
+        after it (the stored copy of an item, say) can't change underneath.
+        """
+        cls.objects.get_or_create(user_id=user_id)
+        return cls.objects.select_for_update().get(user_id=user_id)
+
+    @classmethod
+    def next_revision(cls, user_id, count=1, changes=None):
+        """Reserve ``count`` revisions for the user and return the highest one.
+
+        The state row stays locked until the surrounding transaction ends, so
+        writes for the same user commit in revision order and a client syncing
+        in between can never skip past a revision that isn't visible yet.
+        ``changes`` (see ``count_changes``) are applied to the counts as well.
+        """
+        with transaction.atomic():
+            return cls.locked(user_id).advance(count, changes)
+
+    @classmethod
+    def update_counts(cls, user_id, changes):
+        """Apply ``changes`` to the counts without using up a revision."""
+        if any(changes.values()):
+            cls.next_revision(user_id, count=0, changes=changes)
+
+    def advance(self, count=1, changes=None):
+        """``next_revision`` for a row already ``locked()``."""
+        self.revision += count
+        update_fields = ["revision"]
+        if changes and any(changes.values()):
+            self.apply_changes(changes)
+            update_fields += self.COUNT_FIELDS
+        if count or len(update_fields) > 1:
+            self.save(update_fields=update_fields)
+        return self.revision
+
+    def apply_changes(self, changes):
+        self.live_count += changes["live"]
+        self.deleted_count += changes["deleted"]
+        type_counts = dict(self.type_counts)
+        for key, change in changes.items():
+            if isinstance(key, tuple) and change:
+                item_type = key[1]
+                type_counts[item_type] = type_counts.get(item_type, 0) + change
+                if not type_counts[item_type]:
+                    del type_counts[item_type]
+        self.type_counts = type_counts
+
+
+class VaultItemQuerySet(models.QuerySet):
+    def with_expiry(self, now=None):
+        """Annotate ``expired``, worked out in SQL the way ``is_expired()`` does."""
+        return self.annotate(
+            expired=models.Case(
+                models.When(expires_at__lt=now or timezone.now(), then=True),
+                default=False,
+                output_field=models.BooleanField(),
+            )
+        )
+
+    def expired(self, expired=True, now=None):
+        """Items that have (or, with ``expired=False``, haven't) expired."""
+        past_expiry = models.Q(expires_at__lt=now or timezone.now())
+        return self.filter(past_expiry if expired else ~past_expiry)
+
+    def expiry_unrecorded(self):
+        """Items whose current expiry time has no "expired" history event yet."""
+        return self.filter(EXPIRY_UNRECORDED)
+
+
+# matches vault_item_expiry_sweep_idx, so the sweeper only visits the
+# items it still has to record
+EXPIRY_UNRECORDED = models.Q(soft_deleted=False, expires_at__isnull=False) & (
+    models.Q(expiry_recorded_for__isnull=True)
+    | models.Q(expiry_recorded_for__lt=models.F("expires_at"))
+    | models.Q(expiry_recorded_for__gt=models.F("expires_at"))
+)
+
+
 class VaultItem(models.Model):
     """
     Model for encrypted string (vault item)
@@ -21,7 +154,8 @@ class VaultItem(models.Model):
         max_length=255, help_text="Descriptive title for the vault item"
     )
 
-    encrypted_data = models.TextField(help_text="Base64 encoded encrypted string")
+    # the client's base64 ciphertext as raw bytes, see vault.ciphertext
+    encrypted_data = models.BinaryField(help_text="Encrypted data")
 
     # TODO: this should be an enum/choices?
     encryption_algorithm = models.CharField(
@@ -57,20 +191,142 @@ class VaultItem(models.Model):
     )
 
     soft_deleted = models.BooleanField(default=False, help_text="Soft delete flag")
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the item was soft deleted"
+    )
+
+    # the expires_at the sweeper last recorded an "expired" event for, so that
+    # moving expires_at makes the item due to be recorded again
+    expiry_recorded_for = models.DateTimeField(null=True, blank=True, editable=False)
+
+    revision = models.BigIntegerField(
+        default=0,
+        editable=False,
+        help_text="Vault revision of the last change to this item",
+    )
+
+    # fields that can change without it counting as a change to the item
+    UNVERSIONED_FIELDS = {"last_accessed", "expiry_recorded_for"}
+    # fields the vault counters depend on, see count_changes()
+    COUNTED_FIELDS = ("soft_deleted", "item_type")
+
+    objects = VaultItemQuerySet.as_manager()
 
     class Meta:
         ordering = ["-updated_at", "-created_at"]
         verbose_name = "Vault Item"
         verbose_name_plural = "Vault Items"
         indexes = [
-            models.Index(fields=["user", "soft_deleted"]),
+            # list and trash pages: filter on the user, sort by (updated_at, id)
+            models.Index(
+                fields=["user", "-updated_at", "-id"],
+                condition=models.Q(soft_deleted=False),
+                name="vault_item_live_idx",
+            ),
+            models.Index(
+                fields=["user", "-updated_at", "-id"],
+                condition=models.Q(soft_deleted=True),
+                name="vault_item_trash_idx",
+            ),
             models.Index(fields=["user", "item_type"]),
             models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "revision"]),
+            # ?expired= and the list ETag's count of expired items
+            models.Index(
+                fields=["user", "expires_at"],
+                condition=models.Q(soft_deleted=False),
+                name="vault_item_expiry_idx",
+            ),
+            models.Index(
+                fields=["expires_at", "id"],
+                condition=EXPIRY_UNRECORDED,
+                name="vault_item_expiry_sweep_idx",
+            ),
+            # for purge_vault_trash
+            models.Index(
+                fields=["deleted_at", "id"],
+                condition=models.Q(soft_deleted=True),
+                name="vault_item_purge_idx",
+            ),
         ]
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # what the counters had this item down as when it was loaded; only
+        # to be trusted if it was loaded with the user's VaultState locked
+        if not instance.get_deferred_fields() & set(cls.COUNTED_FIELDS):
+            instance._counted_as = instance.counted_as()
+        return instance
+
+    def counted_as(self):
+        return tuple(getattr(self, name) for name in self.COUNTED_FIELDS)
+
+    def stored_counted_as(self):
+        """What the counters have this item down as, or None if it isn't stored.
+
+        Read afresh rather than from the loaded copy, which another request may
+        have changed since, so call it with the user's VaultState locked.
+        """
+        if self._state.adding:
+            return None
+        return (
+            VaultItem.objects.filter(pk=self.pk)
+            .values_list(*self.COUNTED_FIELDS)
+            .first()
+        )
+
+    def save(self, *args, **kwargs):
+        """Stamp a new vault revision on the item whenever its content changes."""
+        update_fields = kwargs.get("update_fields")
+        # keep deleted_at in step with soft_deleted, however that was changed
+        if self.soft_deleted != (self.deleted_at is not None):
+            self.deleted_at = timezone.now() if self.soft_deleted else None
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = {*update_fields, "deleted_at"}
+        if (
+            update_fields is not None
+            and not set(update_fields) - self.UNVERSIONED_FIELDS
+        ):
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            state = VaultState.locked(self.user_id)
+            before = self.stored_counted_as()
+            if before is None and not self._state.adding:
+                # deleted for good since it was loaded (purged from the trash)
+                raise VaultItem.DoesNotExist(f"Vault item {self.pk} no longer exists.")
+            after = self.counted_as()
+            if update_fields is not None and before is not None:
+                # only what's being saved counts
+                after = tuple(
+                    new if name in update_fields else old
+                    for name, new, old in zip(self.COUNTED_FIELDS, after, before)
+                )
+            self.revision = state.advance(changes=count_changes(before, after))
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "revision"}
+            super().save(*args, **kwargs)
+            self._counted_as = after
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            state = VaultState.locked(self.user_id)
+            before = self.stored_counted_as()
+            pk = self.pk
+            result = super().delete(*args, **kwargs)
+            # a concurrent delete may have got there first
+            if result[1].get(self._meta.label):
+                revision = state.advance(changes=count_changes(before, None))
+                VaultItemTombstone.objects.create(
+                    user_id=self.user_id, item_id=pk, revision=revision
+                )
+        self.__dict__.pop("_counted_as", None)
+        return result
+
     def is_expired(self):
         """Check if the vault item has expired."""
         if self.expires_at:
@@ -78,9 +334,12 @@ class VaultItem(models.Model):
         return False
 
     def mark_accessed(self):
-        """Update the last_accessed timestamp."""
+        """Update the last_accessed timestamp.
+        The write is buffered and reaches the DB on the next access flush."""
+        from .access import record_access
+
         self.last_accessed = timezone.now()
-        self.save(update_fields=["last_accessed"])
+        record_access(self.pk, self.user_id, self.last_accessed)
 
     def soft_delete(self):
         """Soft delete the vault item."""
@@ -93,9 +352,34 @@ class VaultItem(models.Model):
         self.save(update_fields=["soft_deleted"])
 
 
+class VaultItemTombstone(models.Model):
+    """
+    A vault item that was permanently deleted, kept so the change feed can
+    tell clients to drop their copy.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="vault_tombstones"
+    )
+    item_id = models.UUIDField(help_text="ID of the deleted item")
+    revision = models.BigIntegerField(help_text="Vault revision of the deletion")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "revision"], name="vault_tombstone_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id} deleted @ {self.revision}"
+
+
 class VaultItemHistory(models.Model):
     """
     Model to track changes to vault items
+
+    On Postgres the table is partitioned by month on ``timestamp`` (see
+    ``vault.partitions``), so filter on ``timestamp`` where possible to let
+    queries skip old partitions.
     """
 
     vault_item = models.ForeignKey(
@@ -108,12 +392,97 @@ class VaultItemHistory(models.Model):
     details = models.JSONField(
         blank=True, null=True, help_text="Additional details about the action"
     )
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # set when the row is recorded, not when the audit writer inserts it
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["-timestamp"]
         verbose_name = "Vault Item History"
         verbose_name_plural = "Vault Item Histories"
+        indexes = [
+            models.Index(fields=["user", "-timestamp"], name="vault_history_user_idx"),
+            models.Index(
+                fields=["vault_item", "-timestamp"], name="vault_history_item_idx"
+            ),
+            # for prune_vault_history
+            models.Index(fields=["timestamp"], name="vault_history_time_idx"),
+        ]
 
     def __str__(self):
         return f"{self.action} by {self.user.username} on {self.vault_item.title}"
+
+
+class VaultAttachment(models.Model):
+    """
+    An encrypted file attached to a vault item.
+
+    The client encrypts the file and uploads the ciphertext in fixed-size
+    chunks, which can arrive in any order and be retried; the attachment is
+    usable once ``complete`` is set. Chunk contents live in the content
+    addressed store in ``vault.attachments``, so identical chunks are only
+    stored once.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vault_item = models.ForeignKey(
+        VaultItem, on_delete=models.CASCADE, related_name="attachments"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="vault_attachments"
+    )
+    name = models.CharField(
+        max_length=255, help_text="File name (encrypted by the client if wanted)"
+    )
+    size = models.BigIntegerField(help_text="Size of the encrypted file in bytes")
+    chunk_size = models.IntegerField(help_text="Size of every chunk but the last")
+    complete = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["vault_item", "-created_at"], name="vault_attachment_item_idx"
+            ),
+            models.Index(
+                fields=["user", "-created_at"], name="vault_attachment_user_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} on {self.vault_item_id}"
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size) if self.size else 0
+
+    def expected_chunk_size(self, index):
+        """How big chunk ``index`` has to be, or None if it's out of range."""
+        if not 0 <= index < self.chunk_count:
+            return None
+        if index < self.chunk_count - 1:
+            return self.chunk_size
+        return self.size - self.chunk_size * (self.chunk_count - 1)
+
+
+class VaultAttachmentChunk(models.Model):
+    """One chunk of an attachment, pointing at its content by SHA-256."""
+
+    attachment = models.ForeignKey(
+        VaultAttachment, on_delete=models.CASCADE, related_name="chunks"
+    )
+    index = models.IntegerField()
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.IntegerField()
+
+    class Meta:
+        ordering = ["attachment", "index"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["attachment", "index"], name="vault_attachment_chunk_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.attachment_id}[{self.index}] {self.digest}"
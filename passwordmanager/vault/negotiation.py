@@ -0,0 +1,17 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Always use the view's first renderer.
+
+    For views that answer with raw bytes, where the client's ``Accept`` header
+    (say ``application/octet-stream``) shouldn't turn into a 406; only error
+    responses go through the renderer.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -0,0 +1,172 @@
+"""
+Read-through cache for pages of a user's vault item list.
+
+Pages are cached under a key that includes a per-user generation number,
+and every write to one of the user's items bumps the generation once its
+transaction commits, so a write never has to find and delete the pages it
+made stale: they simply stop being looked up and age out of the cache.
+Writes through ``save()``/``delete()`` (the API, the admin) bump it from
+model signals; paths that write with bulk or queryset updates call
+``bump_on_commit()`` themselves. A user's generation is dropped when a
+user is created or deleted, since user ids can be reused.
+
+The ``a``-prefixed functions are the same reads and writes for async views,
+made through the cache's async API.
+
+The generation is read before the page is queried, so a page built from
+data that's changed since is stored under a generation nobody asks for
+any more. Starting a missing generation at the current time in
+nanoseconds means one evicted from the cache can't come back as a number
+that old pages are stored under.
+"""
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+HITS_KEY = "vault:pages:hits"
+MISSES_KEY = "vault:pages:misses"
+
+
+def get_cache():
+    return caches[settings.VAULT_LIST_CACHE]
+
+
+def generation_key(user_id):
+    return f"vault:pages:generation:{user_id}"
+
+
+def generation(user_id):
+    cache = get_cache()
+    key = generation_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+async def ageneration(user_id):
+    cache = get_cache()
+    key = generation_key(user_id)
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        value = await cache.aget(key)
+    return value
+
+
+def bump_generation(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(generation_key(user_id))
+    except ValueError:
+        # not cached, so nothing can be stored under it either
+        generation(user_id)
+
+
+def bump_on_commit(user_id):
+    """
+    Invalidate the user's cached pages for a write in the current transaction.
+
+    The bump once it commits is the one that matters: until then other
+    requests still see the old rows, and may cache pages of them under the
+    new generation. Bumping straight away too keeps the writing request, or
+    anything else in its transaction, from reading back a page from before
+    the write.
+    """
+    bump_generation(user_id)
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+def item_changed(sender, instance, **kwargs):
+    bump_on_commit(instance.user_id)
+
+
+def forget_generation(user_id):
+    get_cache().delete(generation_key(user_id))
+
+
+def user_created(sender, instance, created, **kwargs):
+    # an id can be handed out again, after a delete or a rolled back
+    # transaction, and the new user mustn't be served the old one's pages;
+    # a generation started afresh is one no page is stored under
+    if created:
+        forget_generation(instance.pk)
+
+
+def user_deleted(sender, instance, **kwargs):
+    forget_generation(instance.pk)
+
+
+def page_key(request, generation):
+    # the full URL, since the page's links are absolute
+    url = request.build_absolute_uri()
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return (
+        f"vault:pages:{request.user.pk}:{generation}:"
+        f"{request.accepted_renderer.format}:{digest}"
+    )
+
+
+def get_page(request, generation):
+    """The cached ``(etag, data)`` for the page asked for, or None."""
+    cache = get_cache()
+    page = cache.get(page_key(request, generation))
+    count_key = MISSES_KEY if page is None else HITS_KEY
+    cache.add(count_key, 0, timeout=None)
+    cache.incr(count_key)
+    return page
+
+
+async def aget_page(request, generation):
+    cache = get_cache()
+    page = await cache.aget(page_key(request, generation))
+    count_key = MISSES_KEY if page is None else HITS_KEY
+    await cache.aadd(count_key, 0, timeout=None)
+    await cache.aincr(count_key)
+    return page
+
+
+def page_timeout(items):
+    """
+    How long to keep a page showing ``items``.
+
+    ``is_expired`` turns over with no write to bump the generation, so a page
+    is only kept until the first of its items expires.
+    """
+    timeout = settings.VAULT_LIST_CACHE_TIMEOUT
+    now = timezone.now()
+    upcoming = [
+        item.expires_at for item in items if item.expires_at and item.expires_at > now
+    ]
+    if upcoming:
+        timeout = min(timeout, math.ceil((min(upcoming) - now).total_seconds()))
+    return timeout
+
+
+def store_page(request, generation, etag, data, items):
+    """Cache a page showing ``items``."""
+    get_cache().set(
+        page_key(request, generation), (etag, data), timeout=page_timeout(items)
+    )
+
+
+async def astore_page(request, generation, etag, data, items):
+    await get_cache().aset(
+        page_key(request, generation), (etag, data), timeout=page_timeout(items)
+    )
+
+
+def stats():
+    hits, misses = (get_cache().get(key, 0) for key in (HITS_KEY, MISSES_KEY))
+    return {"hits": hits, "misses": misses}
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,179 @@
+import base64
+import binascii
+import uuid
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class VaultItemKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over ``(updated_at, id)``, newest first.
+
+    Unlike PageNumberPagination this never runs a COUNT(*) and never uses
+    OFFSET, so every page costs the same index range scan no matter how deep
+    the client is. Because the cursor is the last row's key rather than a
+    position, rows that get updated while a client is paging don't shift the
+    remaining pages around.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    ordering = ("-updated_at", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` for async views, using the async ORM."""
+        return self.set_page(
+            [item async for item in self.page_queryset(queryset, request)]
+        )
+
+    def page_queryset(self, queryset, request):
+        """The rows for the page ``request`` asks for, plus one."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = self.filter_after(queryset, cursor)
+
+        # fetch one extra row to find out if there's a next page without counting
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def filter_after(self, queryset, cursor):
+        """Rows that come after ``cursor`` in ``ordering``."""
+        updated_at, pk = cursor
+        return queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, pk__lt=pk)
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            querystring = base64.urlsafe_b64decode(encoded.encode("ascii")).decode()
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            cursor = self.cursor_from_tokens(tokens)
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if None in cursor:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def cursor_from_tokens(self, tokens):
+        return parse_datetime(tokens["u"][0]), uuid.UUID(tokens["i"][0])
+
+    def cursor_tokens(self, instance):
+        return {"u": instance.updated_at.isoformat(), "i": str(instance.pk)}
+
+    def encode_cursor(self, instance):
+        querystring = parse.urlencode(self.cursor_tokens(instance))
+        return base64.urlsafe_b64encode(querystring.encode()).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                    "example": "http://api.example.org/accounts/?{cursor_query_param}=cD00ODY%3D".format(
+                        cursor_query_param=self.cursor_query_param
+                    ),
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page (max {}).".format(
+                    self.max_page_size
+                ),
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class VaultItemSearchPagination(VaultItemKeysetPagination):
+    """
+    Keyset pagination over search results, best match first.
+
+    ``search_rank`` is annotated by ``vault.search.search_items``; within a
+    rank, items are newest first as in the plain list.
+    """
+
+    ordering = ("search_rank", "-updated_at", "-id")
+
+    def filter_after(self, queryset, cursor):
+        rank, updated_at, pk = cursor
+        return queryset.filter(
+            Q(search_rank__gt=rank)
+            | Q(search_rank=rank, updated_at__lt=updated_at)
+            | Q(search_rank=rank, updated_at=updated_at, pk__lt=pk)
+        )
+
+    def cursor_from_tokens(self, tokens):
+        return (int(tokens["r"][0]), *super().cursor_from_tokens(tokens))
+
+    def cursor_tokens(self, instance):
+        return {"r": instance.search_rank, **super().cursor_tokens(instance)}
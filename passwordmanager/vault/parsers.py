@@ -0,0 +1,29 @@
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def reject_extension(code, data):
+    raise ValueError(f"extension type {code} isn't supported")
+
+
+class MessagePackParser(BaseParser):
+    """
+    MessagePack request bodies. ``encrypted_data`` may be sent as a list of
+    raw byte strings, see ``MessagePackRenderer``.
+    """
+
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(
+                stream.read(),
+                raw=False,
+                strict_map_key=False,
+                ext_hook=reject_extension,
+            )
+        # TypeError for a map key that can't be a dict key (an array, say);
+        # too deeply nested bodies raise a ValueError
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
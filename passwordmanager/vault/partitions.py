@@ -0,0 +1,132 @@
+"""
+Monthly range partitions of the history table on Postgres.
+
+Migration 0005 turns ``vault_vaultitemhistory`` into a table partitioned by
+``timestamp``, with one partition per month plus a default partition that
+catches anything outside them, so an insert never fails for want of a
+partition. ``ensure_history_partitions`` keeps a few months of partitions
+ready ahead of time and is run by ``prune_vault_history``. On other databases
+the table is a plain table and these functions do nothing.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+TABLE = "vault_vaultitemhistory"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start):
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def is_partitioned(using=connection):
+    if using.vendor != "postgresql":
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p"
+            " JOIN pg_class c ON c.oid = p.partrelid"
+            " WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def history_partitions(using=connection):
+    """``(name, start, end)`` of each monthly partition, oldest first."""
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i"
+            " JOIN pg_class c ON c.oid = i.inhrelid"
+            " JOIN pg_class p ON p.oid = i.inhparent"
+            " WHERE p.relname = %s AND c.relname <> %s"
+            " ORDER BY c.relname",
+            [TABLE, DEFAULT_PARTITION],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        start = datetime.strptime(name[-7:], "%Y_%m").replace(tzinfo=dt_timezone.utc)
+        partitions.append((name, start, next_month(start)))
+    return partitions
+
+
+def create_partition(start, using=connection):
+    """
+    Add the partition for the month starting at ``start``.
+
+    Rows for that month that already landed in the default partition are
+    moved into the new table before it's attached, since Postgres won't
+    attach a range the default partition still has rows for.
+    """
+    name = partition_name(start)
+    end = next_month(start)
+    qn = using.ops.quote_name
+    with transaction.atomic(using=using.alias), using.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {qn(name)}"
+            f" (LIKE {qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)}"
+            f" WHERE timestamp >= %s AND timestamp < %s RETURNING *)"
+            f" INSERT INTO {qn(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(name)}"
+            f" FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return name
+
+
+def ensure_history_partitions(now, months_ahead=2, using=connection):
+    """Create any missing partitions from this month to ``months_ahead`` on."""
+    if not is_partitioned(using):
+        return []
+
+    existing = {name for name, _start, _end in history_partitions(using)}
+    created = []
+    start = month_start(now)
+    for _ in range(months_ahead + 1):
+        if partition_name(start) not in existing:
+            created.append(create_partition(start, using))
+        start = next_month(start)
+    return created
+
+
+def drop_partitions_before(cutoff, using=connection):
+    """
+    Drop the monthly partitions that end on or before ``cutoff``.
+
+    Dropping a whole month is a catalog change rather than a row-by-row
+    DELETE, so it's quick and leaves nothing for vacuum to clean up.
+    Returns the names of the dropped partitions.
+    """
+    if not is_partitioned(using):
+        return []
+
+    qn = using.ops.quote_name
+    dropped = []
+    for name, _start, end in history_partitions(using):
+        if end > cutoff:
+            break
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(TABLE)} DETACH PARTITION {qn(name)}")
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,63 @@
+from collections.abc import Mapping
+
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .ciphertext import Ciphertext, unpack_segments
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Newline-delimited JSON, one object per line.
+    Streaming views write their own lines; this only lets clients ask for
+    ``application/x-ndjson`` and renders anything else (errors) as one line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b"\n"
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack, with ``encrypted_data`` as a list of raw byte strings, one
+    per segment of the base64 text JSON would send. Ciphertext that wasn't
+    base64 to begin with is sent as the same text as in JSON.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    json_encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # strict_types sends subclasses of the core types (Ciphertext, DRF's
+        # ReturnDict) to default() too
+        return msgpack.packb(
+            data, default=self.default, strict_types=True, use_bin_type=True
+        )
+
+    def default(self, obj):
+        """
+        Ciphertext as its raw segments, subclasses of the core types as those
+        types, and anything else (dates, UUIDs, ...) as JSON would send it.
+        """
+        if isinstance(obj, Ciphertext):
+            return unpack_segments(obj.packed) or str(obj)
+        for core in (bool, int, float, str, bytes, list):
+            if isinstance(obj, core):
+                return core(obj)
+        if isinstance(obj, (bytearray, memoryview)):
+            return bytes(obj)
+        if isinstance(obj, tuple):
+            return list(obj)
+        if isinstance(obj, Mapping):
+            return dict(obj)
+        return self.json_encoder.default(obj)
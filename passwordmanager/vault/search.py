@@ -0,0 +1,140 @@
+"""
+Substring search over vault item titles and descriptions.
+
+On Postgres, ``icontains`` is answered from the trigram GIN indexes that
+migration 0010 adds on ``UPPER(title)`` and ``UPPER(description)`` (the
+exact expressions Django's ``icontains`` compares). On SQLite the same
+columns are indexed by an FTS5 table using the ``trigram`` tokenizer, kept
+up to date by triggers on the item table. Either way a trigram needs three
+characters, so shorter queries fall back to scanning the user's own items.
+"""
+
+from django.db import connection, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.expressions import RawSQL
+
+# shortest query a trigram index can answer
+MIN_INDEXED_LENGTH = 3
+
+# search_rank: lower is better
+TITLE_PREFIX, TITLE_MATCH, DESCRIPTION_MATCH = 0, 1, 2
+
+FTS_TABLE = "vault_item_fts"
+ITEM_TABLE = "vault_vaultitem"
+# the migration that creates the index
+INDEX_MIGRATION = "0010_vault_item_search"
+
+SQLITE_TRIGGERS = {
+    "vault_item_fts_insert": f"""
+        CREATE TRIGGER vault_item_fts_insert AFTER INSERT ON {ITEM_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, title, description)
+            VALUES (new.rowid, new.title, new.description);
+        END
+    """,
+    "vault_item_fts_delete": f"""
+        CREATE TRIGGER vault_item_fts_delete AFTER DELETE ON {ITEM_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.rowid, old.title, old.description);
+        END
+    """,
+    "vault_item_fts_update": f"""
+        CREATE TRIGGER vault_item_fts_update
+        AFTER UPDATE OF title, description ON {ITEM_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, title, description)
+            VALUES ('delete', old.rowid, old.title, old.description);
+            INSERT INTO {FTS_TABLE} (rowid, title, description)
+            VALUES (new.rowid, new.title, new.description);
+        END
+    """,
+}
+
+
+def install_sqlite_search(using=connection):
+    """
+    Create the FTS5 index and its triggers on SQLite if they're missing.
+
+    Rebuilding a table (which SQLite migrations do for most field changes)
+    drops its triggers and renumbers its rows, so when any trigger is gone
+    the index is rebuilt from scratch too. Returns True if it did anything.
+    """
+    if using.vendor != "sqlite":
+        return False
+
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            [ITEM_TABLE],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if existing >= set(SQLITE_TRIGGERS):
+            return False
+
+        # an external content table: the text itself stays in the item table
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"title, description, content='{ITEM_TABLE}', tokenize='trigram')"
+        )
+        for name, sql in SQLITE_TRIGGERS.items():
+            if name not in existing:
+                cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def reinstall_search_index(using, **kwargs):
+    """
+    post_migrate handler: put the SQLite search triggers back if a table
+    rebuild in the migrations that just ran dropped them.
+    """
+    db = connections[using]
+    if db.vendor != "sqlite":
+        return
+    applied = MigrationRecorder(db).migration_qs.filter(
+        app="vault", name=INDEX_MIGRATION
+    )
+    if applied.exists():
+        install_sqlite_search(db)
+
+
+def uninstall_sqlite_search(using=connection):
+    if using.vendor != "sqlite":
+        return
+    with using.cursor() as cursor:
+        for name in SQLITE_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def filter_matching(queryset, query):
+    """Items in ``queryset`` whose title or description contains ``query``."""
+    if connection.vendor == "sqlite" and len(query) >= MIN_INDEXED_LENGTH:
+        phrase = '"' + query.replace('"', '""') + '"'
+        # compare the index's rowids with the item table's own, so SQLite
+        # looks the matches up by rowid rather than checking every item
+        return queryset.alias(
+            item_rowid=RawSQL(f"{ITEM_TABLE}.rowid", [], output_field=IntegerField())
+        ).filter(
+            item_rowid__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [phrase],
+            )
+        )
+    return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+
+
+def search_items(queryset, query):
+    """
+    Items in ``queryset`` matching ``query``, annotated with ``search_rank``.
+
+    Title prefix matches rank first, then other title matches, then items
+    that only match on their description.
+    """
+    return filter_matching(queryset, query).annotate(
+        search_rank=Case(
+            When(title__istartswith=query, then=Value(TITLE_PREFIX)),
+            When(title__icontains=query, then=Value(TITLE_MATCH)),
+            default=Value(DESCRIPTION_MATCH),
+            output_field=IntegerField(),
+        )
+    )
@@ -1,9 +1,25 @@
 from rest_framework import serializers
-from vault.models import VaultItem, VaultItemHistory
+from vault.models import VaultAttachment, VaultItem, VaultItemHistory, VaultState
+from vault.audit import record_history
+from vault.ciphertext import MAX_SEGMENTS, Ciphertext, pack, pack_segments
+from django.conf import settings
 from django.contrib.auth.models import User
 from drf_spectacular.utils import extend_schema_field
 
 
+class SparseFieldsMixin:
+    """
+    Takes a ``fields`` argument naming the only fields to serialize, for
+    ``?fields=`` (see ``vault.sparse``).
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for Django User with minimal fields.
@@ -15,13 +31,60 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "username", "email", "date_joined"]
 
 
-class VaultItemSerializer(serializers.ModelSerializer):
+class CiphertextField(serializers.CharField):
+    """
+    Base64 ciphertext on the wire, packed into raw bytes for storage.
+
+    Binary formats may send the raw segments instead, as a list of bytes, and
+    the binary renderers send them back that way.
+    """
+
+    default_error_messages = {
+        "invalid_segments": (
+            "Expected base64 text or a list of 1 to {max} byte strings."
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            if not all(isinstance(segment, bytes) for segment in data):
+                self.fail("invalid_segments", max=MAX_SEGMENTS)
+            try:
+                return pack_segments(data)
+            except ValueError:
+                self.fail("invalid_segments", max=MAX_SEGMENTS)
+        return pack(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return Ciphertext(value)
+
+
+class ExpiredField(serializers.BooleanField):
+    """
+    ``is_expired``, read from the ``expired`` annotation added by
+    ``VaultItem.objects.with_expiry()``, or worked out here for an item that
+    didn't come from such a queryset (e.g. one that was just created).
+    """
+
+    # for vault.sparse, should the annotation be missing
+    columns = ("expires_at",)
+
+    def __init__(self, **kwargs):
+        super().__init__(source="*", read_only=True, **kwargs)
+
+    def to_representation(self, value):
+        expired = getattr(value, "expired", None)
+        return value.is_expired() if expired is None else bool(expired)
+
+
+class VaultItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for VaultItem model.
     """
 
     user_info = UserSerializer(source="user", read_only=True)
-    is_expired = serializers.SerializerMethodField()
+    encrypted_data = CiphertextField(help_text="Base64 encoded encrypted string")
+    is_expired = ExpiredField()
 
     class Meta:
         model = VaultItem
@@ -39,6 +102,7 @@ class VaultItemSerializer(serializers.ModelSerializer):
             "expires_at",
             "soft_deleted",
             "is_expired",
+            "revision",
         ]
         read_only_fields = [
             "id",
@@ -47,13 +111,9 @@ class VaultItemSerializer(serializers.ModelSerializer):
             "last_accessed",
             "user_info",
             "is_expired",
+            "revision",
         ]
 
-    @extend_schema_field(serializers.BooleanField())
-    def get_is_expired(self, obj):
-        """Calculate if the vault item is expired."""
-        return obj.is_expired()
-
     def validate_title(self, value):
         """Ensure title is not empty."""
         if not value.strip():
@@ -73,18 +133,65 @@ class VaultItemSerializer(serializers.ModelSerializer):
         validated_data["user"] = user
 
         vault_item = VaultItem.objects.create(**validated_data)
-        VaultItemHistory.objects.create(
-            vault_item=vault_item,
-            user=user,
-            action="created",
-            details={"created_via": "api"},
-        )
+        record_history(vault_item, user, "created", details={"created_via": "api"})
 
         return vault_item
 
 
+class VaultItemBulkOperationSerializer(VaultItemSerializer):
+    """
+    One operation in a bulk request.
+    Shares field rules with VaultItemSerializer; ``id`` names the item for
+    update and delete, and only the fields that are sent get changed.
+    """
+
+    OPERATIONS = ["create", "update", "delete"]
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.UUIDField(required=False)
+    encrypted_data = CiphertextField(required=False)
+
+    class Meta(VaultItemSerializer.Meta):
+        fields = [
+            "op",
+            "id",
+            "title",
+            "encrypted_data",
+            "encryption_algorithm",
+            "item_type",
+            "description",
+            "expires_at",
+        ]
+        extra_kwargs = {"title": {"required": False}}
+
+    def validate(self, attrs):
+        if attrs["op"] == "create":
+            if "id" in attrs:
+                raise serializers.ValidationError(
+                    {"id": "Ids are assigned by the server on create."}
+                )
+            missing = {
+                field: "This field is required."
+                for field in ("title", "encrypted_data")
+                if field not in attrs
+            }
+            if missing:
+                raise serializers.ValidationError(missing)
+        elif "id" not in attrs:
+            raise serializers.ValidationError({"id": "This field is required."})
+        return attrs
+
+
+class VaultItemBulkSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 5000
+
+    operations = VaultItemBulkOperationSerializer(
+        many=True, allow_empty=False, max_length=MAX_OPERATIONS
+    )
+
+
 class VaultItemListSerializer(serializers.ModelSerializer):
-    is_expired = serializers.SerializerMethodField()
+    is_expired = ExpiredField()
 
     class Meta:
         model = VaultItem
@@ -98,6 +205,7 @@ class VaultItemListSerializer(serializers.ModelSerializer):
             "last_accessed",
             "soft_deleted",
             "is_expired",
+            "revision",
         ]
         read_only_fields = [
             "id",
@@ -105,13 +213,30 @@ class VaultItemListSerializer(serializers.ModelSerializer):
             "updated_at",
             "last_accessed",
             "is_expired",
+            "revision",
         ]
 
-    def get_is_expired(self, obj):
-        return obj.is_expired()
+
+class VaultSummarySerializer(serializers.ModelSerializer):
+    """Item totals for the user's vault."""
+
+    expired_count = serializers.IntegerField(
+        read_only=True, help_text="Items not in the trash that have expired"
+    )
+
+    class Meta:
+        model = VaultState
+        fields = [
+            "revision",
+            "live_count",
+            "deleted_count",
+            "type_counts",
+            "expired_count",
+        ]
+        read_only_fields = fields
 
 
-class VaultItemHistorySerializer(serializers.ModelSerializer):
+class VaultItemHistorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_info = UserSerializer(source="user", read_only=True)
     vault_item_title = serializers.CharField(source="vault_item.title", read_only=True)
 
@@ -127,3 +252,60 @@ class VaultItemHistorySerializer(serializers.ModelSerializer):
             "timestamp",
         ]
         read_only_fields = ["id", "user_info", "vault_item_title", "timestamp"]
+
+
+class VaultAttachmentSerializer(serializers.ModelSerializer):
+    """
+    An attachment and its upload progress.
+
+    ``received`` lists the chunks the server already has, so an interrupted
+    upload can carry on with just the missing ones.
+    """
+
+    chunk_count = serializers.IntegerField(read_only=True)
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VaultAttachment
+        fields = [
+            "id",
+            "vault_item",
+            "name",
+            "size",
+            "chunk_size",
+            "chunk_count",
+            "received",
+            "complete",
+            "created_at",
+            "completed_at",
+        ]
+        read_only_fields = [
+            "id",
+            "chunk_size",
+            "complete",
+            "created_at",
+            "completed_at",
+        ]
+
+    @extend_schema_field(serializers.ListField(child=serializers.IntegerField()))
+    def get_received(self, obj):
+        return [chunk.index for chunk in obj.chunks.all()]
+
+    def validate_vault_item(self, value):
+        user = self.context["request"].user
+        if value.user_id != user.pk or value.soft_deleted:
+            raise serializers.ValidationError("No such vault item.")
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.VAULT_ATTACHMENT_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Attachments must be between 1 and "
+                f"{settings.VAULT_ATTACHMENT_MAX_SIZE} bytes."
+            )
+        return value
+
+    def create(self, validated_data):
+        validated_data["user"] = self.context["request"].user
+        validated_data["chunk_size"] = settings.VAULT_ATTACHMENT_CHUNK_SIZE
+        return super().create(validated_data)
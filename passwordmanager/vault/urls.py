@@ -1,11 +1,25 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r"items", views.VaultItemViewSet, basename="vaultitem")
 router.register(r"history", views.VaultItemHistoryViewSet, basename="vaultitemhistory")
+router.register(
+    r"attachments", views.VaultAttachmentViewSet, basename="vaultattachment"
+)
 
 urlpatterns = [
     path("", include(router.urls)),
+    # the same item routes as async views, for ASGI deployments
+    path(
+        "async/items/",
+        async_views.VaultItemListView.as_view(),
+        name="vaultitem-async-list",
+    ),
+    path(
+        "async/items/<uuid:pk>/",
+        async_views.VaultItemDetailView.as_view(),
+        name="vaultitem-async-detail",
+    ),
 ]
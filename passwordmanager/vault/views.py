@@ -1,46 +1,179 @@
-from rest_framework import viewsets, permissions
+import hashlib
+from datetime import datetime, time, timedelta
+from io import BytesIO
+
+from rest_framework import mixins, viewsets, permissions, renderers, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import VaultItem, VaultItemHistory
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import quote_etag
+from . import bulk, pagecache
+from .attachments import (
+    ChunkedFile,
+    ChunkTooLarge,
+    RangeFile,
+    chunk_path,
+    parse_range,
+    store_chunk,
+)
+from .audit import record_history
+from .etags import item_etag, list_etag
+from .export import export_lines
+from .importer import import_lines
+from .models import (
+    VaultAttachment,
+    VaultAttachmentChunk,
+    VaultItem,
+    VaultItemHistory,
+    VaultItemTombstone,
+    VaultState,
+)
+from .negotiation import IgnoreClientContentNegotiation
+from .pagination import VaultItemKeysetPagination, VaultItemSearchPagination
 from .permissions import MFARequiredIfOptedIn
+from .parsers import MessagePackParser
+from .renderers import MessagePackRenderer, NDJSONRenderer
+from .search import search_items
 from .serializers import (
+    VaultAttachmentSerializer,
+    VaultItemBulkSerializer,
     VaultItemListSerializer,
     VaultItemHistorySerializer,
     VaultItemSerializer,
+    VaultSummarySerializer,
 )
+from .sparse import SparseFieldsViewMixin
+
+
+def filter_expired(queryset, query_params):
+    """Apply ``?expired=true|false``, if given."""
+    expired = query_params.get("expired")
+    if expired is None:
+        return queryset
+    if expired not in ("true", "false"):
+        raise ValidationError({"expired": "Must be true or false."})
+    return queryset.expired(expired == "true")
 
 
-class VaultItemViewSet(viewsets.ModelViewSet):
+def change_revision(change):
+    """The revision of an item or a tombstone in the change feed."""
+    return change.revision if isinstance(change, VaultItem) else change["revision"]
+
+
+class VaultItemViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
 
     permission_classes = [permissions.IsAuthenticated, MFARequiredIfOptedIn]
+    pagination_class = VaultItemKeysetPagination
+    # MessagePack sends ciphertext as raw bytes rather than base64
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, MessagePackRenderer]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, MessagePackParser]
+
+    # most changes a single call to the change feed will return
+    max_changes = 500
+
+    # ?fields= picks from the full item, so lists can include encrypted_data
+    sparse_actions = ("list", "retrieve", "deleted", "search")
+    sparse_serializer_class = VaultItemSerializer
+    # the page cursor, the item ETag and access tracking read these
+    sparse_columns = ("updated_at", "revision", "expires_at", "user")
 
     def get_serializer_class(self):
-        if self.action == "list" or self.action == "deleted":
+        if self.action in ("list", "deleted", "search"):
+            if self.sparse_fields is not None:
+                return VaultItemSerializer
             return VaultItemListSerializer
+        if self.action == "bulk":
+            return VaultItemBulkSerializer
+        if self.action == "summary":
+            return VaultSummarySerializer
         return VaultItemSerializer
 
     def get_queryset(self):
         """Return only the current user's vault items."""
-        return VaultItem.objects.filter(
+        queryset = VaultItem.objects.filter(
             user=self.request.user, soft_deleted=False
-        ).order_by("-updated_at")
+        ).with_expiry()
+        if self.sparse_fields is not None:
+            queryset = self.project(queryset)
+        elif self.get_serializer_class() is VaultItemSerializer:
+            # for user_info
+            queryset = queryset.select_related("user")
+        if self.action in ("list", "search"):
+            queryset = self.filter_expired(queryset)
+        return queryset.order_by("-updated_at", "-id")
+
+    def filter_expired(self, queryset):
+        return filter_expired(queryset, self.request.query_params)
 
     def perform_create(self, serializer):
         """Automatically set the user when creating."""
         serializer.save(user=self.request.user)
 
+    def handle_exception(self, exc):
+        # an item deleted for good between being loaded and being saved
+        if isinstance(exc, VaultItem.DoesNotExist):
+            exc = NotFound()
+        return super().handle_exception(exc)
+
     def perform_update(self, serializer):
-        """Track access when updating."""
-        instance = serializer.save()
-        instance.mark_accessed()
+        """Track access when updating, as part of the same UPDATE."""
+        serializer.save(last_accessed=timezone.now())
+
+    def list(self, request, *args, **kwargs):
+        """List items, from the page cache where possible.
+
+        A matching If-None-Match is answered before any items are loaded.
+        Lists filtered on ``expired`` aren't cached, since which items they
+        hold changes as time passes.
+        """
+        generation = pagecache.generation(request.user.pk)
+        if "expired" in request.query_params:
+            etag = list_etag(request, generation)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = super().list(request, *args, **kwargs)
+            response["ETag"] = etag
+            return response
+
+        cached = pagecache.get_page(request, generation)
+        if cached is not None:
+            etag, data = cached
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = Response(data)
+            response["ETag"] = etag
+            return response
+
+        etag = list_etag(request, generation)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            pagecache.store_page(
+                request, generation, etag, response.data, self.paginator.page
+            )
+        response["ETag"] = etag
+        return response
 
     def retrieve(self, request, *args, **kwargs):
         """Track access when retrieving a single item."""
         instance = self.get_object()
         instance.mark_accessed()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+
+        etag = item_etag(request, instance)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+        response["ETag"] = etag
+        return response
 
     @action(detail=True, methods=["post"])
     def soft_delete(self, request, pk=None):
@@ -48,11 +181,8 @@ class VaultItemViewSet(viewsets.ModelViewSet):
         vault_item = self.get_object()
         vault_item.soft_delete()
 
-        VaultItemHistory.objects.create(
-            vault_item=vault_item,
-            user=request.user,
-            action="deleted",
-            details={"deleted_via": "api"},
+        record_history(
+            vault_item, request.user, "deleted", details={"deleted_via": "api"}
         )
 
         return Response({"status": "deleted"})
@@ -65,11 +195,8 @@ class VaultItemViewSet(viewsets.ModelViewSet):
         )
         vault_item.restore()
 
-        VaultItemHistory.objects.create(
-            vault_item=vault_item,
-            user=request.user,
-            action="restored",
-            details={"restored_via": "api"},
+        record_history(
+            vault_item, request.user, "restored", details={"restored_via": "api"}
         )
 
         return Response({"status": "restored"})
@@ -77,26 +204,344 @@ class VaultItemViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def deleted(self, request):
         """Get soft-deleted items."""
-        deleted_items = VaultItem.objects.filter(user=request.user, soft_deleted=True)
-        serializer = VaultItemListSerializer(deleted_items, many=True)
-        return Response(serializer.data)
+        deleted_items = VaultItem.objects.filter(
+            user=request.user, soft_deleted=True
+        ).with_expiry()
+        if self.sparse_fields is not None:
+            deleted_items = self.project(deleted_items)
+        page = self.paginate_queryset(deleted_items)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Search item titles and descriptions for ``q``, best matches first.
+
+        Items whose title starts with ``q`` come first, then other title
+        matches, then description matches. Matching ignores case.
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This parameter is required."})
+
+        paginator = VaultItemSearchPagination()
+        page = paginator.paginate_queryset(
+            search_items(self.get_queryset(), query), request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        """Item totals, from counters kept up to date on every write.
+
+        Expiry isn't a write, so ``expired_count`` is counted when asked for,
+        from an index that holds only the user's live items by expiry time.
+        """
+        state = VaultState.objects.filter(user=request.user).first()
+        if state is None:
+            state = VaultState(user=request.user)
+        state.expired_count = (
+            VaultItem.objects.filter(user=request.user, soft_deleted=False)
+            .expired()
+            .count()
+        )
+        return Response(self.get_serializer(state).data)
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """Get items changed since a vault revision, including soft-deleted ones.
+
+        Items deleted for good are listed in ``deleted`` as their id and the
+        revision of the deletion. An id in both lists was deleted and then
+        created again, so apply ``deleted`` before ``results``.
+
+        Clients keep the returned ``revision`` and pass it back as ``since`` on
+        their next sync. While ``has_more`` is true there are further changes
+        to fetch straight away.
+        """
+        try:
+            since = int(request.query_params.get("since", 0))
+        except ValueError:
+            raise ValidationError({"since": "Must be an integer revision."})
+
+        changed = (
+            VaultItem.objects.filter(user=request.user, revision__gt=since)
+            .with_expiry()
+            .select_related("user")
+            .order_by("revision")
+        )
+        tombstones = (
+            VaultItemTombstone.objects.filter(user=request.user, revision__gt=since)
+            .order_by("revision")
+            .values("item_id", "revision")
+        )
+        # the first max_changes of either, in revision order
+        changes = sorted(
+            [*changed[: self.max_changes + 1], *tombstones[: self.max_changes + 1]],
+            key=change_revision,
+        )
+        has_more = len(changes) > self.max_changes
+        changes = changes[: self.max_changes]
+
+        serializer = VaultItemSerializer(
+            [change for change in changes if isinstance(change, VaultItem)], many=True
+        )
+        deleted = [
+            {"id": str(change["item_id"]), "revision": change["revision"]}
+            for change in changes
+            if not isinstance(change, VaultItem)
+        ]
+        return Response(
+            {
+                "revision": change_revision(changes[-1]) if changes else since,
+                "has_more": has_more,
+                "results": serializer.data,
+                "deleted": deleted,
+            }
+        )
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Create, update and soft delete many items in one transaction.
 
-class VaultItemHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+        The whole request is rejected if any operation fails validation.
+        Operations on items that don't exist are reported as ``not_found``
+        and skipped without affecting the rest.
+        """
+        serializer = VaultItemBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = bulk.apply_operations(
+            request.user, serializer.validated_data["operations"]
+        )
+        return Response({"results": results})
+
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[renderers.JSONRenderer, NDJSONRenderer],
+    )
+    def export(self, request):
+        """Stream every item in the vault as NDJSON, one item per line.
+        Pass ``history=true`` to have the items followed by their history."""
+        include_history = request.query_params.get("history") in ("1", "true")
+        response = StreamingHttpResponse(
+            export_lines(request.user, include_history),
+            content_type=NDJSONRenderer.media_type,
+        )
+        response["Content-Disposition"] = 'attachment; filename="vault.ndjson"'
+        return response
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_items(self, request):
+        """Import encrypted items from an uploaded NDJSON ``file``.
+        Accepts the output of ``export``; invalid lines are reported and skipped."""
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "An NDJSON file is required."})
+
+        summary = import_lines(request.user, upload)
+        return Response(summary)
+
+
+class VaultItemHistoryViewSet(SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing vault item history (read-only).
     """
 
     permission_classes = [permissions.IsAuthenticated, MFARequiredIfOptedIn]
     serializer_class = VaultItemHistorySerializer
+    sparse_serializer_class = VaultItemHistorySerializer
+    sparse_columns = ("timestamp",)
 
     def get_queryset(self):
         """Return history for user's vault items only."""
         vault_item_id = self.request.query_params.get("vault_item")
 
-        queryset = VaultItemHistory.objects.filter(vault_item__user=self.request.user)
+        # history rows are only ever written by the item's owner, so filtering
+        # on the row's own user avoids a join and can use (user, -timestamp)
+        queryset = VaultItemHistory.objects.filter(user=self.request.user)
 
         if vault_item_id:
             queryset = queryset.filter(vault_item_id=vault_item_id)
 
+        if self.action == "list":
+            # only recent partitions are read unless ?since= asks for more
+            queryset = queryset.filter(timestamp__gte=self.get_since())
+
+        if self.sparse_fields is not None:
+            queryset = self.project(queryset)
+        else:
+            # user_info and vault_item_title, without the item's ciphertext
+            queryset = queryset.select_related("user", "vault_item").defer(
+                "vault_item__encrypted_data"
+            )
         return queryset.order_by("-timestamp")
+
+    def get_since(self):
+        since = self.request.query_params.get("since")
+        if not since:
+            return timezone.now() - timedelta(days=settings.VAULT_HISTORY_RECENT_DAYS)
+
+        parsed = parse_datetime(since)
+        if parsed is None:
+            date = parse_date(since)
+            if date is None:
+                raise ValidationError({"since": "Expected an ISO 8601 date or time."})
+            parsed = datetime.combine(date, time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+
+class VaultAttachmentViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Encrypted file attachments, uploaded in chunks.
+
+    Create the attachment with its total size, PUT each chunk's raw bytes to
+    ``chunks/<index>/`` (in any order, retrying as needed), then POST to
+    ``complete/``. ``download/`` streams the file and honours ``Range``.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, MFARequiredIfOptedIn]
+    serializer_class = VaultAttachmentSerializer
+
+    def get_queryset(self):
+        queryset = VaultAttachment.objects.filter(user=self.request.user)
+        vault_item_id = self.request.query_params.get("vault_item")
+        if vault_item_id:
+            queryset = queryset.filter(vault_item_id=vault_item_id)
+        # for ``received``
+        queryset = queryset.prefetch_related("chunks")
+        return queryset.order_by("-created_at")
+
+    @action(detail=True, methods=["put"], url_path=r"chunks/(?P<index>\d+)")
+    def upload_chunk(self, request, pk=None, index=None):
+        """Store one chunk; sending the same chunk again is harmless."""
+        attachment = self.get_object()
+        if attachment.complete:
+            return Response(
+                {"detail": "The attachment is already complete."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        index = int(index)
+        expected = attachment.expected_chunk_size(index)
+        if expected is None:
+            raise ValidationError({"index": "No such chunk."})
+
+        try:
+            digest, size = store_chunk(request.stream or BytesIO(), limit=expected)
+        except ChunkTooLarge:
+            raise ValidationError(
+                {"detail": f"Chunk {index} must be {expected} bytes."}
+            )
+        if size != expected:
+            raise ValidationError(
+                {"detail": f"Chunk {index} must be {expected} bytes."}
+            )
+        sent_digest = request.headers.get("X-Chunk-SHA256")
+        if sent_digest and sent_digest.lower() != digest:
+            raise ValidationError({"detail": "Chunk doesn't match X-Chunk-SHA256."})
+
+        VaultAttachmentChunk.objects.update_or_create(
+            attachment=attachment,
+            index=index,
+            defaults={"digest": digest, "size": size},
+        )
+        return Response({"index": index, "digest": digest, "size": size})
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        """Mark the upload finished once every chunk is in."""
+        attachment = self.get_object()
+        received = {chunk.index for chunk in attachment.chunks.all()}
+        missing = [i for i in range(attachment.chunk_count) if i not in received]
+        if missing:
+            return Response(
+                {"detail": "Some chunks are missing.", "missing": missing[:100]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not attachment.complete:
+            attachment.complete = True
+            attachment.completed_at = timezone.now()
+            attachment.save(update_fields=["complete", "completed_at"])
+        return Response(self.get_serializer(attachment).data)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        content_negotiation_class=IgnoreClientContentNegotiation,
+    )
+    def download(self, request, pk=None):
+        """
+        Stream the encrypted file, or the part of it asked for with ``Range``.
+
+        The file is read from disk a block at a time. An attachment that fits
+        in one chunk is served straight from its file, so the server can use
+        sendfile for it.
+        """
+        attachment = self.get_object()
+        if not attachment.complete:
+            return Response(
+                {"detail": "The attachment hasn't finished uploading."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        chunks = list(attachment.chunks.all())
+        etag = quote_etag(
+            hashlib.sha256(":".join(c.digest for c in chunks).encode()).hexdigest()
+        )
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if if_range and if_range != etag:
+            # the client's partial copy is of something else
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, attachment.size)
+        except ValueError:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = f"bytes */{attachment.size}"
+            return response
+
+        if len(chunks) == 1:
+            file = open(chunk_path(chunks[0].digest), "rb")
+        else:
+            file = ChunkedFile(chunks)
+
+        if byte_range is None:
+            response = FileResponse(
+                file,
+                as_attachment=True,
+                filename=attachment.name,
+                content_type="application/octet-stream",
+            )
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                RangeFile(file, start, end),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                as_attachment=True,
+                filename=attachment.name,
+                content_type="application/octet-stream",
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{attachment.size}"
+            response["Content-Length"] = end - start + 1
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = etag
+        return response